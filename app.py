@@ -1,9 +1,20 @@
 import os
+import socket
 import logging
+import math
+import heapq
+import itertools
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 from datetime import datetime, timezone, timedelta, date, time
-from flask import Flask
+from flask import Flask, current_app
+from jinja2 import FileSystemBytecodeCache
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy.orm import load_only
 from flask_apscheduler import APScheduler
+from migrate_db import normalize_database_url
+from tracing import span, traced
+from rolling import ROLLING_CHECK_MINUTES
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -13,29 +24,107 @@ logger = logging.getLogger(__name__)
 db = SQLAlchemy()
 scheduler = APScheduler()
 
+def worker_id():
+    """Identifies this process when claiming channels in multi-node deployments"""
+    # Looked up on every call, as preloaded gunicorn workers are forked after import
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+# Set while the hourly pass runs so background backfill yields to it
+live_pass_active = threading.Event()
+
+# Messages per summary; a larger backlog is summarized in several chunks
+SUMMARY_MAX_MESSAGES = int(os.environ.get('SUMMARY_MAX_MESSAGES', 1000))
+# Pages of 100 messages fetched per channel per pass
+INGEST_MAX_PAGES = 10
+
+# Summary ordering when Ollama capacity is short (see summary_priority)
+PRIORITY_WEIGHT = 10
+STARVATION_HOURS = 6
+STARVATION_BOOST = 1000
+
+def _engine_options(database_url):
+    """Connection pool settings per worker process; SQLite keeps SQLAlchemy's defaults"""
+    if database_url.startswith('sqlite'):
+        return {}
+    return {
+        'pool_size': int(os.environ.get('DB_POOL_SIZE', 3)),
+        'max_overflow': int(os.environ.get('DB_MAX_OVERFLOW', 2)),
+        'pool_timeout': 30,
+        'pool_recycle': int(os.environ.get('DB_POOL_RECYCLE', 1800)),
+        'pool_pre_ping': True,
+    }
+
 class Config:
     SECRET_KEY = os.environ.get('SECRET_KEY') or 'dev-secret-key-change-in-production'
-    SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL') or 'sqlite:///discord_summaries.db'
+    SQLALCHEMY_DATABASE_URI = normalize_database_url(os.environ.get('DATABASE_URL') or 'sqlite:///discord_summaries.db')
+    SQLALCHEMY_ENGINE_OPTIONS = _engine_options(SQLALCHEMY_DATABASE_URI)
     SQLALCHEMY_TRACK_MODIFICATIONS = False
     SCHEDULER_API_ENABLED = True
+    # Where transcripts past their retention period are archived ('gzip' or 'zstd')
+    ARCHIVE_DIR = os.environ.get('ARCHIVE_DIR') or 'archive'
+    ARCHIVE_COMPRESSION = os.environ.get('ARCHIVE_COMPRESSION') or 'gzip'
+    # Store new transcripts compactly encoded and compressed ('none', 'zlib' or 'zstd')
+    TRANSCRIPT_COMPRESSION = os.environ.get('TRANSCRIPT_COMPRESSION') or 'none'
+    # Where messages come from: 'rest' polls each channel hourly, 'gateway' buffers websocket events
+    INGEST_MODE = os.environ.get('INGEST_MODE') or 'rest'
+    GATEWAY_URL = os.environ.get('GATEWAY_URL') or 'wss://gateway.discord.gg/?v=10&encoding=json'
+    GATEWAY_LOCK_FILE = os.environ.get('GATEWAY_LOCK_FILE') or 'gateway.lock'
+    # Where the semantic search index of summary embeddings is stored
+    EMBEDDING_DIR = os.environ.get('EMBEDDING_DIR') or 'embeddings'
+    # Compiled templates are cached here (a per-user temp directory by default)
+    JINJA_CACHE_DIR = os.environ.get('JINJA_CACHE_DIR')
+    # On-demand profiles; requests are profiled only when sent with PROFILE_TOKEN
+    PROFILE_DIR = os.environ.get('PROFILE_DIR') or 'profiles'
+    PROFILE_TOKEN = os.environ.get('PROFILE_TOKEN')
+    # Run scheduled jobs and ingest in this process; web-only processes set it to false (see worker.py)
+    SCHEDULER_ENABLED = os.environ.get('SCHEDULER_ENABLED', 'true').lower() not in ('0', 'false', 'no')
 
-def create_app():
+def create_app(scheduler_enabled=None):
+    """Build the app; scheduler_enabled overrides SCHEDULER_ENABLED"""
     app = Flask(__name__)
     app.config.from_object(Config)
+    if scheduler_enabled is not None:
+        app.config['SCHEDULER_ENABLED'] = scheduler_enabled
+    # Resolve the codec once, so a typo is reported at startup and not on every saved transcript
+    if app.config['TRANSCRIPT_COMPRESSION'] != 'none':
+        from transcript_codec import available_codec
+        app.config['TRANSCRIPT_COMPRESSION'] = available_codec(app.config['TRANSCRIPT_COMPRESSION'])
+    # Workers and restarts reuse compiled templates instead of recompiling them
+    if app.config['JINJA_CACHE_DIR']:
+        os.makedirs(app.config['JINJA_CACHE_DIR'], exist_ok=True)
+    app.jinja_options = dict(app.jinja_options,
+                             bytecode_cache=FileSystemBytecodeCache(app.config['JINJA_CACHE_DIR']))
     
     # Initialize extensions with app
     db.init_app(app)
     scheduler.init_app(app)
     
-    # Import models after db initialization
+    # Import models after db initialization and bring the schema up to date
+    # (a single version query when it already is)
     with app.app_context():
         from models import AppConfig, ChannelState, Summary, DailySummary
-        db.create_all()
+        from migrate_db import migrate_engine
+        migrate_engine(db.engine)
         
     # Register blueprints
     from routes import main_bp
     app.register_blueprint(main_bp)
     
+    # Opt-in profiling of requests and scheduled jobs
+    import profiling
+    from profiling import job_profile
+    profiling.init_app(app)
+    
+    # Web-only processes leave ingest and summarization to worker.py
+    if not app.config['SCHEDULER_ENABLED']:
+        logger.info("Scheduler disabled in this process; run worker.py for ingest and summaries")
+        return app
+    
+    # Receive messages in real time instead of polling
+    if app.config['INGEST_MODE'] == 'gateway':
+        from gateway import start_gateway
+        start_gateway(app)
+    
     # Start scheduler
     if not scheduler.running:
         scheduler.start()
@@ -43,108 +132,521 @@ def create_app():
     # Schedule hourly job for summaries
     @scheduler.task('interval', id='hourly_summary', hours=1, misfire_grace_time=300)
     def scheduled_summary():
-        with app.app_context():
-            from services import DiscordService, OllamaService
-            from models import AppConfig, ChannelState, Summary
+        with app.app_context(), job_profile('hourly_summary'):
+            from services import DiscordPool, OllamaRouter
+            from models import AppConfig, ChannelState, Summary, BufferedMessage
             
             config = AppConfig.get_config()
             if not config or not config.is_configured():
                 logger.warning("Skipping scheduled summary - app not configured")
                 return
                 
-            discord_service = DiscordService(config.user_token)
-            ollama_service = OllamaService(config.ollama_url, config.model_name)
+            discord_service = DiscordPool.from_config(config)
+            backlog = sum(BufferedMessage.pending_counts(config.get_channel_ids()).values())
+            ollama_service = OllamaRouter.from_config(config, backlog)
             
-            for channel_id in config.get_channel_ids():
-                try:
-                    process_channel_summary(channel_id, discord_service, ollama_service, config)
-                except Exception as e:
-                    logger.error(f"Error processing channel {channel_id}: {str(e)}")
+            live_pass_active.set()
+            # Other nodes sharing the database process the channels we could not claim
+            claimed = ChannelState.claim(config.get_channel_ids(), worker_id())
+            try:
+                run_summary_pass(claimed, discord_service, ollama_service, config)
+            finally:
+                for channel_id in claimed:
+                    ChannelState.release(channel_id, worker_id())
+                live_pass_active.clear()
+    
+    # Update rolling summaries of busy channels between the hourly passes
+    @scheduler.task('interval', id='rolling_summary', minutes=ROLLING_CHECK_MINUTES, misfire_grace_time=60,
+                    max_instances=1)
+    def scheduled_rolling_summary():
+        # The hourly pass covers rolling channels too
+        if live_pass_active.is_set():
+            return
+        
+        with app.app_context():
+            from services import DiscordPool, OllamaRouter
+            from models import AppConfig, ChannelState, BufferedMessage
+            
+            config = AppConfig.get_config()
+            if not config or not config.is_configured():
+                return
+            
+            rolling_ids = [channel_id for (channel_id,) in db.session.query(ChannelState.channel_id).filter(
+                ChannelState.channel_id.in_(config.get_channel_ids()),
+                ChannelState.rolling_minutes > 0
+            )]
+            if not rolling_ids:
+                return
+            
+            discord_service = DiscordPool.from_config(config)
+            backlog = sum(BufferedMessage.pending_counts(config.get_channel_ids()).values())
+            ollama_service = OllamaRouter.from_config(config, backlog)
+            
+            claimed = ChannelState.claim(rolling_ids, worker_id())
+            try:
+                run_summary_pass(claimed, discord_service, ollama_service, config)
+            finally:
+                for channel_id in claimed:
+                    ChannelState.release(channel_id, worker_id())
+    
+    # Check Ollama servers so dead ones are skipped without waiting on them
+    @scheduler.task('interval', id='ollama_health', minutes=1, misfire_grace_time=30)
+    def scheduled_ollama_health():
+        with app.app_context():
+            from services import OllamaRouter
+            from models import AppConfig
+            
+            config = AppConfig.get_config()
+            if config and config.ollama_url:
+                OllamaRouter.from_config(config).check_health()
     
     # Schedule daily email job
     @scheduler.task('cron', id='daily_email', hour=9, minute=0, misfire_grace_time=3600)
     def scheduled_daily_email():
-        with app.app_context():
+        with app.app_context(), job_profile('daily_email'):
             send_daily_email_summary()
     
+    # Schedule nightly transcript archival and vacuum
+    @scheduler.task('cron', id='retention', hour=3, minute=30, misfire_grace_time=3600)
+    def scheduled_retention():
+        with app.app_context():
+            from models import AppConfig
+            from retention import run_retention
+            
+            try:
+                run_retention(AppConfig.get_config())
+            except Exception as e:
+                logger.error(f"Error running retention: {str(e)}")
+    
+    # Work through queued historical backfills a few windows at a time
+    @scheduler.task('interval', id='backfill', minutes=5, misfire_grace_time=60, max_instances=1)
+    def scheduled_backfill():
+        if live_pass_active.is_set():
+            logger.info("Skipping backfill run - hourly summaries in progress")
+            return
+        
+        with app.app_context():
+            from models import AppConfig
+            from backfill import run_backfill
+            
+            config = AppConfig.get_config()
+            if not config or not config.is_configured():
+                return
+            
+            try:
+                run_backfill(config)
+            except Exception as e:
+                db.session.rollback()
+                logger.error(f"Error running backfill: {str(e)}")
+    
+    # Embed summaries the write-time indexing missed, e.g. after a model change
+    @scheduler.task('interval', id='embeddings', minutes=10, misfire_grace_time=60, max_instances=1)
+    def scheduled_embeddings():
+        with app.app_context():
+            from models import AppConfig
+            
+            config = AppConfig.get_config()
+            if config and config.embedding_model:
+                index_summaries(config)
+    
     return app
 
+def preload(app):
+    """Prepare an app built in a gunicorn master for forking into workers.
+    
+    Compiles every template once so the workers share them, and closes the
+    master's database connections, which must not be used by several
+    processes.
+    """
+    for name in app.jinja_env.list_templates():
+        app.jinja_env.get_template(name)
+    with app.app_context():
+        db.engine.dispose()
+
+def after_fork(app):
+    """Give a forked worker its own database connection pool"""
+    with app.app_context():
+        # Leave connections inherited from the parent to the parent
+        db.engine.dispose(close=False)
+
 def process_channel_summary(channel_id, discord_service, ollama_service, config):
-    """Process summary for a single channel with improved duplicate prevention"""
+    """Fetch new messages of a channel into the buffer, then summarize the backlog"""
+    if not prepare_channel(channel_id, discord_service):
+        return
+    
+    summarize_channel(channel_id, ollama_service, config)
+
+def prepare_channel(channel_id, discord_service):
+    """Buffer new messages of a channel and return whether a summary is due"""
     from models import ChannelState, Summary
     
     # Get or create channel state
-    channel_state = ChannelState.query.filter_by(channel_id=channel_id).first()
-    if not channel_state:
-        channel_state = ChannelState(channel_id=channel_id)
-        db.session.add(channel_state)
-        db.session.commit()
-    
-    # Check when the last summary was created (improved logic)
-    current_time = datetime.now(timezone.utc)
-    
-    # Check if we already have a summary in the last hour
-    one_hour_ago = current_time - timedelta(hours=1)
-    recent_summary = Summary.query.filter(
-        Summary.channel_id == channel_id,
-        Summary.timestamp > one_hour_ago,
-        Summary.summary_type == 'hourly'
-    ).first()
+    with span('channel.state', channel_id=channel_id):
+        channel_state = ChannelState.query.filter_by(channel_id=channel_id).first()
+        # Read now, as the commits below expire the row
+        rolling_minutes = channel_state.rolling_minutes if channel_state else None
+        if not channel_state:
+            channel_state = ChannelState(channel_id=channel_id)
+            db.session.add(channel_state)
+            db.session.commit()
+    
+    # In gateway mode the buffer is filled in real time
+    if current_app.config.get('INGEST_MODE') != 'gateway':
+        with span('discord.fetch', channel_id=channel_id) as fetch_span:
+            fetch_span.set(messages=ingest_channel_messages(channel_id, discord_service))
+    
+    # Check if we already have a summary in the last hour, or the channel's rolling interval
+    if rolling_minutes:
+        # A minute of slack so an update saved just after the last check is not put off a whole check
+        since = datetime.now(timezone.utc) - timedelta(minutes=rolling_minutes - 1)
+    else:
+        since = datetime.now(timezone.utc) - timedelta(hours=1)
+    with span('summary.duplicate_check', channel_id=channel_id):
+        recent_summary = Summary.query.filter(
+            Summary.channel_id == channel_id,
+            Summary.timestamp > since,
+            Summary.summary_type.in_(('hourly', 'rolling'))
+        ).first()
     
     if recent_summary:
         logger.info(f"Skipping channel {channel_id} - summary already exists from {recent_summary.timestamp}")
-        return
-    
-    # Determine the timestamp to fetch messages from
-    fetch_after_timestamp = channel_state.last_read_timestamp
+        return False
+    return True
+
+def run_summary_pass(channel_ids, discord_service, ollama_service, config, progress=None):
+    """Buffer and summarize several channels, generating summaries concurrently.
+    
+    Fetching and database writes stay on the calling thread; only the Ollama
+    requests run in a pool sized to the servers' combined concurrency, so
+    every server is kept busy. progress, if given, is called with an event
+    dict as each channel is fetched, summarized or fails; every channel ends
+    with an up_to_date or error event, or a summary event marked final. Returns
+    {channel_id: result dict}.
+    """
+    with span('summary_pass', channels=len(channel_ids)) as pass_span:
+        results = _run_summary_pass(channel_ids, discord_service, ollama_service, config,
+                                    progress or (lambda event: None))
+        pass_span.set(summaries=sum(result['summaries'] for result in results.values()),
+                      errors=sum(result['status'] == 'error' for result in results.values()))
+    return results
+
+def _run_summary_pass(channel_ids, discord_service, ollama_service, config, progress):
+    from models import ChannelState
+    
+    results = {}
+    due = []
+    priorities = dict(db.session.query(ChannelState.channel_id, ChannelState.priority)
+                      .filter(ChannelState.channel_id.in_(channel_ids)))
+    now = datetime.now(timezone.utc)
+    
+    # Higher priority channels are fetched first too
+    for channel_id in sorted(channel_ids, key=lambda cid: -(priorities.get(cid) or 0)):
+        results[channel_id] = {'channel_id': channel_id, 'status': 'success', 'summaries': 0}
+        try:
+            if prepare_channel(channel_id, discord_service):
+                due.append(channel_id)
+                progress({'event': 'fetched', 'channel_id': channel_id})
+            else:
+                progress({'event': 'up_to_date', 'channel_id': channel_id})
+        except Exception as e:
+            db.session.rollback()
+            logger.error(f"Error processing channel {channel_id}: {str(e)}")
+            results[channel_id].update(status='error', error=str(e))
+            progress({'event': 'error', 'channel_id': channel_id, 'error': str(e)})
+    
+    workers = max(getattr(ollama_service, 'capacity', 1), 1)
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        pending = {}
+        # Running state of the channels with rolling summaries
+        rolling = {}
+        # Jobs wait here, best score first, until a worker is free
+        queue = []
+        sequence = itertools.count()
+        
+        def next_job(channel_id):
+            # The channel's next chunk with text to summarize, skipping chunks without any
+            while True:
+                messages, rolling_state = next_summary_chunk(channel_id)
+                if not messages:
+                    return None
+                content = traced_transcript(channel_id, messages)
+                if content.strip():
+                    if rolling_state is not None:
+                        rolling[channel_id] = rolling_state
+                    return channel_id, messages, content
+                save_channel_summary(channel_id, messages, None)
+        
+        def submit(jobs):
+            if len(jobs) == 1:
+                attributes = {'channel_id': jobs[0][0], 'messages': len(jobs[0][1]), 'bytes': len(jobs[0][2].encode())}
+            else:
+                attributes = {'channel_ids': [channel_id for channel_id, _, _ in jobs],
+                              'messages': sum(len(messages) for _, messages, _ in jobs),
+                              'bytes': sum(len(content.encode()) for _, _, content in jobs)}
+            
+            if len(jobs) == 1 and jobs[0][0] in rolling:
+                from rolling import summarize_rolling
+                future = pool.submit(traced(summarize_rolling, 'ollama.generate', rolling=True, **attributes),
+                                     ollama_service, jobs[0][0], rolling[jobs[0][0]], jobs[0][2])
+            elif len(jobs) == 1 and config.cluster_threads:
+                from threads import summarize_threads
+                future = pool.submit(traced(summarize_threads, 'ollama.generate', **attributes),
+                                     ollama_service, config, jobs[0][1], jobs[0][2])
+            elif len(jobs) == 1:
+                future = pool.submit(traced(ollama_service.generate_summary, 'ollama.generate', **attributes),
+                                     jobs[0][2], config.summary_prompt, 500)
+            else:
+                from batching import summarize_batch
+                future = pool.submit(traced(summarize_batch, 'ollama.generate', **attributes), ollama_service, config,
+                                     [(channel_id, content) for channel_id, _, content in jobs])
+            pending[future] = jobs
+        
+        def enqueue(jobs):
+            score = max(summary_priority(priorities.get(channel_id) or 0, messages, now)
+                        for channel_id, messages, _ in jobs)
+            heapq.heappush(queue, (-score, next(sequence), jobs))
+        
+        def fill():
+            while queue and len(pending) < workers:
+                submit(heapq.heappop(queue)[2])
+        
+        def fail(channel_id, error):
+            db.session.rollback()
+            logger.error(f"Error processing channel {channel_id}: {str(error)}")
+            results[channel_id].update(status='error', error=str(error))
+            progress({'event': 'error', 'channel_id': channel_id, 'error': str(error)})
+        
+        first_jobs = []
+        for channel_id in due:
+            try:
+                job = next_job(channel_id)
+                if job:
+                    first_jobs.append(job)
+                else:
+                    # Nothing with text to summarize
+                    progress({'event': 'up_to_date', 'channel_id': channel_id})
+            except Exception as e:
+                fail(channel_id, e)
+        
+        # Low-volume channels share one prompt when batching is enabled; a custom prompt turns it off
+        if config.batch_small_channels and config.uses_default_prompt() and hasattr(ollama_service, 'generate'):
+            from batching import group_batches
+            small = [job for job in first_jobs
+                     if job[0] not in rolling and len(job[1]) <= (config.batch_max_messages or 0)]
+            for batch in group_batches(small):
+                enqueue(batch)
+            first_jobs = [job for job in first_jobs if job not in small]
+        for job in first_jobs:
+            enqueue([job])
+        fill()
+        
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                jobs = pending.pop(future)
+                try:
+                    result = future.result()
+                except Exception as e:
+                    for channel_id, _, _ in jobs:
+                        fail(channel_id, e)
+                    continue
+                
+                summaries = result if len(jobs) > 1 else {jobs[0][0]: result}
+                for channel_id, messages, _ in jobs:
+                    summary_text = summaries.get(channel_id)
+                    if isinstance(summary_text, Exception):
+                        fail(channel_id, summary_text)
+                        continue
+                    try:
+                        rolling_state = None
+                        if channel_id in rolling:
+                            summary_text, rolling_state = summary_text
+                        save_channel_summary(channel_id, messages, summary_text, rolling_state)
+                        results[channel_id]['summaries'] += 1
+                        # Drain larger backlogs chunk by chunk
+                        job = next_job(channel_id) if len(messages) >= SUMMARY_MAX_MESSAGES else None
+                        if job:
+                            enqueue([job])
+                        progress({'event': 'summary', 'channel_id': channel_id, 'messages': len(messages),
+                                  'final': job is None})
+                    except Exception as e:
+                        fail(channel_id, e)
+            fill()
+    
+    # Make the new summaries searchable right away
+    if any(result['summaries'] for result in results.values()):
+        index_summaries(config)
+    
+    return results
+
+def index_summaries(config):
+    """Embed new summaries for semantic search; failures are retried by the next run"""
+    from embeddings import index_new_summaries
     
-    # If we have any previous hourly summary, use its timestamp as starting point
-    last_hourly_summary = Summary.query.filter(
-        Summary.channel_id == channel_id,
-        Summary.summary_type == 'hourly'
-    ).order_by(Summary.timestamp.desc()).first()
+    try:
+        return index_new_summaries(config)
+    except Exception as e:
+        db.session.rollback()
+        logger.error(f"Error indexing summaries for search: {str(e)}")
+        return 0
+
+def summary_priority(priority, messages, now):
+    """Score of a summary job; higher scores are summarized first.
+    
+    Channel priority dominates, each hour the oldest message has waited adds
+    a point and message volume adds a little, so a waiting channel slowly
+    overtakes busier ones. Backlogs older than STARVATION_HOURS go ahead of
+    everything so low-priority channels are never starved.
+    """
+    oldest = min(datetime.fromisoformat(msg['timestamp'].replace('Z', '+00:00')) for msg in messages)
+    age_hours = max((now - oldest).total_seconds() / 3600, 0)
+    
+    score = priority * PRIORITY_WEIGHT + age_hours + math.log2(1 + len(messages))
+    if age_hours >= STARVATION_HOURS:
+        score += STARVATION_BOOST
+    return score
+
+def ingest_channel_messages(channel_id, discord_service):
+    """Fetch messages newer than the channel's fetched watermark into the message buffer"""
+    from models import BufferedMessage, ChannelState
     
-    if last_hourly_summary:
-        # Ensure the timestamp is timezone-aware
-        last_summary_time = last_hourly_summary.timestamp
-        if last_summary_time.tzinfo is None:
-            last_summary_time = last_summary_time.replace(tzinfo=timezone.utc)
+    after = BufferedMessage.latest_message_id(channel_id)
+    if not after:
+        channel_state = ChannelState.query.filter_by(channel_id=channel_id).first()
+        if channel_state:
+            after = channel_state.fetched_until or channel_state.summarized_until or channel_state.last_read_timestamp
+    
+    fetched = 0
+    for _ in range(INGEST_MAX_PAGES):
+        messages = discord_service.fetch_messages(channel_id, after_timestamp=after)
+        if not messages:
+            break
         
-        # Convert summary timestamp to ISO format string for Discord API
-        last_summary_iso = last_summary_time.isoformat().replace('+00:00', 'Z')
+        BufferedMessage.apply_events([('MESSAGE_CREATE', dict(msg, channel_id=channel_id)) for msg in messages])
+        fetched += len(messages)
         
-        # Use the later of the two timestamps
-        if not fetch_after_timestamp or last_summary_iso > fetch_after_timestamp:
-            fetch_after_timestamp = last_summary_iso
-    
-    # Fetch messages since last read or last summary
-    messages = discord_service.fetch_messages(
-        channel_id, 
-        after_timestamp=fetch_after_timestamp
-    )
-    
-    if not messages:
-        logger.info(f"No new messages in channel {channel_id} since {fetch_after_timestamp}")
-        return
+        # Without a watermark only the latest page is fetched
+        if not after or len(messages) < 100:
+            break
+        after = messages[-1]['id']
+    
+    if fetched:
+        logger.info(f"Buffered {fetched} new messages from channel {channel_id}")
+    return fetched
+
+def summarize_channel(channel_id, ollama_service, config):
+    """Summarize buffered messages past the channel's summarized watermark.
+    
+    Large backlogs are summarized in chunks of SUMMARY_MAX_MESSAGES, each
+    committed on its own. If Ollama fails, OllamaError propagates and the
+    messages stay buffered to be retried on the next pass without refetching.
+    """
+    created = 0
+    
+    while True:
+        messages, rolling_state = next_summary_chunk(channel_id)
+        if not messages:
+            if not created:
+                logger.info(f"No new messages in channel {channel_id}")
+            return created
+        
+        # Prepare content for summarization
+        content = traced_transcript(channel_id, messages)
+        
+        summary_text = None
+        if content.strip() and rolling_state is not None:
+            from rolling import summarize_rolling
+            with span('ollama.generate', channel_id=channel_id, messages=len(messages), bytes=len(content.encode()),
+                      rolling=True):
+                summary_text, rolling_state = summarize_rolling(ollama_service, channel_id, rolling_state, content)
+            created += 1
+        elif content.strip() and config.cluster_threads:
+            from threads import summarize_threads
+            with span('ollama.generate', channel_id=channel_id, messages=len(messages), bytes=len(content.encode())):
+                summary_text = summarize_threads(ollama_service, config, messages, content)
+            created += 1
+        elif content.strip():
+            # Get summary from Ollama using custom prompt
+            with span('ollama.generate', channel_id=channel_id, messages=len(messages), bytes=len(content.encode())):
+                summary_text = ollama_service.generate_summary(
+                    content, 
+                    config.summary_prompt, 
+                    max_length=500
+                )
+            created += 1
+        
+        save_channel_summary(channel_id, messages, summary_text, rolling_state if summary_text else None)
+        
+        if len(messages) < SUMMARY_MAX_MESSAGES:
+            return created
+
+def next_summary_chunk(channel_id):
+    """Oldest buffered messages of a channel not covered by a summary yet.
     
-    # Prepare content for summarization
-    content = "\n".join([
-        f"{msg['author']['username']}: {msg['content']}" 
-        for msg in messages if msg.get('content')
-    ])
+    Returns (messages, rolling state); the state is None unless the channel
+    has rolling summaries.
+    """
+    from models import BufferedMessage, ChannelState
     
-    if not content.strip():
-        logger.info(f"No text content to summarize in channel {channel_id}")
-        return
+    with span('buffer.read', channel_id=channel_id) as read_span:
+        channel_state = ChannelState.query.filter_by(channel_id=channel_id).first()
+        summarized_until = channel_state.summarized_until or channel_state.last_read_timestamp
+        messages = BufferedMessage.fetch_since(channel_id, summarized_until, limit=SUMMARY_MAX_MESSAGES)
+        read_span.set(messages=len(messages))
+    rolling_state = channel_state.get_rolling_state() if channel_state.rolling_minutes else None
+    return messages, rolling_state
+
+def save_channel_summary(channel_id, messages, summary_text, rolling_state=None):
+    """Save a summary of messages and advance the channel's summarized watermark.
+    
+    Without summary_text (no text content) only the watermark advances. A
+    rolling_state is saved as the channel's new running state, in the same
+    transaction as its summary.
+    """
+    from models import ChannelState, Summary
     
-    # Get summary from Ollama using custom prompt
-    summary_text = ollama_service.generate_summary(
-        content, 
-        config.summary_prompt, 
-        max_length=500
-    )
+    if summary_text is not None:
+        summary = Summary(
+            channel_id=channel_id,
+            summary_text=summary_text,
+            message_count=len(messages),
+            timestamp=datetime.now(timezone.utc),
+            summary_type='hourly' if rolling_state is None else 'rolling'
+        )
+        with span('summary.serialize', channel_id=channel_id, messages=len(messages)) as serialize_span:
+            summary.set_messages(prepare_stored_messages(messages))
+            serialize_span.set(bytes=len(summary.messages_blob or summary.original_messages or ''))
+        db.session.add(summary)
+        logger.info(f"Successfully created {summary.summary_type} summary for channel {channel_id} with {len(messages)} messages")
+    else:
+        logger.info(f"No text content to summarize in channel {channel_id}")
     
-    # Prepare messages for storage (only essential fields)
+    # Advance the summarized watermark together with the summary
+    latest_timestamp = max(msg['timestamp'] for msg in messages)
+    with span('summary.commit', channel_id=channel_id, messages=len(messages), summarized=summary_text is not None):
+        channel_state = ChannelState.query.filter_by(channel_id=channel_id).first()
+        channel_state.summarized_until = latest_timestamp
+        channel_state.last_read_timestamp = latest_timestamp
+        if rolling_state is not None:
+            channel_state.set_rolling_state(rolling_state)
+        db.session.commit()
+
+def traced_transcript(channel_id, messages):
+    """build_transcript of a channel's messages, recorded as a trace span"""
+    with span('transcript.build', channel_id=channel_id, messages=len(messages)) as transcript_span:
+        content = build_transcript(messages)
+        transcript_span.set(bytes=len(content.encode()))
+    return content
+
+def build_transcript(messages):
+    """Format Discord messages as the plain-text conversation sent to the model"""
+    return "\n".join([
+        f"{msg['author']['username']}: {msg['content']}" 
+        for msg in messages if msg.get('content')
+    ])
+
+def prepare_stored_messages(messages):
+    """Keep only the message fields stored with a summary"""
     stored_messages = []
     for msg in messages:
         stored_messages.append({
@@ -159,29 +661,12 @@ def process_channel_summary(channel_id, discord_service, ollama_service, config)
             'attachments': [{'url': att.get('url'), 'filename': att.get('filename')} 
                           for att in msg.get('attachments', [])]
         })
-    
-    # Save summary
-    summary = Summary(
-        channel_id=channel_id,
-        summary_text=summary_text,
-        message_count=len(messages),
-        timestamp=current_time,
-        summary_type='hourly'
-    )
-    summary.set_messages(stored_messages)
-    db.session.add(summary)
-    
-    # Update last read timestamp to the latest message
-    latest_timestamp = max(msg['timestamp'] for msg in messages)
-    channel_state.last_read_timestamp = latest_timestamp
-    
-    db.session.commit()
-    logger.info(f"Successfully created hourly summary for channel {channel_id} with {len(messages)} messages")
+    return stored_messages
 
 def send_daily_email_summary():
     """Send daily email summary to user"""
-    from models import AppConfig, ChannelState, Summary, DailySummary
-    from services import EmailService, DiscordService
+    from models import AppConfig, DailySummary
+    from services import EmailService, DiscordPool
     
     config = AppConfig.get_config()
     if not config.is_email_configured():
@@ -202,9 +687,7 @@ def send_daily_email_summary():
     
     # Get current time in user's timezone
     try:
-        import pytz
-        user_tz = pytz.timezone(config.timezone)
-        current_time = datetime.now(user_tz).time()
+        current_time = datetime.now(config.get_tzinfo()).time()
         
         # Parse the configured email time
         email_time_parts = config.daily_email_time.split(':')
@@ -220,13 +703,66 @@ def send_daily_email_summary():
         pass
     
     # Group channels by server and collect summaries from last 24 hours
-    server_summaries = {}
-    discord_service = DiscordService(config.user_token)
-    
+    discord_service = DiscordPool.from_config(config)
     yesterday = datetime.now(timezone.utc) - timedelta(days=1)
+    server_summaries = collect_daily_summaries(config, discord_service, yesterday)
     
-    for channel_id in config.get_channel_ids():
-        channel_state = ChannelState.query.filter_by(channel_id=channel_id).first()
+    # Send email
+    email_service = EmailService(config)
+    success = email_service.send_daily_summary_email(server_summaries)
+    
+    if success:
+        # Mark as sent for each server
+        for server_name in server_summaries.keys():
+            daily_summary = DailySummary(
+                server_name=server_name,
+                summary_date=today,
+                email_sent=True,
+                email_sent_at=datetime.now(timezone.utc)
+            )
+            db.session.add(daily_summary)
+        
+        db.session.commit()
+        logger.info(f"Daily email summary sent successfully for {today}")
+    else:
+        logger.error(f"Failed to send daily email summary for {today}")
+
+def collect_daily_summaries(config, discord_service, since):
+    """Hourly summaries of the configured channels since a time, as {server name: [channel dict]}.
+    
+    Of a channel's rolling summaries only the last of each hour is included,
+    as each one repeats what is still relevant from the one before.
+    """
+    from models import ChannelState, Summary
+    
+    server_summaries = {}
+    channel_ids = config.get_channel_ids()
+    
+    # Two queries for all channels instead of two per channel
+    channel_states = {state.channel_id: state for state in
+                      ChannelState.query.filter(ChannelState.channel_id.in_(channel_ids))}
+    summaries_by_channel = {}
+    daily_summaries = Summary.query.options(
+        load_only(Summary.channel_id, Summary.summary_text, Summary.message_count, Summary.timestamp,
+                  Summary.summary_type)
+    ).filter(
+        Summary.channel_id.in_(channel_ids),
+        Summary.timestamp > since,
+        Summary.summary_type.in_(('hourly', 'rolling'))
+    ).order_by(Summary.timestamp.asc())
+    for summary in daily_summaries:
+        # [summary, messages covered] per channel
+        channel_summaries = summaries_by_channel.setdefault(summary.channel_id, [])
+        previous = channel_summaries[-1][0] if channel_summaries else None
+        if (previous is not None and previous.summary_type == summary.summary_type == 'rolling'
+                and previous.timestamp.replace(minute=0, second=0, microsecond=0)
+                == summary.timestamp.replace(minute=0, second=0, microsecond=0)):
+            channel_summaries[-1] = [summary, channel_summaries[-1][1] + summary.message_count]
+        else:
+            channel_summaries.append([summary, summary.message_count])
+    
+    for channel_id in channel_ids:
+        channel_state = channel_states.get(channel_id)
         if not channel_state:
             continue
         
@@ -242,20 +778,13 @@ def send_daily_email_summary():
         except:
             channel_name = f'Channel {channel_id}'
         
-        # Get summaries from last 24 hours
-        daily_summaries = Summary.query.filter(
-            Summary.channel_id == channel_id,
-            Summary.timestamp > yesterday,
-            Summary.summary_type == 'hourly'
-        ).order_by(Summary.timestamp.asc()).all()
-        
         # Format summaries for email
         formatted_summaries = []
-        for summary in daily_summaries:
+        for summary, message_count in summaries_by_channel.get(channel_id, []):
             formatted_summaries.append({
                 'text': summary.summary_text,
                 'timestamp': config.format_datetime(summary.timestamp),
-                'message_count': summary.message_count
+                'message_count': message_count
             })
         
         server_summaries[server_name].append({
@@ -264,25 +793,7 @@ def send_daily_email_summary():
             'summaries': formatted_summaries
         })
     
-    # Send email
-    email_service = EmailService(config)
-    success = email_service.send_daily_summary_email(server_summaries)
-    
-    if success:
-        # Mark as sent for each server
-        for server_name in server_summaries.keys():
-            daily_summary = DailySummary(
-                server_name=server_name,
-                summary_date=today,
-                email_sent=True,
-                email_sent_at=datetime.now(timezone.utc)
-            )
-            db.session.add(daily_summary)
-        
-        db.session.commit()
-        logger.info(f"Daily email summary sent successfully for {today}")
-    else:
-        logger.error(f"Failed to send daily email summary for {today}")
+    return server_summaries
 
 if __name__ == '__main__':
     app = create_app()
@@ -0,0 +1,228 @@
+"""
+Historical backfill for newly added channels.
+
+A backfill job walks a channel's history backwards from the point where live
+summaries start, one time window at a time. Each run fetches a few windows
+concurrently (through a rate limiter per Discord token), splits their messages into
+hourly buckets and summarizes the buckets in parallel. Finished windows are
+recorded on the job, so an interrupted backfill resumes where it stopped.
+A window that keeps failing marks its job failed, so the queue moves on.
+Runs are small and skip while the live hourly pass is active so the live
+pass is never starved of Discord or Ollama capacity.
+"""
+import os
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone, timedelta
+
+from sqlalchemy import func
+
+from app import db, build_transcript, prepare_stored_messages, index_summaries
+from services import DiscordService, DiscordPool, OllamaRouter, RateLimiter
+
+logger = logging.getLogger(__name__)
+
+BACKFILL_WINDOW_HOURS = int(os.environ.get('BACKFILL_WINDOW_HOURS', 24))
+# Windows processed per scheduled run, bounding how long a run holds resources
+BACKFILL_WINDOWS_PER_RUN = int(os.environ.get('BACKFILL_WINDOWS_PER_RUN', 4))
+BACKFILL_FETCH_WORKERS = int(os.environ.get('BACKFILL_FETCH_WORKERS', 2))
+BACKFILL_SUMMARY_WORKERS = int(os.environ.get('BACKFILL_SUMMARY_WORKERS', 2))
+BACKFILL_REQUESTS_PER_SECOND = float(os.environ.get('BACKFILL_REQUESTS_PER_SECOND', 1))
+# Failed attempts at one window before its job is marked failed and the next job runs
+BACKFILL_MAX_ATTEMPTS = int(os.environ.get('BACKFILL_MAX_ATTEMPTS', 3))
+
+# One per Discord token, shared by every backfill run in this process
+_rate_limiters = {}
+_rate_limiters_lock = threading.Lock()
+
+def _get_rate_limiters(tokens):
+    with _rate_limiters_lock:
+        for token in tokens:
+            if token not in _rate_limiters:
+                _rate_limiters[token] = RateLimiter(BACKFILL_REQUESTS_PER_SECOND, burst=BACKFILL_FETCH_WORKERS)
+        return {token: _rate_limiters[token] for token in tokens}
+
+def _floor_hour(dt):
+    return dt.replace(minute=0, second=0, microsecond=0)
+
+def _backfill_end(channel_id):
+    """Newest point to backfill: just before the first message the live pass covers"""
+    from models import BufferedMessage, Summary, _as_utc
+
+    end = _floor_hour(datetime.now(timezone.utc))
+    oldest = Summary.query.filter_by(channel_id=channel_id).order_by(Summary.timestamp.asc()).first()
+    if oldest:
+        timestamps = [m['timestamp'] for m in oldest.get_messages() if m.get('timestamp')]
+        if timestamps:
+            first_message = DiscordService.parse_timestamp(min(timestamps))
+        else:
+            first_message = _as_utc(oldest.timestamp) - timedelta(hours=1)
+        end = min(end, _floor_hour(first_message))
+
+    # Buffered messages are summarized by the live pass
+    first_buffered = db.session.query(func.min(BufferedMessage.timestamp)).filter(
+        BufferedMessage.channel_id == channel_id
+    ).scalar()
+    if first_buffered:
+        end = min(end, _floor_hour(DiscordService.parse_timestamp(first_buffered)))
+    return end
+
+def create_backfill_job(channel_id, days):
+    """Queue a backfill of the given number of days, reusing an active job"""
+    from models import BackfillJob, ChannelState
+
+    active = BackfillJob.query.filter(
+        BackfillJob.channel_id == channel_id,
+        BackfillJob.status.in_(['pending', 'running'])
+    ).first()
+    if active:
+        return active
+
+    channel_state = ChannelState.query.filter_by(channel_id=channel_id).first()
+    if not channel_state:
+        channel_state = ChannelState(channel_id=channel_id)
+        db.session.add(channel_state)
+
+    end = _backfill_end(channel_id)
+    if not (channel_state.fetched_until or channel_state.summarized_until or channel_state.last_read_timestamp):
+        # Without a watermark the live pass would start with the latest page of
+        # messages, which the backfill covers too; start it where the backfill ends
+        channel_state.fetched_until = end.isoformat()
+    job = BackfillJob(
+        channel_id=channel_id,
+        start_time=end - timedelta(days=days),
+        end_time=end,
+        window_hours=BACKFILL_WINDOW_HOURS,
+        status='pending'
+    )
+    db.session.add(job)
+    db.session.commit()
+    logger.info(f"Queued {days} day backfill for channel {channel_id}")
+    return job
+
+def _hourly_buckets(messages):
+    """Group messages (oldest first) into {bucket_end: [messages]}"""
+    buckets = {}
+    for msg in messages:
+        bucket_end = _floor_hour(DiscordService.parse_timestamp(msg['timestamp'])) + timedelta(hours=1)
+        buckets.setdefault(bucket_end, []).append(msg)
+    return buckets
+
+def _summarize_bucket(ollama_service, config, messages):
+    content = build_transcript(messages)
+    if not content.strip():
+        return None
+    return ollama_service.generate_summary(content, config.summary_prompt, max_length=500)
+
+def run_backfill(config, max_windows=BACKFILL_WINDOWS_PER_RUN):
+    """Process up to max_windows windows of the oldest active backfill job.
+
+    Returns the job that was worked on, or None if there was nothing to do.
+    """
+    from models import BackfillJob, Summary, _as_utc
+
+    job = BackfillJob.query.filter(
+        BackfillJob.status.in_(['pending', 'running'])
+    ).order_by(BackfillJob.created_at.asc()).first()
+    if not job:
+        return None
+
+    windows = job.remaining_windows()[:max_windows]
+    if not windows:
+        job.status = 'completed'
+        db.session.commit()
+        return job
+
+    job.status = 'running'
+    db.session.commit()
+
+    discord_service = DiscordPool.from_config(config, _get_rate_limiters(config.get_discord_tokens()))
+
+    # Fetch the windows concurrently; the rate limiter keeps us within Discord's limits
+    fetched = {}
+    failed_windows = set()
+    with ThreadPoolExecutor(max_workers=BACKFILL_FETCH_WORKERS) as pool:
+        futures = {
+            index: pool.submit(discord_service.fetch_messages_between, job.channel_id, start, end)
+            for index, start, end in windows
+        }
+        for index, future in futures.items():
+            try:
+                fetched[index] = future.result()
+            except Exception as e:
+                failed_windows.add(index)
+                job.last_error = f"Window {index}: {str(e)}"
+                logger.error(f"Backfill fetch failed for channel {job.channel_id} window {index}: {str(e)}")
+
+    # Buckets summarized by an earlier, interrupted run are not redone
+    oldest = min(start for _, start, _ in windows)
+    newest = max(end for _, _, end in windows)
+    existing = {
+        _as_utc(ts) for (ts,) in db.session.query(Summary.timestamp).filter(
+            Summary.channel_id == job.channel_id,
+            Summary.summary_type == 'hourly',
+            Summary.timestamp > oldest,
+            Summary.timestamp <= newest
+        )
+    }
+
+    work = []
+    for index, messages in fetched.items():
+        job.messages_fetched = (job.messages_fetched or 0) + len(messages)
+        for bucket_end, bucket_messages in _hourly_buckets(messages).items():
+            if bucket_end not in existing:
+                work.append((index, bucket_end, bucket_messages))
+
+    # A backfill is a large backlog, so it may use the fallback model
+    ollama_service = OllamaRouter.from_config(config, backlog=sum(len(bucket) for _, _, bucket in work))
+    
+    # Summarize every bucket of every window in parallel
+    with ThreadPoolExecutor(max_workers=BACKFILL_SUMMARY_WORKERS) as pool:
+        futures = [
+            (index, bucket_end, bucket_messages,
+             pool.submit(_summarize_bucket, ollama_service, config, bucket_messages))
+            for index, bucket_end, bucket_messages in work
+        ]
+
+        for index, bucket_end, bucket_messages, future in futures:
+            try:
+                summary_text = future.result()
+            except Exception as e:
+                failed_windows.add(index)
+                job.last_error = f"Window {index}: {str(e)}"
+                logger.error(f"Backfill summary failed for channel {job.channel_id}: {str(e)}")
+                continue
+            if summary_text is None:
+                continue
+
+            summary = Summary(
+                channel_id=job.channel_id,
+                summary_text=summary_text,
+                message_count=len(bucket_messages),
+                timestamp=bucket_end,
+                summary_type='hourly'
+            )
+            summary.set_messages(prepare_stored_messages(bucket_messages))
+            db.session.add(summary)
+            job.summaries_created = (job.summaries_created or 0) + 1
+
+    for index in fetched:
+        if index not in failed_windows:
+            job.mark_window_completed(index)
+
+    for index in sorted(failed_windows):
+        if job.record_window_failure(index) >= BACKFILL_MAX_ATTEMPTS:
+            job.status = 'failed'
+    if job.status == 'failed':
+        logger.error(f"Backfill of channel {job.channel_id} failed after {BACKFILL_MAX_ATTEMPTS} attempts: {job.last_error}")
+    elif not job.remaining_windows():
+        job.status = 'completed'
+        logger.info(f"Backfill of channel {job.channel_id} completed")
+
+    db.session.commit()
+    
+    # Make the backfilled summaries searchable
+    if job.summaries_created:
+        index_summaries(config)
+    return job
@@ -0,0 +1,102 @@
+"""
+Batched summaries for low-volume channels.
+
+Channels with only a few new messages are packed several at a time into a
+single prompt asking for a JSON object keyed by channel ID, so one model
+call (and one prompt evaluation) covers all of them. Each answer is
+validated; channels missing from the answer, or all of them when the
+answer is not valid JSON, are summarized with individual calls instead.
+
+The batch prompt has its own instructions, so batching only applies while
+the configured summary prompt is the default one.
+"""
+import json
+import logging
+
+from services import OllamaError
+
+logger = logging.getLogger(__name__)
+
+# Limits per batched prompt
+BATCH_MAX_CHANNELS = 6
+BATCH_MAX_CHARS = 12000
+
+BATCH_PROMPT = '''Below are conversations from {count} different Discord channels. Summarize each channel separately.
+Focus on the main topics discussed, key decisions made, and important information shared.
+Keep each summary under {max_length} words.
+
+Respond with only a JSON object that maps every channel ID to its summary, for example:
+{{"123": "Summary of channel 123", "456": "Summary of channel 456"}}
+
+{conversations}
+'''
+
+def group_batches(jobs, max_channels=BATCH_MAX_CHANNELS, max_chars=BATCH_MAX_CHARS):
+    """Split (channel_id, messages, content) jobs into batches within the prompt limits"""
+    batches = []
+    batch = []
+    size = 0
+    for job in jobs:
+        length = len(job[2])
+        if batch and (len(batch) >= max_channels or size + length > max_chars):
+            batches.append(batch)
+            batch = []
+            size = 0
+        batch.append(job)
+        size += length
+    if batch:
+        batches.append(batch)
+    return batches
+
+def build_batch_prompt(transcripts, max_length=500):
+    """Prompt covering several channels; transcripts is a list of (channel_id, content)"""
+    conversations = '\n\n'.join(
+        f"### Channel {channel_id}\n{content}" for channel_id, content in transcripts
+    )
+    return BATCH_PROMPT.format(count=len(transcripts), max_length=max_length, conversations=conversations)
+
+def parse_batch_response(text, channel_ids):
+    """Summaries by channel ID from a model answer, ignoring unknown or empty entries.
+
+    Raises ValueError when the answer is not a JSON object.
+    """
+    data = json.loads(text)
+    if not isinstance(data, dict):
+        raise ValueError("Batch response is not a JSON object")
+
+    expected = set(channel_ids)
+    summaries = {}
+    for key, value in data.items():
+        channel_id = str(key).strip().removeprefix('Channel ').strip()
+        if channel_id in expected and isinstance(value, str) and value.strip():
+            summaries[channel_id] = value.strip()
+    return summaries
+
+def summarize_batch(ollama_service, config, transcripts, max_length=500):
+    """Summarize several channels with one call, falling back to one call per channel.
+
+    Returns {channel_id: summary text or the OllamaError of its fallback call}.
+    """
+    channel_ids = [channel_id for channel_id, _ in transcripts]
+    summaries = {}
+
+    try:
+        response = ollama_service.generate(
+            build_batch_prompt(transcripts, max_length),
+            max_length=max_length * len(transcripts),
+            response_format='json'
+        )
+        summaries = parse_batch_response(response, channel_ids)
+    except (OllamaError, ValueError) as e:
+        logger.warning(f"Batched summary of {len(transcripts)} channels failed: {str(e)}")
+
+    missing = [(channel_id, content) for channel_id, content in transcripts if channel_id not in summaries]
+    if missing and summaries:
+        logger.info(f"Batched summary missed {len(missing)} of {len(transcripts)} channels, summarizing them individually")
+
+    for channel_id, content in missing:
+        try:
+            summaries[channel_id] = ollama_service.generate_summary(content, config.summary_prompt, max_length=500)
+        except OllamaError as e:
+            summaries[channel_id] = e
+    return summaries
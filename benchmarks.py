@@ -0,0 +1,395 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmarks for performance-sensitive parts of Discord Summarizer.
+
+Usage:
+    python benchmarks.py transcripts [--messages 2000] [--rounds 20]
+    python benchmarks.py view-summary [--messages 10000] [--rounds 5]
+    python benchmarks.py suite [--rounds 5] [--report perf-report.json] [--latency-scale 1]
+
+The suite is the regression gate: it seeds a scratch database, runs the
+summary pipeline against the Discord and Ollama fakes and requests the
+heaviest pages, and exits non-zero when a scenario goes over its query or
+latency budget in SUITE_BUDGETS. tests/test_performance.py runs the same
+scenarios under pytest.
+"""
+import argparse
+import itertools
+import json
+import os
+import platform
+import random
+import statistics
+import string
+import sys
+import tempfile
+import time
+from collections import Counter
+from types import SimpleNamespace
+from datetime import datetime, timedelta, timezone
+
+# Scenario -> (queries, median milliseconds) allowed by the suite. Query
+# budgets do not grow with the seeded data, so a reintroduced N+1 query
+# fails the run; latency budgets leave headroom for slower machines and
+# can be scaled with --latency-scale.
+SUITE_BUDGETS = {
+    'process_channel_summary': (14, 150),
+    'dashboard': (2, 50),
+    'channel_summaries_search': (3, 30),
+    'view_summary': (2, 120),
+    'daily_email': (2, 100),
+}
+# Seeded data: channels, hourly summaries per channel and messages per transcript
+SUITE_CHANNELS = 30
+SUITE_SUMMARIES_PER_CHANNEL = 48
+SUITE_TRANSCRIPT_MESSAGES = 50
+# Messages of the large summary page and of each pipeline run
+SUITE_LARGE_SUMMARY_MESSAGES = 5000
+SUITE_PIPELINE_MESSAGES = 300
+
+def _synthetic_messages(count, authors=25, seed=42):
+    """Generate a transcript shaped like the ones process_channel_summary stores"""
+    rng = random.Random(seed)
+    people = [{
+        'username': f"user_{i}",
+        'id': str(100000000000000000 + i),
+        'avatar': ''.join(rng.choices('0123456789abcdef', k=32)) if i % 4 else None
+    } for i in range(authors)]
+    words = [''.join(rng.choices(string.ascii_lowercase, k=rng.randint(2, 9))) for _ in range(500)]
+
+    messages = []
+    for i in range(count):
+        attachments = []
+        if rng.random() < 0.05:
+            name = f"image_{i}.png"
+            attachments.append({
+                'url': f"https://cdn.discordapp.com/attachments/123456789012345678/{900000000000000000 + i}/{name}",
+                'filename': name
+            })
+        messages.append({
+            'id': str(1200000000000000000 + i),
+            'author': dict(rng.choice(people)),
+            'content': ' '.join(rng.choices(words, k=rng.randint(3, 40))),
+            'timestamp': f"2024-05-01T12:{(i // 60) % 60:02d}:{i % 60:02d}.000000+00:00",
+            'attachments': attachments
+        })
+    return messages
+
+def _time_per_call(func, rounds):
+    """Best-of-rounds wall time of func in milliseconds"""
+    best = float('inf')
+    for _ in range(rounds):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+def bench_transcripts(args):
+    """Compare stored size and decode time of JSON vs compact transcripts"""
+    from transcript_codec import encode_messages, decode_messages, available_codec, CODECS
+
+    messages = _synthetic_messages(args.messages)
+    as_json = json.dumps(messages)
+    json_size = len(as_json.encode('utf-8'))
+    json_ms = _time_per_call(lambda: json.loads(as_json), args.rounds)
+
+    print(f"Transcript of {args.messages} messages")
+    print(f"{'encoding':<12}{'bytes':>12}{'ratio':>8}{'decode ms':>12}")
+    print(f"{'json':<12}{json_size:>12}{1.0:>8.1f}{json_ms:>12.2f}")
+
+    for codec in CODECS:
+        if available_codec(codec) != codec:
+            print(f"{codec:<12}{'(not installed)':>20}")
+            continue
+        blob = encode_messages(messages, codec)
+        assert decode_messages(blob) == messages
+        decode_ms = _time_per_call(lambda: decode_messages(blob), args.rounds)
+        print(f"{codec:<12}{len(blob):>12}{json_size / len(blob):>8.1f}{decode_ms:>12.2f}")
+
+def _legacy_format(config, dt):
+    """Timestamp formatting as view_summary did it before TimestampFormatter"""
+    import pytz
+
+    if dt.tzinfo is None:
+        dt = pytz.UTC.localize(dt)
+    local_dt = dt.astimezone(pytz.timezone(config.timezone))
+    time_format = '%I:%M %p' if config.time_format_12hr else '%H:%M'
+    return f"{local_dt.strftime('%Y-%m-%d')} {local_dt.strftime(time_format)} {local_dt.strftime('%Z')}"
+
+def bench_view_summary(args):
+    """Time timestamp localization and template rendering of a large summary page"""
+    # The app reads its settings at import, so point it at a scratch database first
+    workdir = tempfile.mkdtemp(prefix='bench-view-')
+    os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(workdir, 'bench.db')}"
+    os.environ.setdefault('JINJA_CACHE_DIR', os.path.join(workdir, 'jinja'))
+
+    from flask import render_template
+    from app import create_app, db
+    from models import AppConfig, ChannelState, Summary
+    from routes import TRANSCRIPT_PAGE_SIZE
+
+    app = create_app()
+    messages = _synthetic_messages(args.messages)
+
+    with app.test_request_context():
+        config = AppConfig.get_config()
+        db.session.add(ChannelState(channel_id='1', server_name='Benchmark'))
+        summary = Summary(channel_id='1', summary_text='Benchmark summary', message_count=len(messages))
+        db.session.add(summary)
+        db.session.commit()
+        channel_state = ChannelState.query.filter_by(channel_id='1').first()
+
+        def legacy_localize():
+            for msg in messages:
+                dt = datetime.fromisoformat(msg['timestamp'].replace('Z', '+00:00'))
+                msg['formatted_timestamp'] = _legacy_format(config, dt)
+
+        def localize():
+            # A fresh formatter each round, so memoization within one page is what is measured
+            config.__dict__.pop('_formatter', None)
+            config.get_formatter().localize_messages(messages)
+
+        def render(page):
+            return render_template('view_summary.html', summary=summary, channel_state=channel_state,
+                                   channel_name='benchmark', messages=page, next_cursor=None,
+                                   page_size=TRANSCRIPT_PAGE_SIZE, config=config)
+
+        legacy_ms = _time_per_call(legacy_localize, args.rounds)
+        localize_ms = _time_per_call(localize, args.rounds)
+        full_ms = _time_per_call(lambda: render(messages), args.rounds)
+        page_ms = _time_per_call(lambda: render(messages[:TRANSCRIPT_PAGE_SIZE]), args.rounds)
+
+    print(f"Summary page with {args.messages} messages")
+    print(f"{'step':<36}{'ms':>10}")
+    print(f"{'localize timestamps (per message)':<36}{legacy_ms:>10.2f}")
+    print(f"{'localize timestamps (formatter)':<36}{localize_ms:>10.2f}")
+    print(f"{'render all messages':<36}{full_ms:>10.2f}")
+    print(f"{f'render first {TRANSCRIPT_PAGE_SIZE} (incremental)':<36}{page_ms:>10.2f}")
+
+class _QueryCounter:
+    """Records the SQL statements an engine executes while active"""
+
+    def __init__(self, engine):
+        self.engine = engine
+        self.statements = []
+
+    def _record(self, conn, cursor, statement, parameters, context, executemany):
+        self.statements.append(statement)
+
+    def __enter__(self):
+        from sqlalchemy import event
+        self.statements = []
+        event.listen(self.engine, 'before_cursor_execute', self._record)
+        return self
+
+    def __exit__(self, *exc):
+        from sqlalchemy import event
+        event.remove(self.engine, 'before_cursor_execute', self._record)
+
+def _seed_suite(db, now):
+    """Fill the database with the channels and summaries the suite reads, returning the large summary's ID"""
+    from models import AppConfig, ChannelState, Summary
+
+    config = AppConfig.load_for_update()
+    channel_ids = [str(200000000000000000 + i) for i in range(SUITE_CHANNELS)]
+    config.user_token = 'benchmark'
+    config.ollama_url = 'http://ollama.invalid'
+    config.model_name = 'benchmark'
+    config.set_channel_ids(channel_ids)
+    AppConfig.bump_version()
+
+    transcript = _synthetic_messages(SUITE_TRANSCRIPT_MESSAGES)
+    for n, channel_id in enumerate(channel_ids):
+        db.session.add(ChannelState(channel_id=channel_id, server_name=f"Server {n % 4}"))
+        for hour in range(SUITE_SUMMARIES_PER_CHANNEL):
+            summary = Summary(channel_id=channel_id, message_count=len(transcript), summary_type='hourly',
+                              summary_text=f"Hour {hour}: the deploy of release {n}.{hour} and lunch plans",
+                              timestamp=now - timedelta(hours=hour, minutes=n))
+            summary.set_messages(transcript)
+            db.session.add(summary)
+    db.session.commit()
+
+    large = Summary(channel_id=channel_ids[0], summary_text='Large summary', summary_type='hourly',
+                    message_count=SUITE_LARGE_SUMMARY_MESSAGES, timestamp=now - timedelta(days=3))
+    large.set_messages(_synthetic_messages(SUITE_LARGE_SUMMARY_MESSAGES))
+    db.session.add(large)
+    db.session.commit()
+    return channel_ids, large.id
+
+def use_scratch_environment():
+    """Point the app at a scratch database and directories; must run before app is imported"""
+    workdir = tempfile.mkdtemp(prefix='bench-suite-')
+    os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(workdir, 'bench.db')}"
+    os.environ.setdefault('JINJA_CACHE_DIR', os.path.join(workdir, 'jinja'))
+    os.environ.setdefault('TRACE_DIR', os.path.join(workdir, 'traces'))
+    # A fixed number of config version checks per request keeps query counts repeatable
+    os.environ.setdefault('CONFIG_CHECK_SECONDS', '3600')
+    return workdir
+
+def fake_discord_pool(discord):
+    """Stand-in for services.DiscordPool that serves channel names from the fake instead of the Discord API"""
+    return SimpleNamespace(from_config=lambda config, rate_limiters=None: discord)
+
+def prepare_suite(app=None):
+    """Seed the database and return (app, scenarios, discord).
+
+    scenarios are the suite's (name, callable) pairs. They expect
+    routes.DiscordPool to be replaced with fake_discord_pool(discord) while
+    they run; the caller patches it and restores it afterwards.
+    """
+    if app is None:
+        use_scratch_environment()
+
+    from app import create_app, db, process_channel_summary, collect_daily_summaries
+    from fakes import FakeDiscordService, FakeOllamaService
+    from models import AppConfig
+    from services import EmailService
+
+    app = app or create_app()
+    client = app.test_client()
+    discord = FakeDiscordService()
+    ollama = FakeOllamaService()
+
+    now = datetime.now(timezone.utc)
+    with app.app_context():
+        channel_ids, large_id = _seed_suite(db, now)
+
+    def get(url):
+        def request():
+            response = client.get(url)
+            assert response.status_code == 200, f"{url} returned {response.status_code}"
+        return request
+
+    pipeline_runs = itertools.count(1)
+
+    def summarize_new_channel():
+        # Each run summarizes a fresh backlog in a channel seen for the first time
+        channel_id = str(300000000000000000 + next(pipeline_runs))
+        messages = _synthetic_messages(SUITE_PIPELINE_MESSAGES, seed=int(channel_id) % 1000)
+        for i, msg in enumerate(messages):
+            msg['timestamp'] = (now - timedelta(minutes=30) + timedelta(seconds=i)).isoformat()
+        discord.messages[channel_id] = [dict(msg, id=str(int(msg['id']) + int(channel_id) % 1000 * 100000))
+                                        for msg in messages]
+        with app.app_context():
+            process_channel_summary(channel_id, discord, ollama, AppConfig.get_config())
+
+    def build_daily_email():
+        with app.app_context():
+            config = AppConfig.get_config()
+            server_summaries = collect_daily_summaries(config, discord, now - timedelta(days=1))
+            EmailService(config)._create_daily_summary_html(server_summaries)
+
+    scenarios = [
+        ('process_channel_summary', summarize_new_channel),
+        ('dashboard', get('/')),
+        ('channel_summaries_search', get(f"/channel/{channel_ids[0]}/summaries?search=deploy&page=3")),
+        ('view_summary', get(f"/summary/{large_id}")),
+        ('daily_email', build_daily_email),
+    ]
+    return app, scenarios, discord
+
+def measure_scenario(engine, name, run, rounds=5, latency_scale=1.0):
+    """Run a scenario and check it against its budgets, returning the report entry"""
+    # The first run warms template and config caches
+    run()
+    timings = []
+    query_counts = []
+    repeated = Counter()
+    for _ in range(rounds):
+        with _QueryCounter(engine) as counter:
+            start = time.perf_counter()
+            run()
+            timings.append((time.perf_counter() - start) * 1000)
+        query_counts.append(len(counter.statements))
+        repeated = max(repeated, Counter(counter.statements), key=lambda c: sum(c.values()))
+
+    max_queries, max_ms = SUITE_BUDGETS[name]
+    max_ms *= latency_scale
+    queries = max(query_counts)
+    median_ms = statistics.median(timings)
+    return {
+        'scenario': name,
+        'queries': queries,
+        'query_budget': max_queries,
+        'median_ms': round(median_ms, 2),
+        'max_ms': round(max(timings), 2),
+        'latency_budget_ms': round(max_ms, 2),
+        'passed': queries <= max_queries and median_ms <= max_ms,
+        # Statements run more than once per request point at N+1 queries
+        'repeated_statements': [{'statement': ' '.join(statement.split())[:200], 'count': count}
+                                for statement, count in repeated.most_common(5) if count > 1]
+    }
+
+def write_report(path, results, rounds, latency_scale):
+    """Write the suite's JSON report"""
+    with open(path, 'w') as f:
+        json.dump({
+            'created': datetime.now(timezone.utc).isoformat(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'rounds': rounds,
+            'latency_scale': latency_scale,
+            'seed': {'channels': SUITE_CHANNELS, 'summaries_per_channel': SUITE_SUMMARIES_PER_CHANNEL,
+                     'transcript_messages': SUITE_TRANSCRIPT_MESSAGES,
+                     'large_summary_messages': SUITE_LARGE_SUMMARY_MESSAGES,
+                     'pipeline_messages': SUITE_PIPELINE_MESSAGES},
+            'passed': all(result['passed'] for result in results),
+            'scenarios': results
+        }, f, indent=2)
+
+def bench_suite(args):
+    """Run the regression scenarios against their query and latency budgets"""
+    app, scenarios, discord = prepare_suite()
+    # Imported after prepare_suite has pointed the app at the scratch database
+    import routes
+    from app import db
+    with app.app_context():
+        engine = db.engine
+
+    original_pool = routes.DiscordPool
+    routes.DiscordPool = fake_discord_pool(discord)
+    try:
+        results = [measure_scenario(engine, name, run, args.rounds, args.latency_scale) for name, run in scenarios]
+    finally:
+        routes.DiscordPool = original_pool
+
+    print(f"{'scenario':<28}{'queries':>10}{'budget':>8}{'median ms':>12}{'budget':>10}  result")
+    for result in results:
+        print(f"{result['scenario']:<28}{result['queries']:>10}{result['query_budget']:>8}"
+              f"{result['median_ms']:>12.2f}{result['latency_budget_ms']:>10.1f}  "
+              f"{'ok' if result['passed'] else 'OVER BUDGET'}")
+        if not result['passed']:
+            for repeated_statement in result['repeated_statements']:
+                print(f"    {repeated_statement['count']}x {repeated_statement['statement']}")
+
+    if args.report:
+        write_report(args.report, results, args.rounds, args.latency_scale)
+        print(f"Report written to {args.report}")
+    return 0 if all(result['passed'] for result in results) else 1
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Discord Summarizer benchmarks")
+    subparsers = parser.add_subparsers(dest='benchmark', required=True)
+
+    transcripts = subparsers.add_parser('transcripts', help='Transcript encoding size and decode time')
+    transcripts.add_argument('--messages', type=int, default=2000)
+    transcripts.add_argument('--rounds', type=int, default=20)
+    transcripts.set_defaults(func=bench_transcripts)
+
+    view_summary = subparsers.add_parser('view-summary', help='Summary page timestamp localization and rendering')
+    view_summary.add_argument('--messages', type=int, default=10000)
+    view_summary.add_argument('--rounds', type=int, default=5)
+    view_summary.set_defaults(func=bench_view_summary)
+
+    suite = subparsers.add_parser('suite', help='Query and latency budgets of the pipeline and heaviest pages')
+    suite.add_argument('--rounds', type=int, default=5)
+    suite.add_argument('--report', help='Write a JSON report to this file')
+    suite.add_argument('--latency-scale', type=float, default=1.0,
+                       help='Multiply the latency budgets, e.g. 2 on slow CI machines')
+    suite.set_defaults(func=bench_suite)
+
+    args = parser.parse_args(argv)
+    return args.func(args) or 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,227 @@
+"""
+Semantic search over summaries.
+
+Summaries are embedded with the configured Ollama embedding model after
+they are saved and appended to an on-disk index: a file of unit-length
+float32 vectors and a parallel file of summary IDs, both append-only. The
+vector file is memory-mapped, so a search is a single matrix-vector product
+over every summary in every channel, and rows appended by another process
+are picked up on the next search. The catch-up job embeds every summary
+whose ID is not in the index yet, so rows committed out of ID order or
+imported later are not missed. Changing the embedding model resets the
+index and the catch-up job re-embeds all summaries.
+
+Requires numpy; without it, or without an embedding model configured,
+summaries are not embedded and semantic search is unavailable.
+"""
+import json
+import logging
+import os
+import threading
+
+from flask import current_app
+
+from app import db
+
+try:
+    import numpy as np
+except ImportError:
+    # Semantic search is optional
+    np = None
+
+try:
+    import fcntl
+except ImportError:
+    # Not available on Windows; appends then rely on the per-process lock only
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+# Summaries per embedding request
+EMBEDDING_BATCH_SIZE = 32
+# Summaries embedded per indexing run
+EMBEDDING_INDEX_LIMIT = 500
+
+class EmbeddingIndex:
+    """Append-only, memory-mapped matrix of summary embeddings"""
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.vectors_path = os.path.join(directory, 'vectors.f32')
+        self.ids_path = os.path.join(directory, 'ids.i64')
+        self.meta_path = os.path.join(directory, 'meta.json')
+        self._lock = threading.Lock()
+        self._meta = {}
+        self._vectors = None
+        self._ids = None
+        self._count = 0
+        self._mapped_size = None
+
+    def _read_meta(self):
+        try:
+            with open(self.meta_path) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _stored_rows(self, dim):
+        """Rows present in both files; a crash between the two appends leaves one longer"""
+        try:
+            vectors_size = os.path.getsize(self.vectors_path)
+            ids_size = os.path.getsize(self.ids_path)
+        except OSError:
+            return 0, None
+        return min(vectors_size // (4 * dim), ids_size // 8), (vectors_size, ids_size)
+
+    def _refresh(self):
+        """Map rows appended since the last call, by this or another process"""
+        meta = self._read_meta()
+        dim = meta.get('dim')
+        if not dim:
+            self._meta, self._vectors, self._ids, self._count, self._mapped_size = meta, None, None, 0, None
+            return
+
+        count, sizes = self._stored_rows(dim)
+        if meta == self._meta and sizes == self._mapped_size:
+            return
+
+        self._meta = meta
+        self._count = count
+        self._mapped_size = sizes
+        if count:
+            self._vectors = np.memmap(self.vectors_path, dtype=np.float32, mode='r', shape=(count, dim))
+            self._ids = np.memmap(self.ids_path, dtype=np.int64, mode='r', shape=(count,))
+        else:
+            self._vectors = self._ids = None
+
+    def __len__(self):
+        with self._lock:
+            self._refresh()
+            return self._count
+
+    def indexed_ids(self, model):
+        """IDs of the summaries embedded with model; empty when the index holds another model"""
+        with self._lock:
+            self._refresh()
+            if self._meta.get('model') != model or not self._count:
+                return np.empty(0, dtype=np.int64)
+            return np.array(self._ids)
+
+    def add(self, summary_ids, vectors, model):
+        """Append embeddings of summaries computed with model"""
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if vectors.ndim != 2 or len(vectors) != len(summary_ids):
+            raise ValueError("Expected one embedding per summary")
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        vectors = vectors / np.where(norms == 0, 1, norms)
+        ids = np.asarray(summary_ids, dtype=np.int64)
+        dim = vectors.shape[1]
+
+        os.makedirs(self.directory, exist_ok=True)
+        with self._lock, open(os.path.join(self.directory, 'index.lock'), 'w') as lock_file:
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+
+            meta = self._read_meta()
+            if meta.get('model') != model or meta.get('dim') != dim:
+                if meta:
+                    logger.info(f"Embedding model changed to {model}, resetting the search index")
+                # Replace rather than truncate the files, other processes may still map them
+                for path in (self.vectors_path, self.ids_path):
+                    open(path + '.new', 'wb').close()
+                    os.replace(path + '.new', path)
+                with open(self.meta_path + '.new', 'w') as f:
+                    json.dump({'model': model, 'dim': dim}, f)
+                os.replace(self.meta_path + '.new', self.meta_path)
+                count = 0
+            else:
+                count, _ = self._stored_rows(dim)
+
+            # Drop a partial row left by a crash, then skip summaries another process indexed
+            if count:
+                keep = ~np.isin(ids, np.fromfile(self.ids_path, dtype=np.int64, count=count))
+                ids, vectors = ids[keep], vectors[keep]
+            with open(self.vectors_path, 'ab') as f:
+                f.truncate(count * dim * 4)
+                f.write(vectors.tobytes())
+            with open(self.ids_path, 'ab') as f:
+                f.truncate(count * 8)
+                f.write(ids.tobytes())
+
+            self._refresh()
+        return len(ids)
+
+    def search(self, query_vector, limit=20):
+        """[(summary_id, cosine similarity)] of the closest summaries, best first"""
+        with self._lock:
+            self._refresh()
+            vectors, ids, count = self._vectors, self._ids, self._count
+
+        query = np.asarray(query_vector, dtype=np.float32)
+        if not count or query.shape != (vectors.shape[1],):
+            return []
+        norm = np.linalg.norm(query)
+        if norm == 0:
+            return []
+
+        scores = vectors @ (query / norm)
+        k = min(limit, count)
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(int(ids[i]), float(scores[i])) for i in top]
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+def get_index(directory=None):
+    """The process-wide index stored in directory (EMBEDDING_DIR by default)"""
+    directory = directory or current_app.config['EMBEDDING_DIR']
+    with _indexes_lock:
+        index = _indexes.get(directory)
+        if index is None:
+            index = _indexes[directory] = EmbeddingIndex(directory)
+        return index
+
+def is_enabled(config):
+    return np is not None and bool(config and config.embedding_model)
+
+def index_new_summaries(config, limit=EMBEDDING_INDEX_LIMIT, ollama_service=None):
+    """Embed summaries missing from the index and return how many were added.
+
+    Raises OllamaError when the embedding model cannot be reached; the
+    summaries are picked up again by the next run.
+    """
+    from models import Summary
+    from services import OllamaRouter
+
+    if not is_enabled(config):
+        return 0
+
+    index = get_index()
+    model = config.embedding_model
+    # The index lives outside the database, so the anti-join is done on the ID arrays
+    summary_ids = np.fromiter(db.session.scalars(db.select(Summary.id)), dtype=np.int64)
+    missing = np.sort(summary_ids[~np.isin(summary_ids, index.indexed_ids(model))])[:limit]
+    if not len(missing):
+        return 0
+    rows = db.session.query(Summary.id, Summary.summary_text).filter(
+        Summary.id.in_(missing.tolist())
+    ).order_by(Summary.id.asc()).all()
+
+    ollama_service = ollama_service or OllamaRouter.from_config(config)
+    added = 0
+    for start in range(0, len(rows), EMBEDDING_BATCH_SIZE):
+        batch = rows[start:start + EMBEDDING_BATCH_SIZE]
+        vectors = ollama_service.embed([text or '' for _, text in batch], model)
+        added += index.add([summary_id for summary_id, _ in batch], vectors, model)
+
+    logger.info(f"Indexed {added} summaries for semantic search ({len(index)} total)")
+    return added
+
+def search_summaries(config, query, limit=20, ollama_service=None):
+    """[(summary_id, score)] of the summaries closest in meaning to query"""
+    from services import OllamaRouter
+
+    ollama_service = ollama_service or OllamaRouter.from_config(config)
+    vector = ollama_service.embed([query], config.embedding_model)[0]
+    return get_index().search(vector, limit)
@@ -0,0 +1,394 @@
+#!/usr/bin/env python3
+"""
+Bulk export and import of summaries and message transcripts.
+Rows are streamed in fixed-size chunks so memory use stays constant no matter
+how much history the database holds.
+
+Usage:
+    python export_db.py export summaries summaries.ndjson
+    python export_db.py export summaries summaries.parquet --no-transcripts
+    python export_db.py export messages messages.parquet
+    python export_db.py import summaries.ndjson
+"""
+import argparse
+import json
+import sys
+import time
+from datetime import datetime
+
+from flask import Flask
+from sqlalchemy import select, insert, text
+from sqlalchemy.orm import defer
+
+from app import db, Config
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    # Parquet support is optional
+    pa = None
+    pq = None
+
+# Rows fetched from the database / written to disk per chunk
+EXPORT_BATCH_SIZE = 1000
+IMPORT_BATCH_SIZE = 1000
+
+EXPORT_KINDS = ('summaries', 'messages')
+EXPORT_FORMATS = ('ndjson', 'parquet')
+
+def _parquet_schemas():
+    """Column layout of each export kind when written as Parquet"""
+    return {
+        'summaries': pa.schema([
+            ('id', pa.int64()),
+            ('channel_id', pa.string()),
+            ('server_name', pa.string()),
+            ('server_id', pa.string()),
+            ('summary_type', pa.string()),
+            ('timestamp', pa.timestamp('us')),
+            ('message_count', pa.int64()),
+            ('summary_text', pa.string()),
+            ('archived_at', pa.timestamp('us')),
+            ('messages', pa.string()),  # JSON encoded transcript
+        ]),
+        'messages': pa.schema([
+            ('summary_id', pa.int64()),
+            ('channel_id', pa.string()),
+            ('message_id', pa.string()),
+            ('author_id', pa.string()),
+            ('author_username', pa.string()),
+            ('content', pa.string()),
+            ('timestamp', pa.string()),
+            ('attachment_count', pa.int64()),
+        ]),
+    }
+
+def _stream_summaries(channel_id=None, include_messages=True):
+    """Yield (Summary, server_name, server_id) rows using a server-side cursor"""
+    from models import ChannelState, Summary
+
+    stmt = select(Summary, ChannelState.server_name, ChannelState.server_id).outerjoin(
+        ChannelState, ChannelState.channel_id == Summary.channel_id
+    ).order_by(Summary.id)
+
+    if channel_id:
+        stmt = stmt.where(Summary.channel_id == channel_id)
+    if not include_messages:
+        stmt = stmt.options(defer(Summary.original_messages), defer(Summary.messages_blob))
+
+    # yield_per enables stream_results, so rows are pulled from the
+    # database in chunks instead of being buffered all at once
+    result = db.session.execute(stmt.execution_options(yield_per=EXPORT_BATCH_SIZE))
+    for summary, server_name, server_id in result:
+        yield summary, server_name, server_id
+        # Drop loaded rows from the identity map as we go
+        db.session.expunge(summary)
+
+def _transcript(summary, archive):
+    """Messages of a summary, read from its archive file once retention has moved them there"""
+    messages = summary.get_messages()
+    if not messages and summary.archived_at:
+        messages = archive.read(summary)
+    return messages
+
+def iter_summary_records(channel_id=None, include_messages=True):
+    """Yield one dict per summary"""
+    from retention import ArchiveReader
+
+    archive = ArchiveReader()
+    for summary, server_name, server_id in _stream_summaries(channel_id, include_messages):
+        record = {
+            'id': summary.id,
+            'channel_id': summary.channel_id,
+            'server_name': server_name,
+            'server_id': server_id,
+            'summary_type': summary.summary_type,
+            'timestamp': summary.timestamp,
+            'message_count': summary.message_count,
+            'summary_text': summary.summary_text,
+            'archived_at': summary.archived_at,
+        }
+        if include_messages:
+            record['messages'] = _transcript(summary, archive)
+        yield record
+
+def iter_message_records(channel_id=None):
+    """Yield one flat dict per original message, for analytics"""
+    from retention import ArchiveReader
+
+    archive = ArchiveReader()
+    for summary, _, _ in _stream_summaries(channel_id, include_messages=True):
+        for msg in _transcript(summary, archive):
+            author = msg.get('author') or {}
+            yield {
+                'summary_id': summary.id,
+                'channel_id': summary.channel_id,
+                'message_id': msg.get('id'),
+                'author_id': author.get('id'),
+                'author_username': author.get('username'),
+                'content': msg.get('content'),
+                'timestamp': msg.get('timestamp'),
+                'attachment_count': len(msg.get('attachments') or []),
+            }
+
+def iter_records(kind, channel_id=None, include_messages=True):
+    """Yield export records of the given kind"""
+    if kind == 'summaries':
+        return iter_summary_records(channel_id, include_messages)
+    if kind == 'messages':
+        return iter_message_records(channel_id)
+    raise ValueError(f"Unknown export kind: {kind}")
+
+def _json_default(value):
+    """JSON encoder hook for datetimes"""
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+def iter_ndjson_chunks(records, chunk_size=EXPORT_BATCH_SIZE):
+    """Yield NDJSON encoded bytes, one chunk per chunk_size records"""
+    lines = []
+    for record in records:
+        lines.append(json.dumps(record, default=_json_default, separators=(',', ':')))
+        if len(lines) >= chunk_size:
+            yield ('\n'.join(lines) + '\n').encode('utf-8')
+            lines = []
+    if lines:
+        yield ('\n'.join(lines) + '\n').encode('utf-8')
+
+def write_ndjson(records, fileobj):
+    """Write records as NDJSON to a binary file object, returning the row count"""
+    count = 0
+    for record in records:
+        fileobj.write(json.dumps(record, default=_json_default, separators=(',', ':')).encode('utf-8'))
+        fileobj.write(b'\n')
+        count += 1
+    return count
+
+def write_parquet(records, path_or_file, kind):
+    """Write records as Parquet, one row group per batch, returning the row count"""
+    if pa is None:
+        raise RuntimeError("Parquet export requires pyarrow (pip install pyarrow)")
+
+    schema = _parquet_schemas()[kind]
+    count = 0
+    batch = []
+
+    with pq.ParquetWriter(path_or_file, schema, compression='zstd') as writer:
+        for record in records:
+            if 'messages' in schema.names and isinstance(record.get('messages'), list):
+                record = dict(record, messages=json.dumps(record['messages']))
+            batch.append(record)
+            if len(batch) >= EXPORT_BATCH_SIZE:
+                writer.write_batch(pa.RecordBatch.from_pylist(batch, schema=schema))
+                count += len(batch)
+                batch = []
+        if batch:
+            writer.write_batch(pa.RecordBatch.from_pylist(batch, schema=schema))
+            count += len(batch)
+
+    return count
+
+def export_to_file(kind, path, fmt='ndjson', channel_id=None, include_messages=True):
+    """Export summaries or messages to a file. Returns (rows, seconds)."""
+    start = time.monotonic()
+    records = iter_records(kind, channel_id, include_messages)
+
+    if fmt == 'parquet':
+        rows = write_parquet(records, path, kind)
+    else:
+        with open(path, 'wb') as f:
+            rows = write_ndjson(records, f)
+
+    return rows, time.monotonic() - start
+
+def _read_records(path):
+    """Yield summary records from an NDJSON or Parquet export"""
+    if path.endswith('.parquet'):
+        if pq is None:
+            raise RuntimeError("Parquet import requires pyarrow (pip install pyarrow)")
+        parquet_file = pq.ParquetFile(path)
+        for batch in parquet_file.iter_batches(batch_size=IMPORT_BATCH_SIZE):
+            yield from batch.to_pylist()
+    else:
+        with open(path, 'r', encoding='utf-8') as f:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+
+def _parse_datetime(value):
+    return datetime.fromisoformat(value) if isinstance(value, str) else value
+
+def _summary_row(record, archive_entries):
+    """Convert an exported summary record back into Summary column values.
+
+    Transcripts that were archived when exported go back to the archive
+    (appended to archive_entries) instead of the database.
+    """
+    from models import Summary
+
+    timestamp = _parse_datetime(record.get('timestamp'))
+    archived_at = _parse_datetime(record.get('archived_at'))
+
+    messages = record.get('messages')
+    if isinstance(messages, str):
+        messages = json.loads(messages)
+
+    # Reuse the model's encoding so imported rows match newly written ones
+    summary = Summary()
+    if archived_at and messages and record.get('id') is not None and timestamp:
+        archive_entries.append((record['id'], record['channel_id'], timestamp, messages))
+    elif messages is not None:
+        summary.set_messages(messages)
+        # The transcript is back in the database, so retention can archive it again
+        archived_at = None
+
+    return {
+        'id': record.get('id'),
+        'channel_id': record['channel_id'],
+        'summary_type': record.get('summary_type') or 'hourly',
+        'timestamp': timestamp,
+        'message_count': record.get('message_count') or 0,
+        'summary_text': record.get('summary_text') or '',
+        'original_messages': summary.original_messages,
+        'messages_blob': summary.messages_blob,
+        'archived_at': archived_at,
+    }
+
+def _flush_import_batch(batch, known_channels):
+    """Insert one batch of summaries, creating missing channel states first"""
+    from models import ChannelState, Summary
+
+    new_channels = {}
+    for record in batch:
+        channel_id = record['channel_id']
+        if channel_id not in known_channels and channel_id not in new_channels:
+            new_channels[channel_id] = {
+                'channel_id': channel_id,
+                'server_name': record.get('server_name'),
+                'server_id': record.get('server_id'),
+            }
+
+    if new_channels:
+        existing = set(db.session.execute(
+            select(ChannelState.channel_id).where(ChannelState.channel_id.in_(list(new_channels)))
+        ).scalars())
+        to_create = [values for cid, values in new_channels.items() if cid not in existing]
+        if to_create:
+            db.session.execute(insert(ChannelState), to_create)
+        known_channels.update(new_channels)
+
+    # Skip summaries that already exist so re-running an import is safe
+    ids = [record['id'] for record in batch if record.get('id') is not None]
+    existing_ids = set()
+    if ids:
+        existing_ids = set(db.session.execute(
+            select(Summary.id).where(Summary.id.in_(ids))
+        ).scalars())
+
+    archive_entries = []
+    rows = [_summary_row(record, archive_entries) for record in batch if record.get('id') not in existing_ids]
+    # Archive files are written before the rows that point at them, like retention does
+    if archive_entries:
+        from retention import archive_transcripts
+        archive_transcripts(archive_entries)
+    if rows:
+        db.session.execute(insert(Summary), rows)
+    db.session.commit()
+
+    return len(rows), len(batch) - len(rows)
+
+def _reset_summary_sequence():
+    """Move PostgreSQL's summary id sequence past the imported ids, so new summaries do not collide with them"""
+    if db.engine.dialect.name != 'postgresql':
+        return
+    db.session.execute(text(
+        "SELECT setval(pg_get_serial_sequence('summary', 'id'), COALESCE(MAX(id), 0) + 1, false) FROM summary"
+    ))
+    db.session.commit()
+
+def import_from_file(path, batch_size=IMPORT_BATCH_SIZE):
+    """Restore summaries from a summaries export. Returns (imported, skipped, seconds)."""
+    from models import ChannelState
+
+    start = time.monotonic()
+    known_channels = set(db.session.execute(select(ChannelState.channel_id)).scalars())
+    imported = skipped = 0
+    batch = []
+
+    for record in _read_records(path):
+        if 'summary_text' not in record:
+            raise ValueError("Only summaries exports can be imported")
+        batch.append(record)
+        if len(batch) >= batch_size:
+            added, dupes = _flush_import_batch(batch, known_channels)
+            imported += added
+            skipped += dupes
+            batch = []
+
+    if batch:
+        added, dupes = _flush_import_batch(batch, known_channels)
+        imported += added
+        skipped += dupes
+
+    # Rows were inserted with explicit ids, which do not advance the sequence
+    if imported:
+        _reset_summary_sequence()
+
+    return imported, skipped, time.monotonic() - start
+
+def _create_cli_app():
+    """Minimal app for database access without starting the scheduler"""
+    app = Flask(__name__)
+    app.config.from_object(Config)
+    db.init_app(app)
+    with app.app_context():
+        from migrate_db import migrate_engine
+        migrate_engine(db.engine)
+    return app
+
+def _rate(rows, seconds):
+    return rows / seconds if seconds > 0 else float(rows)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Bulk export/import of Discord Summarizer history")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    export_parser = subparsers.add_parser('export', help='Export summaries or messages')
+    export_parser.add_argument('kind', choices=EXPORT_KINDS)
+    export_parser.add_argument('output', help='Output file (.ndjson or .parquet)')
+    export_parser.add_argument('--format', choices=EXPORT_FORMATS,
+                               help='Output format (default: from file extension)')
+    export_parser.add_argument('--channel', help='Only export this channel ID')
+    export_parser.add_argument('--no-transcripts', action='store_true',
+                               help='Leave original messages out of summaries exports')
+
+    import_parser = subparsers.add_parser('import', help='Restore summaries from an export')
+    import_parser.add_argument('input', help='Summaries export file (.ndjson or .parquet)')
+    import_parser.add_argument('--batch-size', type=int, default=IMPORT_BATCH_SIZE)
+
+    args = parser.parse_args(argv)
+    app = _create_cli_app()
+
+    with app.app_context():
+        try:
+            if args.command == 'export':
+                fmt = args.format or ('parquet' if args.output.endswith('.parquet') else 'ndjson')
+                rows, seconds = export_to_file(args.kind, args.output, fmt,
+                                               channel_id=args.channel,
+                                               include_messages=not args.no_transcripts)
+                print(f"✅ Exported {rows} {args.kind} rows to {args.output} "
+                      f"in {seconds:.1f}s ({_rate(rows, seconds):.0f} rows/sec)")
+            else:
+                imported, skipped, seconds = import_from_file(args.input, args.batch_size)
+                print(f"✅ Imported {imported} summaries ({skipped} already present) "
+                      f"in {seconds:.1f}s ({_rate(imported + skipped, seconds):.0f} rows/sec)")
+        except (RuntimeError, ValueError) as e:
+            print(f"❌ {e}")
+            return 1
+
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
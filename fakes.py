@@ -0,0 +1,195 @@
+"""
+In-process fakes of Discord for exercising ingestion without a network.
+
+FakeGateway speaks enough of the gateway protocol (HELLO, IDENTIFY/READY,
+RESUME/RESUMED with replay, heartbeats, reconnect and invalid session) to
+drive gateway.GatewayClient; pass its connect method as the client's
+connect function. FakeDiscordService serves the REST message history the
+gap filler reads, and FakeOllamaService answers summary prompts instantly.
+"""
+import json
+import queue
+import threading
+from datetime import datetime, timezone
+
+from gateway import (OP_DISPATCH, OP_HEARTBEAT, OP_IDENTIFY, OP_RESUME, OP_RECONNECT,
+                     OP_INVALID_SESSION, OP_HELLO, OP_HEARTBEAT_ACK)
+
+class FakeGatewayConnection:
+    """One websocket connection to a FakeGateway"""
+
+    def __init__(self, gateway, url):
+        self.gateway = gateway
+        self.url = url
+        self.inbox = queue.Queue()
+        self.closed = False
+
+    def send(self, raw):
+        if self.closed:
+            raise ConnectionError("Connection closed")
+        self.gateway._receive(self, json.loads(raw))
+
+    def recv(self):
+        if self.closed:
+            return ''
+        payload = self.inbox.get()
+        return '' if payload is None else json.dumps(payload)
+
+    def close(self):
+        if not self.closed:
+            self.closed = True
+            self.inbox.put(None)
+
+class FakeGateway:
+    """Scripted stand-in for the Discord gateway"""
+
+    def __init__(self, heartbeat_interval=45000):
+        self.heartbeat_interval = heartbeat_interval
+        self.connections = []
+        self.sent = []  # Payloads received from clients, in order
+        self.events = []  # (seq, event_type, data) dispatched in the current session
+        self.session_id = None
+        self.seq = 0
+        self.lock = threading.Lock()
+        self.ready = threading.Event()
+
+    def connect(self, url):
+        conn = FakeGatewayConnection(self, url)
+        with self.lock:
+            self.connections.append(conn)
+        conn.inbox.put({'op': OP_HELLO, 'd': {'heartbeat_interval': self.heartbeat_interval}})
+        return conn
+
+    @property
+    def active(self):
+        with self.lock:
+            live = [conn for conn in self.connections if not conn.closed]
+        return live[-1] if live else None
+
+    def dispatch(self, event_type, data):
+        """Send an event; it is kept for replay if the client is disconnected"""
+        with self.lock:
+            self.seq += 1
+            self.events.append((self.seq, event_type, data))
+            seq = self.seq
+        conn = self.active
+        if conn:
+            conn.inbox.put({'op': OP_DISPATCH, 's': seq, 't': event_type, 'd': data})
+
+    def message_create(self, channel_id, message_id, content, timestamp=None, username='tester'):
+        timestamp = timestamp or datetime.now(timezone.utc).isoformat()
+        self.dispatch('MESSAGE_CREATE', {
+            'id': str(message_id), 'channel_id': str(channel_id), 'content': content, 'timestamp': timestamp,
+            'author': {'id': '1', 'username': username, 'avatar': None}, 'attachments': []
+        })
+
+    def disconnect(self):
+        """Drop the active connection without notice"""
+        conn = self.active
+        if conn:
+            conn.close()
+        self.ready.clear()
+
+    def request_reconnect(self):
+        conn = self.active
+        if conn:
+            conn.inbox.put({'op': OP_RECONNECT, 'd': None})
+        self.ready.clear()
+
+    def invalidate_session(self, resumable=False):
+        conn = self.active
+        if not resumable:
+            self.session_id = None
+        if conn:
+            conn.inbox.put({'op': OP_INVALID_SESSION, 'd': resumable})
+        self.ready.clear()
+
+    def _receive(self, conn, payload):
+        self.sent.append(payload)
+        op = payload.get('op')
+
+        if op == OP_HEARTBEAT:
+            conn.inbox.put({'op': OP_HEARTBEAT_ACK, 'd': None})
+        elif op == OP_IDENTIFY:
+            with self.lock:
+                self.session_id = f"session-{len(self.connections)}"
+                self.seq = 0
+                self.events = []
+            conn.inbox.put({'op': OP_DISPATCH, 's': 0, 't': 'READY', 'd': {
+                'session_id': self.session_id,
+                'resume_gateway_url': 'wss://fake-resume.gateway'
+            }})
+            self.ready.set()
+        elif op == OP_RESUME:
+            data = payload['d']
+            if data.get('session_id') != self.session_id:
+                conn.inbox.put({'op': OP_INVALID_SESSION, 'd': False})
+                return
+            with self.lock:
+                missed = [event for event in self.events if event[0] > (data.get('seq') or 0)]
+            for seq, event_type, event_data in missed:
+                conn.inbox.put({'op': OP_DISPATCH, 's': seq, 't': event_type, 'd': event_data})
+            with self.lock:
+                self.seq += 1
+                seq = self.seq
+            conn.inbox.put({'op': OP_DISPATCH, 's': seq, 't': 'RESUMED', 'd': {}})
+            self.ready.set()
+
+class FakeDiscordService:
+    """Serves message history like DiscordService.fetch_messages"""
+
+    def __init__(self, messages_by_channel=None):
+        self.messages = {cid: sorted(msgs, key=lambda m: int(m['id']))
+                         for cid, msgs in (messages_by_channel or {}).items()}
+        self.requests = []
+
+    def add_message(self, channel_id, message_id, content, timestamp=None, username='tester'):
+        timestamp = timestamp or datetime.now(timezone.utc).isoformat()
+        self.messages.setdefault(str(channel_id), []).append({
+            'id': str(message_id), 'channel_id': str(channel_id), 'content': content, 'timestamp': timestamp,
+            'author': {'id': '1', 'username': username, 'avatar': None}, 'attachments': []
+        })
+        self.messages[str(channel_id)].sort(key=lambda m: int(m['id']))
+
+    def fetch_messages(self, channel_id, limit=100, after_timestamp=None):
+        self.requests.append((channel_id, after_timestamp))
+        messages = self.messages.get(str(channel_id), [])
+        if after_timestamp and '-' in str(after_timestamp):
+            after = datetime.fromisoformat(after_timestamp.replace('Z', '+00:00'))
+            matching = [m for m in messages
+                        if datetime.fromisoformat(m['timestamp'].replace('Z', '+00:00')) > after]
+            return matching[:limit]
+        if after_timestamp:
+            return [m for m in messages if int(m['id']) > int(after_timestamp)][:limit]
+        return messages[-limit:]
+
+    def fetch_messages_between(self, channel_id, start, end, page_size=100):
+        return [m for m in self.messages.get(str(channel_id), [])
+                if start <= datetime.fromisoformat(m['timestamp'].replace('Z', '+00:00')) < end]
+
+    def get_channel_info(self, channel_id):
+        return {'id': channel_id, 'name': f"channel-{channel_id}"}
+
+    def test_connection(self):
+        return True, {'username': 'tester'}
+
+class FakeOllamaService:
+    """Answers like OllamaService/OllamaRouter without a model, recording the prompts"""
+
+    def __init__(self, capacity=1):
+        self.capacity = capacity
+        self.prompts = []
+
+    def generate_summary(self, content, prompt_template=None, max_length=500):
+        return self.generate(content, max_length)
+
+    def generate(self, prompt, max_length=500, response_format=None):
+        self.prompts.append(prompt)
+        if response_format == 'json':
+            return '{}'
+        lines = prompt.strip().splitlines()
+        return f"Summary of {len(lines)} lines: {lines[-1][:80] if lines else ''}"
+
+    def generate_with_context(self, prompt, context=None, max_length=500, response_format=None):
+        # One context "token" per prompt it covers
+        return self.generate(prompt, max_length, response_format), (context or []) + [len(self.prompts)]
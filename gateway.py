@@ -0,0 +1,415 @@
+"""
+Real-time message ingestion over the Discord gateway.
+
+Instead of polling every channel's message history each hour, one websocket
+connection receives MESSAGE_CREATE/UPDATE/DELETE events for the monitored
+channels. A writer thread appends them to the buffered_message table in
+batches and the hourly summarizer reads from that table instead of REST.
+After a disconnect the session is resumed so Discord replays the missed
+events; when it cannot be resumed the gap is filled over REST.
+
+Enable with INGEST_MODE=gateway (requires `pip install websocket-client`).
+Only one process per database holds the connection.
+"""
+import json
+import logging
+import random
+import threading
+import time
+from datetime import datetime, timezone
+
+from sqlalchemy import text
+
+from app import db
+
+try:
+    import websocket
+except ImportError:
+    # Only needed when INGEST_MODE=gateway
+    websocket = None
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+GATEWAY_URL = 'wss://gateway.discord.gg/?v=10&encoding=json'
+
+# Gateway opcodes
+OP_DISPATCH = 0
+OP_HEARTBEAT = 1
+OP_IDENTIFY = 2
+OP_RESUME = 6
+OP_RECONNECT = 7
+OP_INVALID_SESSION = 9
+OP_HELLO = 10
+OP_HEARTBEAT_ACK = 11
+
+# GUILD_MESSAGES | DIRECT_MESSAGES | MESSAGE_CONTENT (ignored for user tokens)
+INTENTS = (1 << 9) | (1 << 12) | (1 << 15)
+
+MESSAGE_EVENTS = ('MESSAGE_CREATE', 'MESSAGE_UPDATE', 'MESSAGE_DELETE')
+
+# Events are written once this many are pending, or after FLUSH_INTERVAL seconds
+FLUSH_BATCH_SIZE = 200
+FLUSH_INTERVAL = 1.0
+# How often the monitored channels and token are re-read from the database
+CONFIG_REFRESH_SECONDS = 60
+MAX_RECONNECT_DELAY = 60
+# Advisory lock key held by the process owning the connection (PostgreSQL)
+GATEWAY_LOCK_KEY = 7346220
+
+_ingest = None
+
+class GatewayError(Exception):
+    """Protocol error on the gateway connection"""
+
+def _websocket_connect(url):
+    if websocket is None:
+        raise GatewayError("Gateway ingest requires the websocket-client package")
+    return websocket.create_connection(url)
+
+class GatewayClient:
+    """Discord gateway connection passing message events to a sink.
+
+    The connection only needs send(), recv() and close(), so tests can
+    connect to fakes.FakeGateway instead of Discord.
+    """
+
+    def __init__(self, token, sink, connect=None, url=GATEWAY_URL, on_session_start=None, channel_filter=None):
+        self.token = token
+        self.sink = sink  # Called with (event_type, data)
+        self.connect = connect or _websocket_connect
+        self.url = url
+        self.on_session_start = on_session_start  # Called when a new (not resumed) session starts
+        self.channel_filter = channel_filter
+        self.session_id = None
+        self.resume_url = None
+        self.seq = None
+        self.connected = False
+        self.events_received = 0
+        self._acked = threading.Event()
+        self._stop = threading.Event()
+        self._conn = None
+
+    def run(self):
+        """Keep a session connected until stop() is called"""
+        delay = 1
+        while not self._stop.is_set():
+            if not self.token:
+                self._stop.wait(5)
+                continue
+
+            started = time.monotonic()
+            try:
+                self.run_session()
+            except Exception as e:
+                logger.warning(f"Gateway connection lost: {str(e)}")
+
+            if self._stop.is_set():
+                break
+            # Back off with jitter, resetting after a connection that stayed up
+            if time.monotonic() - started > MAX_RECONNECT_DELAY:
+                delay = 1
+            self._stop.wait(delay * random.uniform(0.5, 1.0))
+            delay = min(delay * 2, MAX_RECONNECT_DELAY)
+
+    def stop(self):
+        self._stop.set()
+        conn = self._conn
+        if conn:
+            try:
+                conn.close()
+            except Exception:
+                pass
+
+    def run_session(self):
+        """Connect, identify or resume, and process payloads until the connection ends"""
+        resuming = bool(self.session_id and self.seq is not None)
+        conn = self.connect(self.resume_url if resuming and self.resume_url else self.url)
+        self._conn = conn
+        closed = threading.Event()
+
+        try:
+            hello = self._receive(conn)
+            if not hello or hello.get('op') != OP_HELLO:
+                raise GatewayError("Expected HELLO from gateway")
+
+            self._acked.set()
+            interval = hello['d']['heartbeat_interval'] / 1000
+            threading.Thread(target=self._heartbeat, args=(conn, interval, closed), daemon=True).start()
+
+            if resuming:
+                self._send(conn, OP_RESUME, {'token': self.token, 'session_id': self.session_id, 'seq': self.seq})
+            else:
+                self._send(conn, OP_IDENTIFY, {
+                    'token': self.token,
+                    'intents': INTENTS,
+                    'properties': {'os': 'linux', 'browser': 'discord-summarizer', 'device': 'discord-summarizer'}
+                })
+
+            while not self._stop.is_set():
+                payload = self._receive(conn)
+                if payload is None or not self._handle(conn, payload):
+                    break
+        finally:
+            closed.set()
+            self.connected = False
+            self._conn = None
+            try:
+                conn.close()
+            except Exception:
+                pass
+
+    def _handle(self, conn, payload):
+        """Process one payload, returning False when the connection should be dropped"""
+        op = payload.get('op')
+        if payload.get('s') is not None:
+            self.seq = payload['s']
+
+        if op == OP_DISPATCH:
+            event_type = payload.get('t')
+            data = payload.get('d') or {}
+
+            if event_type == 'READY':
+                self.session_id = data.get('session_id')
+                if data.get('resume_gateway_url'):
+                    self.resume_url = f"{data['resume_gateway_url']}/?v=10&encoding=json"
+                self.connected = True
+                logger.info("Gateway session started")
+                if self.on_session_start:
+                    self.on_session_start()
+            elif event_type == 'RESUMED':
+                self.connected = True
+                logger.info(f"Gateway session resumed at sequence {self.seq}")
+            elif event_type in MESSAGE_EVENTS:
+                channel_id = str(data.get('channel_id'))
+                if self.channel_filter is None or self.channel_filter(channel_id):
+                    self.events_received += 1
+                    self.sink(event_type, data)
+        elif op == OP_HEARTBEAT:
+            self._send(conn, OP_HEARTBEAT, self.seq)
+        elif op == OP_HEARTBEAT_ACK:
+            self._acked.set()
+        elif op == OP_RECONNECT:
+            logger.info("Gateway requested reconnect")
+            return False
+        elif op == OP_INVALID_SESSION:
+            if not payload.get('d'):
+                # Not resumable: identify again and fill the gap over REST
+                self.session_id = None
+                self.resume_url = None
+                self.seq = None
+            logger.info("Gateway session invalidated")
+            return False
+        return True
+
+    def _heartbeat(self, conn, interval, closed):
+        # The first beat is jittered as the gateway docs ask
+        wait = interval * random.random()
+        while not closed.wait(wait):
+            if not self._acked.is_set():
+                logger.warning("Gateway heartbeat not acknowledged, reconnecting")
+                conn.close()
+                return
+            self._acked.clear()
+            try:
+                self._send(conn, OP_HEARTBEAT, self.seq)
+            except Exception:
+                return
+            wait = interval
+
+    def _send(self, conn, op, data):
+        conn.send(json.dumps({'op': op, 'd': data}))
+
+    def _receive(self, conn):
+        raw = conn.recv()
+        if not raw:
+            return None
+        return json.loads(raw)
+
+class GatewayIngest:
+    """Runs a GatewayClient and writes its events to the message buffer"""
+
+    def __init__(self, app, connect=None, url=None, discord_service=None):
+        self.app = app
+        self.discord_service = discord_service  # REST client for gap filling, created from config if None
+        self.channel_ids = set()
+        self.last_flush_at = None
+        self._pending = []
+        self._gap_fill_requested = False
+        self._stopping = False
+        self._config_loaded_at = 0
+        self._cond = threading.Condition()
+        self._threads = []
+        self._lock = None
+
+        self.client = GatewayClient(
+            None, self.add_event, connect=connect,
+            url=url or app.config.get('GATEWAY_URL') or GATEWAY_URL,
+            on_session_start=self.request_gap_fill,
+            channel_filter=lambda channel_id: channel_id in self.channel_ids
+        )
+        with app.app_context():
+            self._refresh_config()
+
+    def start(self):
+        for target, name in ((self.client.run, 'gateway-client'), (self._write_loop, 'gateway-writer')):
+            thread = threading.Thread(target=target, name=name, daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self):
+        """Disconnect and write any pending events"""
+        self.client.stop()
+        with self._cond:
+            self._stopping = True
+            self._cond.notify()
+        for thread in self._threads:
+            thread.join(timeout=10)
+
+    def add_event(self, event_type, data):
+        with self._cond:
+            self._pending.append((event_type, data))
+            if len(self._pending) >= FLUSH_BATCH_SIZE:
+                self._cond.notify()
+
+    def request_gap_fill(self):
+        with self._cond:
+            self._gap_fill_requested = True
+            self._cond.notify()
+
+    def status(self):
+        return {
+            'mode': 'gateway',
+            'connected': self.client.connected,
+            'channels': len(self.channel_ids),
+            'events_received': self.client.events_received,
+            'pending_events': len(self._pending),
+            'last_flush_at': self.last_flush_at.isoformat() if self.last_flush_at else None
+        }
+
+    def _refresh_config(self):
+        from models import AppConfig
+
+        config = AppConfig.get_config()
+        self.channel_ids = set(config.get_channel_ids())
+        self.client.token = config.user_token
+        self._config_loaded_at = time.monotonic()
+
+    def _write_loop(self):
+        while True:
+            with self._cond:
+                self._cond.wait_for(
+                    lambda: self._stopping or self._gap_fill_requested or len(self._pending) >= FLUSH_BATCH_SIZE,
+                    timeout=FLUSH_INTERVAL
+                )
+                batch, self._pending = self._pending, []
+                gap_fill, self._gap_fill_requested = self._gap_fill_requested, False
+                stopping = self._stopping
+
+            with self.app.app_context():
+                try:
+                    if time.monotonic() - self._config_loaded_at > CONFIG_REFRESH_SECONDS:
+                        self._refresh_config()
+                    if batch:
+                        self._flush(batch)
+                    if gap_fill:
+                        self.fill_gaps()
+                except Exception as e:
+                    db.session.rollback()
+                    logger.error(f"Error writing gateway events: {str(e)}")
+                    # Keep the events and try again on the next cycle
+                    with self._cond:
+                        self._pending[:0] = batch
+                        self._gap_fill_requested = self._gap_fill_requested or gap_fill
+                    if not stopping:
+                        time.sleep(FLUSH_INTERVAL)
+
+            if stopping:
+                return
+
+    def _flush(self, batch):
+        from models import BufferedMessage
+
+        BufferedMessage.apply_events(batch)
+        self.last_flush_at = datetime.now(timezone.utc)
+
+    def fill_gaps(self):
+        """Fetch messages sent while no session was connected"""
+        from models import AppConfig, BufferedMessage, ChannelState
+        from services import DiscordPool
+
+        discord_service = self.discord_service or DiscordPool.from_config(AppConfig.get_config())
+
+        for channel_id in sorted(self.channel_ids):
+            after = BufferedMessage.latest_message_id(channel_id)
+            if not after:
+                channel_state = ChannelState.query.filter_by(channel_id=channel_id).first()
+                after = (channel_state.fetched_until or channel_state.summarized_until) if channel_state else None
+
+            fetched = 0
+            while True:
+                page = discord_service.fetch_messages(channel_id, after_timestamp=after)
+                if not page:
+                    break
+                BufferedMessage.apply_events([('GAP_FILL', dict(msg, channel_id=channel_id)) for msg in page])
+                fetched += len(page)
+                # Without a starting point only the latest page is fetched, like a REST poll
+                if not after or len(page) < 100:
+                    break
+                after = page[-1]['id']
+
+            if fetched:
+                logger.info(f"Filled gateway gap in channel {channel_id} with {fetched} messages")
+
+def _acquire_singleton_lock(app):
+    """Lock held for the life of the process owning the gateway connection"""
+    if db.engine.dialect.name == 'postgresql':
+        # Session-level advisory lock on a connection that is never returned to the pool
+        conn = db.engine.connect()
+        if conn.execute(text("SELECT pg_try_advisory_lock(:key)"), {'key': GATEWAY_LOCK_KEY}).scalar():
+            conn.commit()
+            return conn
+        conn.close()
+        return None
+
+    if fcntl is None:
+        return True
+    handle = open(app.config.get('GATEWAY_LOCK_FILE') or 'gateway.lock', 'a')
+    try:
+        fcntl.flock(handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        handle.close()
+        return None
+    return handle
+
+def start_gateway(app, connect=None, url=None, discord_service=None):
+    """Start gateway ingest in background threads unless another process owns it.
+
+    Raises GatewayError when the websocket-client package is missing, as the
+    process would otherwise run without ingesting any messages.
+    """
+    global _ingest
+
+    if connect is None and websocket is None:
+        raise GatewayError("INGEST_MODE=gateway requires the websocket-client package (pip install websocket-client)")
+
+    with app.app_context():
+        lock = _acquire_singleton_lock(app)
+    if not lock:
+        logger.info("Another process holds the Discord gateway connection")
+        return None
+
+    ingest = GatewayIngest(app, connect=connect, url=url, discord_service=discord_service)
+    ingest._lock = lock
+    ingest.start()
+    _ingest = ingest
+    logger.info(f"Gateway ingest started for {len(ingest.channel_ids)} channels")
+    return ingest
+
+def get_ingest():
+    """The running GatewayIngest of this process, if any"""
+    return _ingest
@@ -0,0 +1,58 @@
+"""
+Gunicorn settings for Discord Summarizer.
+
+The app is built once in the master (preload_app) and forked into the
+workers, which share its imported modules and compiled templates instead
+of each importing and building their own. Database connections are not
+carried across the fork: the master closes its pool before forking and
+every worker starts a pool of its own.
+
+Scheduled jobs never run in the web workers (a scheduler started in the
+master would not survive the fork). Run them in worker.py; startup.py
+starts one next to gunicorn.
+
+GUNICORN_WORKER_CLASS=gevent serves each request on a greenlet instead of
+tying up a whole worker, so many dashboard viewers and streaming "Run now"
+clients can stay connected at once. The standard library is patched here,
+before the app is preloaded, which makes the Discord and Ollama clients
+(requests) and the PostgreSQL driver cooperative.
+
+    gunicorn -c gunicorn.conf.py
+"""
+import os
+
+worker_class = os.environ.get('GUNICORN_WORKER_CLASS') or 'sync'
+if worker_class == 'gevent':
+    from gevent import monkey
+    monkey.patch_all()
+    try:
+        from psycogreen.gevent import patch_psycopg
+        patch_psycopg()
+    except ImportError:
+        pass
+
+wsgi_app = 'wsgi:app'
+bind = os.environ.get('GUNICORN_BIND') or '0.0.0.0:5000'
+workers = int(os.environ.get('WEB_CONCURRENCY', 4))
+# Simultaneous connections per gevent worker
+worker_connections = int(os.environ.get('GUNICORN_WORKER_CONNECTIONS', 1000))
+# Long enough for "Run now", which summarizes in the request
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 3000))
+accesslog = '-'
+errorlog = '-'
+
+preload_app = True
+raw_env = ['SCHEDULER_ENABLED=false']
+
+def when_ready(server):
+    from app import preload
+    from wsgi import app
+
+    preload(app)
+    server.log.info("App preloaded; scheduled jobs run in worker.py")
+
+def post_fork(server, worker):
+    from app import after_fork
+    from wsgi import app
+
+    after_fork(app)
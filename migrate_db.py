@@ -1,68 +1,38 @@
 #!/usr/bin/env python3
 """
-Database migration script to add new columns for timezone, server support, email settings, and custom prompts.
+Versioned database migrations.
+
+Every migration below runs exactly once, in its own transaction, and is
+recorded in the schema_version table. When the database is already at the
+latest version the check is a single query, so it is cheap enough to run on
+every start. The lock taken before each migration (the SQLite write lock,
+or a PostgreSQL advisory lock) makes it safe for several replicas to start
+at the same time. Migrations are written with SQLAlchemy types so the same
+scripts run on SQLite and PostgreSQL.
+
 Run this script after updating to the new version.
 """
-import sqlite3
 import sys
 import os
+import json
+import time
+import logging
+from datetime import datetime, timezone
 
-def migrate_database(db_path='discord_summaries.db'):
-    """Add new columns to existing database"""
-    
-    if not os.path.exists(db_path):
-        print(f"Database {db_path} not found. No migration needed.")
-        return
-    
-    try:
-        conn = sqlite3.connect(db_path)
-        cursor = conn.cursor()
-        
-        print("Starting database migration...")
-        
-        # Check if columns already exist in app_config
-        cursor.execute("PRAGMA table_info(app_config)")
-        columns = [column[1] for column in cursor.fetchall()]
-        
-        # Add timezone column to app_config if it doesn't exist
-        if 'timezone' not in columns:
-            print("Adding timezone column to app_config...")
-            cursor.execute("ALTER TABLE app_config ADD COLUMN timezone VARCHAR(50) DEFAULT 'US/Eastern'")
-            print("✓ Added timezone column")
-        
-        # Add time_format_12hr column to app_config if it doesn't exist
-        if 'time_format_12hr' not in columns:
-            print("Adding time_format_12hr column to app_config...")
-            cursor.execute("ALTER TABLE app_config ADD COLUMN time_format_12hr BOOLEAN DEFAULT 1")
-            print("✓ Added time_format_12hr column")
-        
-        # Add email settings columns
-        email_columns = [
-            ('email_enabled', 'BOOLEAN DEFAULT 0'),
-            ('email_address', 'VARCHAR(100)'),
-            ('smtp_server', 'VARCHAR(100)'),
-            ('smtp_port', 'INTEGER DEFAULT 587'),
-            ('smtp_username', 'VARCHAR(100)'),
-            ('smtp_password', 'VARCHAR(100)'),
-            ('smtp_use_tls', 'BOOLEAN DEFAULT 1'),
-            ('daily_email_time', 'VARCHAR(5) DEFAULT "09:00"'),
-        ]
-        
-        for col_name, col_def in email_columns:
-            if col_name not in columns:
-                print(f"Adding {col_name} column to app_config...")
-                cursor.execute(f"ALTER TABLE app_config ADD COLUMN {col_name} {col_def}")
-                print(f"✓ Added {col_name} column")
-        
-        # Add summary_prompt column
-        if 'summary_prompt' not in columns:
-            print("Adding summary_prompt column to app_config...")
-            # SQLite doesn't support parameterized defaults in ALTER TABLE
-            # So we'll add the column without default and then update existing rows
-            cursor.execute("ALTER TABLE app_config ADD COLUMN summary_prompt TEXT")
-            
-            # Set default value for existing rows
-            default_prompt = '''Please provide a concise summary of the following Discord conversation. 
+import sqlalchemy as sa
+from sqlalchemy import create_engine, inspect, text
+from sqlalchemy.schema import CreateColumn
+
+logger = logging.getLogger(__name__)
+
+# Rows converted per transaction by compact_transcripts
+COMPACT_BATCH_SIZE = 500
+# Rows updated per statement by data backfills
+BACKFILL_BATCH_SIZE = 1000
+# Key of the PostgreSQL advisory lock serializing migrations across replicas
+MIGRATION_LOCK_KEY = 7346219
+
+DEFAULT_SUMMARY_PROMPT = '''Please provide a concise summary of the following Discord conversation. 
 Focus on the main topics discussed, key decisions made, and important information shared. 
 Keep the summary under {max_length} words.
 
@@ -70,75 +40,403 @@ Conversation:
 {content}
 
 Summary:'''
-            cursor.execute("UPDATE app_config SET summary_prompt = ? WHERE summary_prompt IS NULL", (default_prompt,))
-            print("✓ Added summary_prompt column")
-        
-        # Check channel_state columns
-        cursor.execute("PRAGMA table_info(channel_state)")
-        columns = [column[1] for column in cursor.fetchall()]
-        
-        # Add server_name column to channel_state if it doesn't exist
-        if 'server_name' not in columns:
-            print("Adding server_name column to channel_state...")
-            cursor.execute("ALTER TABLE channel_state ADD COLUMN server_name VARCHAR(100)")
-            print("✓ Added server_name column")
-        
-        # Add server_id column to channel_state if it doesn't exist
-        if 'server_id' not in columns:
-            print("Adding server_id column to channel_state...")
-            cursor.execute("ALTER TABLE channel_state ADD COLUMN server_id VARCHAR(50)")
-            print("✓ Added server_id column")
-        
-        # Add last_summary_date column to channel_state if it doesn't exist
-        if 'last_summary_date' not in columns:
-            print("Adding last_summary_date column to channel_state...")
-            cursor.execute("ALTER TABLE channel_state ADD COLUMN last_summary_date DATE")
-            print("✓ Added last_summary_date column")
-        
-        # Check summary columns
-        cursor.execute("PRAGMA table_info(summary)")
-        columns = [column[1] for column in cursor.fetchall()]
-        
-        # Add original_messages column to summary if it doesn't exist
-        if 'original_messages' not in columns:
-            print("Adding original_messages column to summary...")
-            cursor.execute("ALTER TABLE summary ADD COLUMN original_messages TEXT")
-            print("✓ Added original_messages column")
-        
-        # Add summary_type column to summary if it doesn't exist
-        if 'summary_type' not in columns:
-            print("Adding summary_type column to summary...")
-            cursor.execute("ALTER TABLE summary ADD COLUMN summary_type VARCHAR(20) DEFAULT 'hourly'")
-            print("✓ Added summary_type column")
-        
-        # Create daily_summary table if it doesn't exist
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS daily_summary (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                server_name VARCHAR(100) NOT NULL,
-                server_id VARCHAR(50),
-                summary_date DATE NOT NULL,
-                email_sent BOOLEAN DEFAULT 0,
-                email_sent_at DATETIME,
-                created_at DATETIME DEFAULT CURRENT_TIMESTAMP
-            )
-        """)
-        print("✓ Created/verified daily_summary table")
-        
-        conn.commit()
-        print("\n✅ Database migration completed successfully!")
-        
-    except sqlite3.Error as e:
+
+# Ordered list of (version, description, function)
+MIGRATIONS = []
+
+def migration(version, description):
+    """Register a migration function that upgrades the schema to version"""
+    def decorator(func):
+        MIGRATIONS.append((version, description, func))
+        MIGRATIONS.sort(key=lambda m: m[0])
+        return func
+    return decorator
+
+def _columns(conn, table):
+    """Names of the columns of a table"""
+    return {column['name'] for column in inspect(conn).get_columns(table)}
+
+def _add_column(conn, table, column):
+    """Add a sa.Column unless a pre-versioning migration already added it"""
+    if column.name not in _columns(conn, table):
+        logger.info(f"Adding {column.name} column to {table}...")
+        # Compile the column for the current dialect (e.g. BLOB vs BYTEA)
+        definition = CreateColumn(column).compile(dialect=conn.dialect)
+        conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {definition}"))
+
+def _backfill(conn, table, assignments, where, params=None, batch_size=BACKFILL_BATCH_SIZE):
+    """Update rows matching where in batches of batch_size, returning the row count.
+
+    Batching keeps each statement small on large tables; the where clause
+    must stop matching rows once they are updated.
+    """
+    total = 0
+    while True:
+        result = conn.execute(text(
+            f"UPDATE {table} SET {assignments} WHERE id IN "
+            f"(SELECT id FROM {table} WHERE {where} LIMIT :batch_size)"
+        ), dict(params or {}, batch_size=batch_size))
+        if result.rowcount <= 0:
+            return total
+        total += result.rowcount
+
+@migration(1, 'Timezone, email and custom prompt settings')
+def _app_config_settings(conn):
+    _add_column(conn, 'app_config', sa.Column('timezone', sa.String(50), server_default='US/Eastern'))
+    _add_column(conn, 'app_config', sa.Column('time_format_12hr', sa.Boolean(), server_default=sa.true()))
+    _add_column(conn, 'app_config', sa.Column('email_enabled', sa.Boolean(), server_default=sa.false()))
+    _add_column(conn, 'app_config', sa.Column('email_address', sa.String(100)))
+    _add_column(conn, 'app_config', sa.Column('smtp_server', sa.String(100)))
+    _add_column(conn, 'app_config', sa.Column('smtp_port', sa.Integer(), server_default='587'))
+    _add_column(conn, 'app_config', sa.Column('smtp_username', sa.String(100)))
+    _add_column(conn, 'app_config', sa.Column('smtp_password', sa.String(100)))
+    _add_column(conn, 'app_config', sa.Column('smtp_use_tls', sa.Boolean(), server_default=sa.true()))
+    _add_column(conn, 'app_config', sa.Column('daily_email_time', sa.String(5), server_default='09:00'))
+    # Defaults with placeholders cannot be declared in ALTER TABLE, so backfill them
+    _add_column(conn, 'app_config', sa.Column('summary_prompt', sa.Text()))
+    _backfill(conn, 'app_config', "summary_prompt = :prompt", "summary_prompt IS NULL",
+              {'prompt': DEFAULT_SUMMARY_PROMPT})
+
+@migration(2, 'Server grouping for channels')
+def _channel_servers(conn):
+    _add_column(conn, 'channel_state', sa.Column('server_name', sa.String(100)))
+    _add_column(conn, 'channel_state', sa.Column('server_id', sa.String(50)))
+    _add_column(conn, 'channel_state', sa.Column('last_summary_date', sa.Date()))
+
+@migration(3, 'Stored transcripts and summary types')
+def _summary_messages(conn):
+    _add_column(conn, 'summary', sa.Column('original_messages', sa.Text()))
+    _add_column(conn, 'summary', sa.Column('summary_type', sa.String(20), server_default='hourly'))
+    _backfill(conn, 'summary', "summary_type = 'hourly'", "summary_type IS NULL")
+
+@migration(4, 'Summary pagination index')
+def _summary_pagination_index(conn):
+    conn.execute(text(
+        "CREATE INDEX IF NOT EXISTS ix_summary_channel_timestamp "
+        "ON summary (channel_id, timestamp, id)"
+    ))
+
+@migration(5, 'Transcript retention')
+def _transcript_retention(conn):
+    _add_column(conn, 'app_config', sa.Column('transcript_retention_days', sa.Integer(), server_default='0'))
+    _add_column(conn, 'channel_state', sa.Column('transcript_retention_days', sa.Integer()))
+    _add_column(conn, 'summary', sa.Column('archived_at', sa.DateTime()))
+
+@migration(6, 'Compact transcript storage')
+def _compact_transcripts(conn):
+    _add_column(conn, 'summary', sa.Column('messages_blob', sa.LargeBinary()))
+
+@migration(7, 'Channel claiming and full-text search')
+def _channel_claims(conn):
+    _add_column(conn, 'channel_state', sa.Column('claimed_by', sa.String(100)))
+    _add_column(conn, 'channel_state', sa.Column('claimed_until', sa.DateTime()))
+    if conn.dialect.name == 'postgresql':
+        conn.execute(text(
+            "CREATE INDEX IF NOT EXISTS ix_summary_text_fts ON summary "
+            "USING GIN (to_tsvector('english', summary_text))"
+        ))
+
+@migration(8, 'Historical backfill jobs')
+def _backfill_jobs(conn):
+    _add_column(conn, 'app_config', sa.Column('backfill_days', sa.Integer(), server_default='0'))
+    backfill_job = sa.Table(
+        'backfill_job', sa.MetaData(),
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('channel_id', sa.String(50), nullable=False, index=True),
+        sa.Column('start_time', sa.DateTime(), nullable=False),
+        sa.Column('end_time', sa.DateTime(), nullable=False),
+        sa.Column('window_hours', sa.Integer()),
+        sa.Column('completed_windows', sa.Text()),
+        sa.Column('status', sa.String(20)),
+        sa.Column('summaries_created', sa.Integer()),
+        sa.Column('messages_fetched', sa.Integer()),
+        sa.Column('last_error', sa.Text()),
+        sa.Column('created_at', sa.DateTime()),
+        sa.Column('updated_at', sa.DateTime()),
+    )
+    backfill_job.create(bind=conn, checkfirst=True)
+
+@migration(9, 'Gateway message buffer')
+def _message_buffer(conn):
+    buffered_message = sa.Table(
+        'buffered_message', sa.MetaData(),
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('message_id', sa.String(30), nullable=False, unique=True),
+        sa.Column('channel_id', sa.String(50), nullable=False),
+        sa.Column('author', sa.Text()),
+        sa.Column('content', sa.Text()),
+        sa.Column('timestamp', sa.String(50), nullable=False),
+        sa.Column('edited_timestamp', sa.String(50)),
+        sa.Column('attachments', sa.Text()),
+        sa.Column('deleted', sa.Boolean()),
+        sa.Column('received_at', sa.DateTime()),
+        sa.Index('ix_buffered_message_channel_timestamp', 'channel_id', 'timestamp'),
+    )
+    buffered_message.create(bind=conn, checkfirst=True)
+
+@migration(10, 'Fetched and summarized watermarks')
+def _channel_watermarks(conn):
+    _add_column(conn, 'channel_state', sa.Column('fetched_until', sa.String(50)))
+    _add_column(conn, 'channel_state', sa.Column('summarized_until', sa.String(50)))
+    # Everything up to the last read message has been summarized
+    _backfill(conn, 'channel_state',
+              "summarized_until = last_read_timestamp, fetched_until = last_read_timestamp",
+              "summarized_until IS NULL AND last_read_timestamp IS NOT NULL")
+
+@migration(11, 'Ollama endpoint routing and fallback model')
+def _ollama_routing(conn):
+    _add_column(conn, 'app_config', sa.Column('ollama_extra_urls', sa.Text()))
+    _add_column(conn, 'app_config', sa.Column('fallback_model_name', sa.String(50)))
+    _add_column(conn, 'app_config', sa.Column('fallback_backlog_messages', sa.Integer(), server_default='0'))
+
+@migration(12, 'Batched summaries for small channels')
+def _batched_summaries(conn):
+    _add_column(conn, 'app_config', sa.Column('batch_small_channels', sa.Boolean(), server_default=sa.false()))
+    _add_column(conn, 'app_config', sa.Column('batch_max_messages', sa.Integer(), server_default='20'))
+
+@migration(13, 'Channel priorities')
+def _channel_priority(conn):
+    _add_column(conn, 'channel_state', sa.Column('priority', sa.Integer(), server_default='0'))
+
+@migration(14, 'Semantic search embedding model')
+def _embedding_model(conn):
+    _add_column(conn, 'app_config', sa.Column('embedding_model', sa.String(50)))
+
+@migration(15, 'Conversation threads')
+def _conversation_threads(conn):
+    _add_column(conn, 'app_config', sa.Column('cluster_threads', sa.Boolean(), server_default=sa.false()))
+    _add_column(conn, 'buffered_message', sa.Column('reference_id', sa.String(30)))
+
+@migration(16, 'Configuration version counter')
+def _config_version(conn):
+    _add_column(conn, 'app_config', sa.Column('config_version', sa.Integer(), server_default='0'))
+
+@migration(17, 'Discord token pool')
+def _discord_tokens(conn):
+    _add_column(conn, 'app_config', sa.Column('discord_extra_tokens', sa.Text()))
+
+@migration(18, 'Rolling summaries')
+def _rolling_summaries(conn):
+    _add_column(conn, 'channel_state', sa.Column('rolling_minutes', sa.Integer()))
+    _add_column(conn, 'channel_state', sa.Column('rolling_state', sa.Text()))
+
+@migration(19, 'Backfill window failures')
+def _backfill_window_failures(conn):
+    _add_column(conn, 'backfill_job', sa.Column('window_failures', sa.Text(), server_default='{}'))
+
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+_version_metadata = sa.MetaData()
+schema_version_table = sa.Table(
+    'schema_version', _version_metadata,
+    sa.Column('version', sa.Integer(), primary_key=True, autoincrement=False),
+    sa.Column('description', sa.String(200)),
+    sa.Column('applied_at', sa.DateTime()),
+)
+
+def _ensure_version_table(conn):
+    schema_version_table.create(bind=conn, checkfirst=True)
+
+def get_schema_version(conn):
+    """Current schema version, or None if the database is not versioned yet"""
+    if 'schema_version' not in inspect(conn).get_table_names():
+        return None
+    return conn.execute(text("SELECT MAX(version) FROM schema_version")).scalar() or 0
+
+def _begin_locked(conn):
+    """Start a transaction holding the migration lock"""
+    if conn.dialect.name == 'sqlite':
+        conn.exec_driver_sql("BEGIN IMMEDIATE")
+    elif conn.dialect.name == 'postgresql':
+        # Released automatically when the transaction ends
+        conn.execute(text("SELECT pg_advisory_xact_lock(:key)"), {'key': MIGRATION_LOCK_KEY})
+
+def _stamp(conn, version, description):
+    conn.execute(schema_version_table.insert().values(
+        version=version, description=description,
+        applied_at=datetime.now(timezone.utc).replace(tzinfo=None)
+    ))
+
+def _create_schema(conn):
+    """Create all tables for a brand new database from the current models"""
+    from app import db
+    import models  # noqa: F401 - register tables on db.metadata
+
+    db.metadata.create_all(bind=conn)
+
+def migrate_engine(engine):
+    """Bring the database behind engine up to LATEST_VERSION.
+
+    Returns the number of migrations applied. Already-current databases
+    cost a single query.
+    """
+    # Fast path: one query, no lock
+    with engine.connect() as conn:
+        try:
+            current = conn.execute(text("SELECT MAX(version) FROM schema_version")).scalar()
+        except Exception:
+            current = None
+        conn.rollback()
+        if current == LATEST_VERSION:
+            return 0
+
+    applied = 0
+    with engine.connect() as conn:
+        _begin_locked(conn)
+        version = get_schema_version(conn)
+
+        if version is None:
+            # Unversioned: either a brand new database or one created before
+            # migrations were tracked, which gets every migration applied
+            is_new = not inspect(conn).get_table_names()
+            _create_schema(conn)
+            _ensure_version_table(conn)
+            if is_new:
+                # Fresh database: the models already describe the latest schema
+                _stamp(conn, LATEST_VERSION, 'Initial schema')
+                conn.commit()
+                logger.info(f"Created new database schema at version {LATEST_VERSION}")
+                return 0
+            conn.commit()
+        else:
+            conn.rollback()
+
+        for target, description, func in MIGRATIONS:
+            _begin_locked(conn)
+            # Re-read under the lock so concurrent starters never apply twice
+            if get_schema_version(conn) >= target:
+                conn.rollback()
+                continue
+
+            logger.info(f"Applying migration {target}: {description}")
+            start = time.monotonic()
+            try:
+                func(conn)
+                _stamp(conn, target, description)
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                logger.error(f"Migration {target} failed, rolled back")
+                raise
+
+            applied += 1
+            logger.info(f"✓ Migration {target} applied in {time.monotonic() - start:.2f}s")
+
+    return applied
+
+def database_url(path_or_url):
+    """Accept either a database URL or a path to a SQLite file"""
+    if '://' in path_or_url:
+        return normalize_database_url(path_or_url)
+    return f"sqlite:///{os.path.abspath(path_or_url)}"
+
+def normalize_database_url(url):
+    """Use the SQLAlchemy dialect name for postgres:// URLs (Heroku style)"""
+    if url.startswith('postgres://'):
+        return 'postgresql://' + url[len('postgres://'):]
+    return url
+
+def migrate_database(db_path='discord_summaries.db'):
+    """Migrate an existing database, given a SQLite file path or a database URL"""
+
+    url = sa.engine.make_url(database_url(db_path))
+    if url.get_backend_name() == 'sqlite' and not os.path.exists(url.database or ''):
+        print(f"Database {db_path} not found. No migration needed.")
+        return
+
+    engine = create_engine(url)
+    try:
+        applied = migrate_engine(engine)
+        if applied:
+            print(f"\n✅ Applied {applied} migration(s), schema is at version {LATEST_VERSION}")
+        else:
+            print(f"✅ Schema is up to date (version {LATEST_VERSION})")
+    except Exception as e:
         print(f"\n❌ Error during migration: {e}")
         return False
     finally:
-        conn.close()
-    
+        engine.dispose()
+
+    return True
+
+def compact_transcripts(db_path, codec='zlib', batch_size=COMPACT_BATCH_SIZE):
+    """Convert JSON transcripts to the compact compressed encoding in batches"""
+    from transcript_codec import encode_messages, available_codec
+
+    codec = available_codec(codec)
+    engine = create_engine(database_url(db_path))
+
+    print(f"Compacting transcripts with {codec}...")
+    start = time.monotonic()
+    last_id = 0
+    converted = 0
+    bytes_before = 0
+    bytes_after = 0
+
+    try:
+        with engine.connect() as conn:
+            while True:
+                # Walk by primary key so each batch is an index range scan
+                rows = conn.execute(text(
+                    "SELECT id, original_messages FROM summary "
+                    "WHERE id > :last_id AND original_messages IS NOT NULL ORDER BY id LIMIT :limit"
+                ), {'last_id': last_id, 'limit': batch_size}).fetchall()
+                if not rows:
+                    break
+
+                updates = []
+                for row_id, original_messages in rows:
+                    try:
+                        messages = json.loads(original_messages)
+                    except ValueError:
+                        print(f"⚠️  Skipping summary {row_id}: transcript is not valid JSON")
+                        continue
+                    blob = encode_messages(messages, codec)
+                    bytes_before += len(original_messages.encode('utf-8'))
+                    bytes_after += len(blob)
+                    updates.append({'blob': blob, 'id': row_id})
+
+                if updates:
+                    conn.execute(text(
+                        "UPDATE summary SET messages_blob = :blob, original_messages = NULL WHERE id = :id"
+                    ), updates)
+                conn.commit()
+
+                converted += len(updates)
+                last_id = rows[-1][0]
+                print(f"  ...{converted} transcripts converted")
+
+        elapsed = time.monotonic() - start
+        ratio = bytes_before / bytes_after if bytes_after else 0
+        print(f"\n✅ Compacted {converted} transcripts in {elapsed:.1f}s: "
+              f"{bytes_before} -> {bytes_after} bytes ({ratio:.1f}x smaller)")
+        print("Run VACUUM (or the retention job) to return the freed space to the filesystem.")
+
+    except sa.exc.SQLAlchemyError as e:
+        print(f"\n❌ Error compacting transcripts: {e}")
+        return False
+    finally:
+        engine.dispose()
+
     return True
 
 if __name__ == "__main__":
-    if len(sys.argv) > 1:
-        db_path = sys.argv[1]
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
+
+    # Optional: --compact-transcripts[=zlib|zstd] converts stored transcripts after migrating
+    compact_codec = None
+    args = []
+    for arg in sys.argv[1:]:
+        if arg.startswith('--compact-transcripts'):
+            compact_codec = arg.partition('=')[2] or 'zlib'
+        else:
+            args.append(arg)
+
+    if args:
+        db_path = args[0]
+    elif os.environ.get('DATABASE_URL', '').split(':', 1)[0] not in ('', 'sqlite'):
+        # Server databases (e.g. PostgreSQL) are always reachable by URL
+        db_path = os.environ['DATABASE_URL']
     else:
         # Try common locations
         if os.path.exists('discord_summaries.db'):
@@ -149,8 +447,10 @@ if __name__ == "__main__":
             db_path = '/app/data/discord_summaries.db'
         else:
             print("Could not find database. Please specify path as argument.")
-            print("Usage: python migrate_db.py [path/to/discord_summaries.db]")
+            print("Usage: python migrate_db.py [path/to/discord_summaries.db | DATABASE_URL] "
+                  "[--compact-transcripts[=zlib|zstd]]")
             sys.exit(1)
-    
-    print(f"Migrating database: {db_path}")
-    migrate_database(db_path)
\ No newline at end of file
+
+    print(f"Migrating database: {sa.engine.make_url(database_url(db_path)).render_as_string(hide_password=True)}")
+    if migrate_database(db_path) and compact_codec:
+        compact_transcripts(db_path, compact_codec)
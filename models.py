@@ -1,23 +1,46 @@
-from datetime import datetime, timezone
+from datetime import datetime, timezone, timedelta
 import json
+import logging
+import os
+import time
+from flask import current_app, has_app_context
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import or_, and_, func, insert, text
+from sqlalchemy.orm import load_only
+from sqlalchemy.exc import IntegrityError
 
 # Import db from app module
 from app import db
 
-try:
-    import pytz
-except ImportError:
-    # Fallback if pytz is not installed
-    pytz = None
+from transcript_codec import encode_messages, decode_messages
+
+logger = logging.getLogger(__name__)
+
+# How long a worker owns a claimed channel before others may take it over
+CLAIM_LEASE_SECONDS = 50 * 60
+# Seconds a worker uses its cached configuration before checking the version counter
+CONFIG_CHECK_SECONDS = float(os.environ.get('CONFIG_CHECK_SECONDS', 1))
+
+def load_pytz():
+    """pytz, imported on first use so processes that never format a time skip it"""
+    try:
+        import pytz
+    except ImportError:
+        # Fallback if pytz is not installed
+        return None
+    return pytz
 
 class AppConfig(db.Model):
     """Application configuration stored in database"""
     id = db.Column(db.Integer, primary_key=True)
     user_token = db.Column(db.String(100), nullable=True)
+    discord_extra_tokens = db.Column(db.Text, nullable=True)  # Additional Discord tokens, one per line
     channel_ids = db.Column(db.Text, default='[]')  # JSON array of channel IDs
     ollama_url = db.Column(db.String(200), default='http://localhost:11434')
     model_name = db.Column(db.String(50), default='llama3.2')
+    ollama_extra_urls = db.Column(db.Text, nullable=True)  # Additional Ollama servers, one URL per line
+    fallback_model_name = db.Column(db.String(50), nullable=True)  # Smaller model used for large backlogs
+    fallback_backlog_messages = db.Column(db.Integer, default=0)  # Backlog size switching to the fallback model (0 disables)
     timezone = db.Column(db.String(50), default='US/Eastern')  # User's preferred timezone
     time_format_12hr = db.Column(db.Boolean, default=True)  # True for 12hr, False for 24hr
     
@@ -31,6 +54,22 @@ class AppConfig(db.Model):
     smtp_use_tls = db.Column(db.Boolean, default=True)
     daily_email_time = db.Column(db.String(5), default='09:00')  # Format: HH:MM
     
+    # Retention settings
+    transcript_retention_days = db.Column(db.Integer, default=0)  # 0 keeps raw messages forever
+    
+    # Days of history to summarize when a channel is added (0 disables backfill)
+    backfill_days = db.Column(db.Integer, default=0)
+    
+    # Ollama model embedding summaries for semantic search (unset disables it)
+    embedding_model = db.Column(db.String(50), nullable=True)
+    
+    # Summarize channels with few new messages together in one prompt
+    batch_small_channels = db.Column(db.Boolean, default=False)
+    batch_max_messages = db.Column(db.Integer, default=20)  # Channels with at most this many messages are batched
+    
+    # Summarize interleaved conversations in busy channels separately
+    cluster_threads = db.Column(db.Boolean, default=False)
+    
     # Custom summary prompt
     summary_prompt = db.Column(db.Text, default='''Please provide a concise summary of the following Discord conversation. 
 Focus on the main topics discussed, key decisions made, and important information shared. 
@@ -41,21 +80,64 @@ Conversation:
 
 Summary:''')
     
+    # Bumped on every save so each worker reloads its cached copy
+    config_version = db.Column(db.Integer, default=0)
+    
     created_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc))
     updated_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc), 
                           onupdate=lambda: datetime.now(timezone.utc))
     
     def get_channel_ids(self):
         """Return channel IDs as a list"""
-        try:
-            return json.loads(self.channel_ids) if self.channel_ids else []
-        except:
-            return []
+        # Parsed once per value of the column
+        cached = self.__dict__.get('_parsed_channel_ids')
+        if cached is None or cached[0] is not self.channel_ids:
+            try:
+                ids = json.loads(self.channel_ids) if self.channel_ids else []
+            except:
+                ids = []
+            cached = self.__dict__['_parsed_channel_ids'] = (self.channel_ids, ids)
+        return list(cached[1])
     
     def set_channel_ids(self, ids_list):
         """Set channel IDs from a list"""
         self.channel_ids = json.dumps(ids_list)
     
+    def get_discord_tokens(self):
+        """Primary Discord token followed by any additional tokens"""
+        tokens = [self.user_token] if self.user_token else []
+        for line in (self.discord_extra_tokens or '').splitlines():
+            token = line.strip()
+            if token and token not in tokens:
+                tokens.append(token)
+        return tokens
+    
+    def get_ollama_endpoints(self):
+        """(url, max_concurrency) of the primary and additional Ollama servers.
+        
+        Additional servers are listed one per line as `URL` or
+        `URL,concurrency=N`; max_concurrency is None when not set.
+        """
+        endpoints = [(self.ollama_url, None)] if self.ollama_url else []
+        seen = {self.ollama_url}
+        for line in (self.ollama_extra_urls or '').splitlines():
+            parts = [part.strip() for part in line.split(',')]
+            url = parts[0]
+            if not url or url in seen:
+                continue
+            concurrency = None
+            for option in parts[1:]:
+                key, _, value = option.partition('=')
+                if key.strip() == 'concurrency' and value.strip().isdigit():
+                    concurrency = max(int(value), 1)
+            endpoints.append((url, concurrency))
+            seen.add(url)
+        return endpoints
+    
+    def get_ollama_urls(self):
+        """Primary Ollama URL followed by any additional servers"""
+        return [url for url, _ in self.get_ollama_endpoints()]
+    
     def is_configured(self):
         """Check if app is properly configured"""
         return bool(self.user_token and self.get_channel_ids() and self.ollama_url)
@@ -67,47 +149,143 @@ Summary:''')
     
     def format_datetime(self, dt):
         """Format datetime according to user preferences"""
-        if not dt:
-            return ""
-        
-        # If pytz is not available, use basic formatting
-        if not pytz:
-            if self.time_format_12hr:
-                return dt.strftime('%Y-%m-%d %I:%M %p UTC')
-            else:
-                return dt.strftime('%Y-%m-%d %H:%M UTC')
-        
-        # Convert to user's timezone
-        if dt.tzinfo is None:
-            dt = pytz.UTC.localize(dt)
-        
-        user_tz = pytz.timezone(self.timezone)
-        local_dt = dt.astimezone(user_tz)
-        
-        # Format based on preference
-        if self.time_format_12hr:
-            time_format = '%I:%M %p'  # 12-hour format
-        else:
-            time_format = '%H:%M'  # 24-hour format
-        
-        date_format = '%Y-%m-%d'
-        tz_abbr = local_dt.strftime('%Z')
-        
-        return f"{local_dt.strftime(date_format)} {local_dt.strftime(time_format)} {tz_abbr}"
+        return self.get_formatter().format(dt)
+    
+    def get_formatter(self):
+        """TimestampFormatter for the user's timezone and clock, reused while the settings stay the same"""
+        key = (self.timezone, self.time_format_12hr)
+        cached = self.__dict__.get('_formatter')
+        if cached is None or cached[0] != key:
+            # If pytz is not available, timestamps are shown in UTC
+            tzinfo = self.get_tzinfo() if load_pytz() else None
+            cached = self.__dict__['_formatter'] = (key, TimestampFormatter(tzinfo, self.time_format_12hr))
+        return cached[1]
+    
+    def get_tzinfo(self):
+        """The user's timezone as a tzinfo, resolved once per value of the setting"""
+        cached = self.__dict__.get('_tzinfo')
+        if cached is None or cached[0] != self.timezone:
+            cached = self.__dict__['_tzinfo'] = (self.timezone, load_pytz().timezone(self.timezone))
+        return cached[1]
+    
+    def get_server_names(self):
+        """{channel_id: server name} of channels grouped under a server"""
+        cached = self.__dict__.get('_server_names')
+        if cached is None:
+            cached = dict(db.session.query(ChannelState.channel_id, ChannelState.server_name)
+                          .filter(ChannelState.server_name.isnot(None)))
+            if self not in db.session:
+                # Only snapshots keep it; they are replaced whenever the configuration is saved
+                self.__dict__['_server_names'] = cached
+        return cached
     
     def get_summary_prompt(self, content, max_length=500):
         """Get the formatted summary prompt"""
         return self.summary_prompt.format(content=content, max_length=max_length)
     
+    def uses_default_prompt(self):
+        """Whether the summary prompt is unchanged from the default (ignoring whitespace)"""
+        default = AppConfig.__table__.c.summary_prompt.default.arg
+        return not self.summary_prompt or self.summary_prompt.split() == default.split()
+    
     @classmethod
     def get_config(cls):
-        """Get the single config instance or create one"""
+        """Read-only snapshot of the configuration, cached per process.
+        
+        The cached copy is reused until config_version changes, which is
+        checked at most every CONFIG_CHECK_SECONDS, so requests and jobs
+        neither reload nor re-parse it. Use load_for_update() to change it.
+        """
+        cache = current_app.extensions.setdefault('app_config_cache', {})
+        config = cache.get('config')
+        now = time.monotonic()
+        if config is not None and now - cache['checked'] < CONFIG_CHECK_SECONDS:
+            return config
+        
+        version = db.session.query(cls.config_version).order_by(cls.id).limit(1).scalar()
+        if config is None or version != config.config_version:
+            # A copy outside the session, so it is safe to share between threads
+            row = cls.load_for_update()
+            config = cls(**{column: getattr(row, column) for column in cls.__table__.columns.keys()})
+            config.get_channel_ids()
+            config.get_server_names()
+            cache['config'] = config
+        cache['checked'] = now
+        return config
+    
+    @classmethod
+    def load_for_update(cls):
+        """Get the single config instance, attached to the session, or create one"""
         config = cls.query.first()
         if not config:
             config = cls()
             db.session.add(config)
             db.session.commit()
         return config
+    
+    @classmethod
+    def bump_version(cls):
+        """Commit and make every worker reload its cached configuration"""
+        db.session.query(cls).update({cls.config_version: func.coalesce(cls.config_version, 0) + 1},
+                                     synchronize_session=False)
+        db.session.commit()
+        current_app.extensions.get('app_config_cache', {}).clear()
+
+class TimestampFormatter:
+    """Formats timestamps in one timezone and clock style.
+    
+    Output has minute precision, so results are memoized per minute and
+    ISO strings in UTC (as Discord sends them) are looked up by their
+    minute prefix without being parsed.
+    """
+    
+    # Minutes remembered before the memo is reset
+    CACHE_SIZE = 4096
+    
+    def __init__(self, tzinfo, time_format_12hr=True):
+        self.tzinfo = tzinfo  # None formats naive datetimes as UTC, without conversion
+        clock = '%I:%M %p' if time_format_12hr else '%H:%M'
+        self.pattern = f"%Y-%m-%d {clock} %Z" if tzinfo else f"%Y-%m-%d {clock} UTC"
+        self._by_minute = {}
+        self._by_prefix = {}
+    
+    def _remember(self, cache, key, render):
+        text = cache.get(key)
+        if text is None:
+            if len(cache) >= self.CACHE_SIZE:
+                cache.clear()
+            text = cache[key] = render()
+        return text
+    
+    def format(self, dt):
+        if not dt:
+            return ""
+        if self.tzinfo is None:
+            return self._remember(self._by_minute, dt.replace(second=0, microsecond=0),
+                                  lambda: dt.strftime(self.pattern))
+        if dt.tzinfo is None:
+            dt = dt.replace(tzinfo=timezone.utc)
+        return self._remember(self._by_minute, int(dt.timestamp() // 60),
+                              lambda: dt.astimezone(self.tzinfo).strftime(self.pattern))
+    
+    def format_iso(self, timestamp):
+        """Format an ISO 8601 timestamp string, raising ValueError if it is not one"""
+        if len(timestamp) >= 16 and timestamp.endswith(('+00:00', 'Z')):
+            return self._remember(self._by_prefix, timestamp[:16],
+                                  lambda: self.format(datetime.fromisoformat(timestamp.replace('Z', '+00:00'))))
+        return self.format(datetime.fromisoformat(timestamp.replace('Z', '+00:00')))
+    
+    def localize_messages(self, messages):
+        """Set formatted_timestamp on every message of a list, returning the list"""
+        for msg in messages:
+            timestamp = msg.get('timestamp')
+            if not timestamp:
+                continue
+            try:
+                msg['formatted_timestamp'] = self.format_iso(timestamp)
+            except (TypeError, ValueError):
+                msg['formatted_timestamp'] = timestamp
+        return messages
 
 class ChannelState(db.Model):
     """Track the last read timestamp for each channel"""
@@ -116,7 +294,15 @@ class ChannelState(db.Model):
     server_name = db.Column(db.String(100), nullable=True)  # Discord server name
     server_id = db.Column(db.String(50), nullable=True)  # Discord server ID
     last_read_timestamp = db.Column(db.String(50), nullable=True)  # ISO format timestamp
+    fetched_until = db.Column(db.String(50), nullable=True)  # Newest message timestamp in the message buffer
+    summarized_until = db.Column(db.String(50), nullable=True)  # Newest message timestamp covered by a summary
     last_summary_date = db.Column(db.Date, nullable=True)  # Track daily summaries
+    transcript_retention_days = db.Column(db.Integer, nullable=True)  # Overrides AppConfig when set
+    priority = db.Column(db.Integer, default=0)  # Higher is summarized first
+    rolling_minutes = db.Column(db.Integer, nullable=True)  # Rolling summary interval; None summarizes hourly
+    rolling_state = db.Column(db.Text, nullable=True)  # JSON running summary and open topics of rolling summaries
+    claimed_by = db.Column(db.String(100), nullable=True)  # Worker currently processing this channel
+    claimed_until = db.Column(db.DateTime, nullable=True)  # Claim lease expiry
     created_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc))
     updated_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc), 
                           onupdate=lambda: datetime.now(timezone.utc))
@@ -130,9 +316,73 @@ class ChannelState(db.Model):
         if self.server_name:
             return f"{self.server_name} - {self.channel_id}"
         return f"Channel {self.channel_id}"
+    
+    def get_rolling_state(self):
+        """Running state of rolling summaries as a dict, empty before the first one"""
+        try:
+            return json.loads(self.rolling_state) if self.rolling_state else {}
+        except ValueError:
+            return {}
+    
+    def set_rolling_state(self, state):
+        self.rolling_state = json.dumps(state) if state else None
+    
+    @classmethod
+    def claim(cls, channel_ids, worker_id, lease_seconds=CLAIM_LEASE_SECONDS):
+        """Claim channels that no other worker is processing, returning their IDs.
+        
+        On PostgreSQL rows being claimed concurrently by another node are
+        skipped (FOR UPDATE SKIP LOCKED) instead of waited on, so several
+        nodes divide the channels between them without blocking.
+        """
+        if not channel_ids:
+            return []
+        
+        # Make sure every channel has a state row to lock
+        existing = {cid for (cid,) in db.session.query(cls.channel_id).filter(cls.channel_id.in_(channel_ids))}
+        missing = [cid for cid in channel_ids if cid not in existing]
+        if missing:
+            for channel_id in missing:
+                db.session.add(cls(channel_id=channel_id))
+            try:
+                db.session.commit()
+            except IntegrityError:
+                # Another node created them first
+                db.session.rollback()
+        
+        now = datetime.now(timezone.utc)
+        states = cls.query.filter(
+            cls.channel_id.in_(channel_ids),
+            or_(cls.claimed_until.is_(None), cls.claimed_until < now)
+        ).with_for_update(skip_locked=True).all()
+        
+        for state in states:
+            state.claimed_by = worker_id
+            state.claimed_until = now + timedelta(seconds=lease_seconds)
+        db.session.commit()
+        
+        claimed = {state.channel_id for state in states}
+        # Keep the configured order
+        return [cid for cid in channel_ids if cid in claimed]
+    
+    @classmethod
+    def release(cls, channel_id, worker_id):
+        """Release a claim taken by claim()"""
+        cls.query.filter_by(channel_id=channel_id, claimed_by=worker_id).update(
+            {'claimed_by': None, 'claimed_until': None}, synchronize_session=False
+        )
+        db.session.commit()
 
 class Summary(db.Model):
     """Store generated summaries"""
+    # Keyset pagination walks (channel_id, timestamp, id) newest first
+    __table_args__ = (
+        db.Index('ix_summary_channel_timestamp', 'channel_id', 'timestamp', 'id'),
+        # Backs search_filter's full-text query; new databases are created from the models, not migration 7
+        db.Index('ix_summary_text_fts', text("to_tsvector('english', summary_text)"),
+                 postgresql_using='gin').ddl_if(dialect='postgresql'),
+    )
+    
     id = db.Column(db.Integer, primary_key=True)
     channel_id = db.Column(db.String(50), db.ForeignKey('channel_state.channel_id'), nullable=False)
     summary_text = db.Column(db.Text, nullable=False)
@@ -141,6 +391,36 @@ class Summary(db.Model):
     summary_type = db.Column(db.String(20), default='hourly')  # 'hourly' or 'daily'
     # New field to store the original messages
     original_messages = db.Column(db.Text, nullable=True)  # JSON string of messages
+    messages_blob = db.Column(db.LargeBinary, nullable=True)  # Compact compressed messages (see transcript_codec)
+    archived_at = db.Column(db.DateTime, nullable=True)  # Set when messages moved to the archive
+    
+    @classmethod
+    def search_filter(cls, query):
+        """Filter clause matching summaries whose text matches query.
+        
+        Uses native full-text search on PostgreSQL (backed by a GIN index)
+        and a substring match elsewhere.
+        """
+        if db.engine.dialect.name == 'postgresql':
+            return func.to_tsvector('english', cls.summary_text).op('@@')(
+                func.websearch_to_tsquery('english', query)
+            )
+        return cls.summary_text.contains(query)
+    
+    @classmethod
+    def latest_for_channels(cls, channel_ids):
+        """{channel_id: latest summary} of several channels in one query, without their transcripts"""
+        if not channel_ids:
+            return {}
+        
+        latest = db.session.query(
+            cls.channel_id, func.max(cls.timestamp).label('latest')
+        ).filter(cls.channel_id.in_(channel_ids)).group_by(cls.channel_id).subquery()
+        summaries = cls.query.options(
+            load_only(cls.id, cls.channel_id, cls.summary_text, cls.message_count, cls.timestamp, cls.summary_type)
+        ).join(latest, and_(cls.channel_id == latest.c.channel_id, cls.timestamp == latest.c.latest))
+        # Summaries sharing a timestamp resolve to the highest ID, as with ORDER BY timestamp DESC
+        return {summary.channel_id: summary for summary in summaries.order_by(cls.id)}
     
     def formatted_timestamp(self, config=None):
         """Return a formatted timestamp string using user preferences"""
@@ -148,16 +428,48 @@ class Summary(db.Model):
             config = AppConfig.get_config()
         return config.format_datetime(self.timestamp)
     
-    def get_messages(self):
-        """Return original messages as a list"""
+    def has_messages(self):
+        """Check if the transcript is stored in the database"""
+        return bool(self.original_messages or self.messages_blob)
+    
+    def get_messages(self, strict=False):
+        """Return original messages as a list.
+        
+        An undecodable transcript reads as [] unless strict, which raises
+        instead; callers about to discard the stored copy must be strict.
+        """
+        if self.messages_blob:
+            try:
+                return decode_messages(self.messages_blob)
+            except Exception as e:
+                if strict:
+                    raise
+                logger.error(f"Could not decode messages of summary {self.id}: {str(e)}")
+                return []
         try:
             return json.loads(self.original_messages) if self.original_messages else []
         except:
+            if strict:
+                raise
             return []
     
     def set_messages(self, messages_list):
-        """Set original messages from a list"""
-        self.original_messages = json.dumps(messages_list)
+        """Set original messages from a list, compressed if enabled"""
+        codec = None
+        if has_app_context():
+            codec = current_app.config.get('TRANSCRIPT_COMPRESSION')
+        
+        if codec and codec != 'none':
+            self.messages_blob = encode_messages(messages_list, codec)
+            self.original_messages = None
+        else:
+            self.original_messages = json.dumps(messages_list)
+            self.messages_blob = None
+    
+    def clear_messages(self):
+        """Remove the stored transcript"""
+        self.original_messages = None
+        self.messages_blob = None
 
 class DailySummary(db.Model):
     """Track daily summaries that have been sent via email"""
@@ -167,4 +479,265 @@ class DailySummary(db.Model):
     summary_date = db.Column(db.Date, nullable=False)
     email_sent = db.Column(db.Boolean, default=False)
     email_sent_at = db.Column(db.DateTime, nullable=True)
-    created_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc))
\ No newline at end of file
+    created_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc))
+
+class BackfillJob(db.Model):
+    """Resumable summarization of a channel's history, walked backwards in windows"""
+    id = db.Column(db.Integer, primary_key=True)
+    channel_id = db.Column(db.String(50), db.ForeignKey('channel_state.channel_id'), nullable=False, index=True)
+    start_time = db.Column(db.DateTime, nullable=False)  # Oldest point to backfill
+    end_time = db.Column(db.DateTime, nullable=False)  # Newest point (exclusive)
+    window_hours = db.Column(db.Integer, default=24)
+    completed_windows = db.Column(db.Text, default='[]')  # JSON array of finished window indexes
+    window_failures = db.Column(db.Text, default='{}')  # JSON object of window index -> failed attempts
+    status = db.Column(db.String(20), default='pending')  # 'pending', 'running', 'completed' or 'failed'
+    summaries_created = db.Column(db.Integer, default=0)
+    messages_fetched = db.Column(db.Integer, default=0)
+    last_error = db.Column(db.Text, nullable=True)
+    created_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc))
+    updated_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc), 
+                          onupdate=lambda: datetime.now(timezone.utc))
+    
+    def get_windows(self):
+        """Return (index, start, end) of every window, newest first"""
+        start = _as_utc(self.start_time)
+        end = _as_utc(self.end_time)
+        step = timedelta(hours=self.window_hours or 24)
+        
+        windows = []
+        index = 0
+        window_end = end
+        while window_end > start:
+            window_start = max(window_end - step, start)
+            windows.append((index, window_start, window_end))
+            window_end = window_start
+            index += 1
+        return windows
+    
+    def get_completed_windows(self):
+        """Return finished window indexes as a set"""
+        try:
+            return set(json.loads(self.completed_windows)) if self.completed_windows else set()
+        except:
+            return set()
+    
+    def mark_window_completed(self, index):
+        completed = self.get_completed_windows()
+        completed.add(index)
+        self.completed_windows = json.dumps(sorted(completed))
+    
+    def get_window_failures(self):
+        """Return failed attempts per window index"""
+        try:
+            return {int(index): count for index, count in json.loads(self.window_failures or '{}').items()}
+        except:
+            return {}
+    
+    def record_window_failure(self, index):
+        """Count a failed attempt at a window, returning its attempts so far"""
+        failures = self.get_window_failures()
+        failures[index] = failures.get(index, 0) + 1
+        self.window_failures = json.dumps({str(i): count for i, count in sorted(failures.items())})
+        return failures[index]
+    
+    def remaining_windows(self):
+        """Windows still to process, newest first"""
+        completed = self.get_completed_windows()
+        return [w for w in self.get_windows() if w[0] not in completed]
+    
+    def to_dict(self):
+        windows = self.get_windows()
+        return {
+            'id': self.id,
+            'channel_id': self.channel_id,
+            'status': self.status,
+            'start_time': _as_utc(self.start_time).isoformat(),
+            'end_time': _as_utc(self.end_time).isoformat(),
+            'windows_total': len(windows),
+            'windows_completed': len(self.get_completed_windows()),
+            'summaries_created': self.summaries_created,
+            'messages_fetched': self.messages_fetched,
+            'window_failures': sum(self.get_window_failures().values()),
+            'last_error': self.last_error
+        }
+
+class BufferedMessage(db.Model):
+    """Messages received from the Discord gateway, waiting to be summarized"""
+    __table_args__ = (
+        db.Index('ix_buffered_message_channel_timestamp', 'channel_id', 'timestamp'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    message_id = db.Column(db.String(30), unique=True, nullable=False)  # Discord snowflake
+    channel_id = db.Column(db.String(50), nullable=False)
+    author = db.Column(db.Text, nullable=True)  # JSON author object
+    content = db.Column(db.Text, nullable=True)
+    timestamp = db.Column(db.String(50), nullable=False)  # ISO format, as sent by Discord
+    edited_timestamp = db.Column(db.String(50), nullable=True)
+    attachments = db.Column(db.Text, nullable=True)  # JSON array
+    reference_id = db.Column(db.String(30), nullable=True)  # Message this one replies to
+    deleted = db.Column(db.Boolean, default=False)
+    received_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc))
+    
+    def to_message(self):
+        """Return the message shaped like a Discord REST API message"""
+        return {
+            'id': self.message_id,
+            'channel_id': self.channel_id,
+            'author': json.loads(self.author) if self.author else {},
+            'content': self.content or '',
+            'timestamp': self.timestamp,
+            'edited_timestamp': self.edited_timestamp,
+            'attachments': json.loads(self.attachments) if self.attachments else [],
+            'message_reference': {'message_id': self.reference_id} if self.reference_id else None
+        }
+    
+    def _update_from(self, data):
+        # Update events only carry the fields that changed
+        if 'author' in data:
+            self.author = json.dumps(data['author'])
+        if 'content' in data:
+            self.content = data['content']
+        if data.get('timestamp'):
+            self.timestamp = data['timestamp']
+        if 'edited_timestamp' in data:
+            self.edited_timestamp = data['edited_timestamp']
+        if 'message_reference' in data:
+            self.reference_id = (data['message_reference'] or {}).get('message_id')
+        if 'attachments' in data:
+            self.attachments = json.dumps([
+                {'url': att.get('url'), 'filename': att.get('filename')}
+                for att in data['attachments'] or []
+            ])
+    
+    @classmethod
+    def apply_events(cls, events):
+        """Apply a batch of (event_type, data) gateway events in one transaction.
+        
+        MESSAGE_CREATE and MESSAGE_UPDATE upsert the message, MESSAGE_DELETE
+        marks it deleted and GAP_FILL (messages fetched over REST after a
+        reconnect) only inserts messages that are not buffered yet.
+        """
+        if not events:
+            return 0
+        
+        message_ids = {str(data['id']) for _, data in events if data.get('id')}
+        existing = {
+            row.message_id: row
+            for row in cls.query.filter(cls.message_id.in_(message_ids))
+        } if message_ids else {}
+        
+        applied = 0
+        newest = {}
+        # New messages are inserted in bulk, as the ORM inserts rows one statement at a time on SQLite
+        new_rows = []
+        for event_type, data in events:
+            message_id = str(data.get('id') or '')
+            if not message_id:
+                continue
+            row = existing.get(message_id)
+            
+            if event_type == 'MESSAGE_DELETE':
+                if row:
+                    row.deleted = True
+                    applied += 1
+                continue
+            
+            if row is None:
+                if not data.get('timestamp'):
+                    # Update for a message we never saw created
+                    continue
+                row = cls(message_id=message_id, channel_id=str(data['channel_id']))
+                new_rows.append(row)
+                existing[message_id] = row
+            elif event_type == 'GAP_FILL':
+                continue
+            
+            row._update_from(data)
+            applied += 1
+            if row.timestamp > newest.get(row.channel_id, ''):
+                newest[row.channel_id] = row.timestamp
+        
+        if new_rows:
+            columns = set(cls.__table__.columns.keys())
+            db.session.execute(insert(cls), [
+                {key: value for key, value in vars(row).items() if key in columns} for row in new_rows
+            ])
+        
+        # Advance the per-channel fetched watermarks
+        if newest:
+            states = {state.channel_id: state for state in
+                      ChannelState.query.filter(ChannelState.channel_id.in_(list(newest)))}
+            for channel_id, timestamp in newest.items():
+                state = states.get(channel_id)
+                if state is None:
+                    state = ChannelState(channel_id=channel_id)
+                    db.session.add(state)
+                if not state.fetched_until or timestamp > state.fetched_until:
+                    state.fetched_until = timestamp
+        
+        db.session.commit()
+        return applied
+    
+    @classmethod
+    def fetch_since(cls, channel_id, after_timestamp=None, limit=100):
+        """Up to `limit` buffered messages of a channel after an ISO timestamp, oldest first.
+        
+        Without a timestamp the newest `limit` messages are returned,
+        matching what a REST fetch without `after` would see.
+        """
+        query = cls.query.filter(cls.channel_id == channel_id, cls.deleted.is_(False))
+        if after_timestamp:
+            rows = query.filter(cls.timestamp > after_timestamp.replace('Z', '+00:00')) \
+                .order_by(cls.timestamp.asc()).limit(limit).all()
+        else:
+            rows = query.order_by(cls.timestamp.desc()).limit(limit).all()
+            rows.reverse()
+        return [row.to_message() for row in rows]
+    
+    @classmethod
+    def pending_counts(cls, channel_ids):
+        """Buffered messages not covered by a summary yet, per channel.
+        
+        Only channel_ids are counted; messages of channels that are no longer
+        configured stay buffered until pruned but are never summarized.
+        """
+        rows = db.session.query(cls.channel_id, func.count(cls.id)).outerjoin(
+            ChannelState, ChannelState.channel_id == cls.channel_id
+        ).filter(
+            cls.channel_id.in_(channel_ids),
+            cls.deleted.is_(False),
+            or_(ChannelState.summarized_until.is_(None), cls.timestamp > ChannelState.summarized_until)
+        ).group_by(cls.channel_id)
+        return dict(rows)
+    
+    @classmethod
+    def latest_message_id(cls, channel_id):
+        """Snowflake of the newest buffered message of a channel, or None"""
+        row = cls.query.filter_by(channel_id=channel_id).order_by(cls.timestamp.desc()).first()
+        return row.message_id if row else None
+    
+    @classmethod
+    def prune(cls, older_than):
+        """Delete summarized messages with timestamps before an aware datetime.
+        
+        Messages not covered by a summary yet are kept however old they are.
+        """
+        cutoff = older_than.isoformat()
+        deleted = 0
+        for channel_id, summarized_until in db.session.query(ChannelState.channel_id, ChannelState.summarized_until):
+            if not summarized_until:
+                continue
+            deleted += cls.query.filter(
+                cls.channel_id == channel_id,
+                cls.timestamp < cutoff,
+                cls.timestamp <= summarized_until
+            ).delete(synchronize_session=False)
+        db.session.commit()
+        return deleted
+
+def _as_utc(dt):
+    """Treat naive datetimes read back from the database as UTC"""
+    if dt is not None and dt.tzinfo is None:
+        return dt.replace(tzinfo=timezone.utc)
+    return dt
@@ -0,0 +1,250 @@
+"""
+On-demand sampling profiler for requests and scheduled jobs.
+
+While a profile is being taken, a background thread samples the Python
+stacks every few milliseconds and counts identical stacks. The result is
+written to PROFILE_DIR in the folded-stack format read by flamegraph.pl,
+speedscope and most other flamegraph viewers. Nothing runs when profiling
+is off: request hooks are only installed when PROFILE_TOKEN is set, and a
+job checks for a pending-runs file before it starts.
+
+- Requests: send `X-Profile: <PROFILE_TOKEN>` (or `?profile=<PROFILE_TOKEN>`)
+  and the response's X-Profile-File header names the profile.
+- Jobs: request profiles of the next N runs on the /profiles page.
+
+The sampler is a real OS thread even when gevent has patched threading:
+a greenlet sampler would only run while the profiled code waits on I/O.
+Under gevent a request profile follows the request's greenlet.
+"""
+import _thread
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from datetime import datetime
+
+from flask import current_app, g, request
+
+try:
+    import fcntl
+except ImportError:
+    # Not available on Windows; pending runs are then updated without a lock
+    fcntl = None
+
+try:
+    import greenlet
+    from gevent import monkey as gevent_monkey
+except ImportError:
+    gevent_monkey = None
+
+logger = logging.getLogger(__name__)
+
+# Seconds between samples
+PROFILE_INTERVAL = 0.005
+# Profiles kept in PROFILE_DIR; older ones are deleted
+PROFILE_KEEP = 50
+# Jobs that can be profiled from the profiles page
+PROFILED_JOBS = ['hourly_summary', 'daily_email']
+
+PENDING_FILE = 'pending.json'
+
+def _gevent_patched():
+    return gevent_monkey is not None and gevent_monkey.is_module_patched('threading')
+
+def _original(module, name, default):
+    """The unpatched function when gevent has monkey-patched threading, else default"""
+    return gevent_monkey.get_original(module, name) if _gevent_patched() else default
+
+class SamplingProfiler:
+    """Samples the stacks of one thread, or of every thread, until stopped"""
+
+    def __init__(self, thread_id=None, interval=PROFILE_INTERVAL, greenlet=None):
+        self.thread_id = thread_id  # OS thread ID; None samples every thread
+        self.greenlet = greenlet  # Under gevent, the greenlet of thread_id to follow
+        self.interval = interval
+        self.samples = Counter()
+        self.started = None
+        self.duration = 0.0
+        self._stopping = False
+        self._done = None
+
+    def start(self):
+        self.started = time.monotonic()
+        self._done = _original('_thread', 'allocate_lock', _thread.allocate_lock)()
+        self._done.acquire()
+        _original('_thread', 'start_new_thread', _thread.start_new_thread)(self._run, ())
+        return self
+
+    def stop(self):
+        if self._done is not None:
+            self._stopping = True
+            # Released by the sampler when it exits, within one interval
+            self._done.acquire()
+            self._done = None
+            self.duration = time.monotonic() - self.started
+        return self
+
+    def _frame(self, frames):
+        if self.greenlet is not None and self.greenlet.gr_frame is not None:
+            # Switched out, waiting on I/O; while it runs, the thread's frame is its own
+            return self.greenlet.gr_frame
+        return frames.get(self.thread_id)
+
+    def _run(self):
+        sleep = _original('time', 'sleep', time.sleep)
+        own = _original('_thread', 'get_ident', _thread.get_ident)()
+        try:
+            while not self._stopping:
+                sleep(self.interval)
+                frames = sys._current_frames()
+                if self.thread_id is not None:
+                    frame = self._frame(frames)
+                    if frame is not None:
+                        self.samples[self._fold(frame)] += 1
+                    continue
+
+                names = {thread.ident: thread.name for thread in threading.enumerate()}
+                for thread_id, frame in frames.items():
+                    if thread_id != own:
+                        prefix = names.get(thread_id, str(thread_id))
+                        self.samples[f"{prefix};{self._fold(frame)}"] += 1
+        finally:
+            self._done.release()
+
+    @staticmethod
+    def _fold(frame):
+        stack = []
+        while frame is not None:
+            code = frame.f_code
+            stack.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+            frame = frame.f_back
+        return ';'.join(reversed(stack))
+
+    def write(self, directory, label):
+        """Write the folded stacks to directory and return the file name"""
+        os.makedirs(directory, exist_ok=True)
+        safe_label = ''.join(c if c.isalnum() or c in '-_' else '_' for c in label)[:60]
+        name = f"{datetime.now().strftime('%Y%m%d-%H%M%S-%f')}-{safe_label}.folded"
+        with open(os.path.join(directory, name), 'w') as f:
+            for stack, count in self.samples.most_common():
+                f.write(f"{stack} {count}\n")
+
+        logger.info(f"Wrote profile {name}: {sum(self.samples.values())} samples over {self.duration:.2f}s")
+        _prune(directory)
+        return name
+
+def _prune(directory, keep=PROFILE_KEEP):
+    for old in list_profiles(directory)[keep:]:
+        try:
+            os.remove(os.path.join(directory, old['name']))
+        except OSError:
+            pass
+
+def list_profiles(directory):
+    """Profiles in directory, newest first"""
+    try:
+        names = [name for name in os.listdir(directory) if name.endswith('.folded')]
+    except FileNotFoundError:
+        return []
+
+    profiles = []
+    for name in names:
+        try:
+            stat = os.stat(os.path.join(directory, name))
+        except OSError:
+            continue
+        profiles.append({'name': name, 'size': stat.st_size,
+                         'created': datetime.fromtimestamp(stat.st_mtime)})
+    return sorted(profiles, key=lambda p: p['created'], reverse=True)
+
+@contextmanager
+def _pending_runs(directory):
+    """Read and update the {job: runs} file shared by every process on this host"""
+    os.makedirs(directory, exist_ok=True)
+    with open(os.path.join(directory, PENDING_FILE), 'a+') as f:
+        if fcntl is not None:
+            fcntl.flock(f, fcntl.LOCK_EX)
+        f.seek(0)
+        try:
+            pending = json.loads(f.read() or '{}')
+        except ValueError:
+            pending = {}
+        before = dict(pending)
+        yield pending
+        if pending != before:
+            f.seek(0)
+            f.truncate()
+            f.write(json.dumps({job: runs for job, runs in pending.items() if runs > 0}))
+
+def request_job_profiles(directory, job, runs):
+    """Profile the next runs of a scheduled job"""
+    with _pending_runs(directory) as pending:
+        pending[job] = max(runs, 0)
+
+def pending_job_profiles(directory):
+    if not os.path.exists(os.path.join(directory, PENDING_FILE)):
+        return {}
+    with _pending_runs(directory) as pending:
+        return dict(pending)
+
+def _take_job_run(directory, job):
+    # A single stat while no profiles are pending
+    if not os.path.exists(os.path.join(directory, PENDING_FILE)):
+        return False
+    with _pending_runs(directory) as pending:
+        if pending.get(job, 0) <= 0:
+            return False
+        pending[job] -= 1
+        return True
+
+@contextmanager
+def job_profile(job):
+    """Profile the enclosed run of a scheduled job if profiles were requested for it"""
+    directory = current_app.config['PROFILE_DIR']
+    if not _take_job_run(directory, job):
+        yield
+        return
+
+    # Jobs fan out to worker threads, so every thread is sampled
+    profiler = SamplingProfiler().start()
+    try:
+        yield
+    finally:
+        profiler.stop()
+        try:
+            profiler.write(directory, job)
+        except OSError as e:
+            logger.error(f"Could not write profile of {job}: {str(e)}")
+
+def init_app(app):
+    """Install the per-request profiling hooks when PROFILE_TOKEN is set"""
+    token = app.config.get('PROFILE_TOKEN')
+    if not token:
+        return
+
+    @app.before_request
+    def start_request_profile():
+        if token in (request.headers.get('X-Profile'), request.args.get('profile')):
+            thread_id = _original('_thread', 'get_ident', _thread.get_ident)()
+            current = greenlet.getcurrent() if _gevent_patched() else None
+            g.profiler = SamplingProfiler(thread_id, greenlet=current).start()
+
+    @app.after_request
+    def finish_request_profile(response):
+        profiler = g.pop('profiler', None)
+        if profiler is not None:
+            profiler.stop()
+            label = f"{request.method}-{request.endpoint or 'unknown'}"
+            response.headers['X-Profile-File'] = profiler.write(app.config['PROFILE_DIR'], label)
+        return response
+
+    @app.teardown_request
+    def stop_request_profile(exc):
+        # The request failed before after_request ran
+        profiler = g.pop('profiler', None)
+        if profiler is not None:
+            profiler.stop()
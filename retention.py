@@ -0,0 +1,301 @@
+"""
+Retention policy for message transcripts.
+
+Summaries are kept forever, but the original messages stored with each
+summary are moved out of the database once they are older than the
+configured number of days, and old gateway messages are dropped from the
+message buffer. Archived transcripts are appended to compressed
+NDJSON files (one per channel and month) so they can still be viewed or
+exported, and the database is incrementally vacuumed afterwards so the
+freed pages are returned to the filesystem.
+"""
+import functools
+import gzip
+import json
+import logging
+import os
+from datetime import datetime, timezone, timedelta
+
+from flask import current_app
+from sqlalchemy import text, or_
+
+from app import db
+
+try:
+    import zstandard
+except ImportError:
+    # zstd archives are optional, gzip is always available
+    zstandard = None
+
+logger = logging.getLogger(__name__)
+
+# Summaries archived per transaction
+ARCHIVE_BATCH_SIZE = 200
+# Pages released per incremental vacuum step (0 releases all free pages)
+VACUUM_PAGES = 0
+# Days gateway messages stay in the buffer after they were sent
+MESSAGE_BUFFER_DAYS = 7
+# Archive files whose decompressed records stay indexed in memory for transcript pages
+ARCHIVE_CACHE_FILES = 8
+
+def get_retention_days(config, channel_state):
+    """Days to keep raw messages for a channel; 0 means keep forever"""
+    if channel_state and channel_state.transcript_retention_days is not None:
+        return channel_state.transcript_retention_days
+    return config.transcript_retention_days or 0
+
+def _archive_compression():
+    """Compression used for new archive files"""
+    compression = current_app.config.get('ARCHIVE_COMPRESSION', 'gzip')
+    if compression == 'zstd' and zstandard is None:
+        logger.warning("zstandard is not installed, falling back to gzip archives")
+        return 'gzip'
+    return compression
+
+def _archive_path(channel_id, timestamp, compression):
+    """Archive file holding transcripts of a channel for the month of timestamp"""
+    extension = 'zst' if compression == 'zstd' else 'gz'
+    archive_dir = current_app.config.get('ARCHIVE_DIR', 'archive')
+    return os.path.join(archive_dir, channel_id, f"{timestamp:%Y-%m}.ndjson.{extension}")
+
+def _append_to_archive(path, records, compression):
+    """Append records to an archive file as a new compressed member/frame.
+
+    Both gzip members and zstd frames can be concatenated, so appending never
+    rewrites data that is already on disk.
+    """
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    payload = ''.join(json.dumps(record, separators=(',', ':')) + '\n' for record in records)
+    raw = payload.encode('utf-8')
+
+    if compression == 'zstd':
+        compressed = zstandard.ZstdCompressor(level=10).compress(raw)
+    else:
+        compressed = gzip.compress(raw, compresslevel=9)
+
+    with open(path, 'ab') as f:
+        f.write(compressed)
+        f.flush()
+        os.fsync(f.fileno())
+
+    return len(raw), len(compressed)
+
+def _read_archive_lines(path):
+    """Yield the NDJSON lines of an archive file"""
+    if path.endswith('.zst'):
+        if zstandard is None:
+            raise RuntimeError("Reading zstd archives requires the zstandard package")
+        with open(path, 'rb') as f:
+            reader = zstandard.ZstdDecompressor().stream_reader(f, read_across_frames=True)
+            data = reader.read()
+    else:
+        with gzip.open(path, 'rb') as f:
+            data = f.read()
+
+    for line in data.decode('utf-8').splitlines():
+        if line.strip():
+            yield line
+
+@functools.lru_cache(maxsize=ARCHIVE_CACHE_FILES)
+def _archive_index(path, mtime_ns, size):
+    """summary_id -> NDJSON line of its record in an archive file.
+
+    Keyed on the file's mtime and size, so an append invalidates it. Lines
+    are kept undecoded, so callers get their own copy of the messages.
+    """
+    index = {}
+    for line in _read_archive_lines(path):
+        # Later records win, in case a crashed run archived a summary twice
+        index[json.loads(line).get('summary_id')] = line
+    return index
+
+def read_archived_messages(summary):
+    """Load the archived transcript of a summary, or [] if it cannot be found"""
+    if not summary.archived_at or not summary.timestamp:
+        return []
+
+    for compression in ('gzip', 'zstd'):
+        path = _archive_path(summary.channel_id, summary.timestamp, compression)
+        if not os.path.exists(path):
+            continue
+        try:
+            # Paging through a transcript reads the same month repeatedly, so it is decompressed once
+            stat = os.stat(path)
+            line = _archive_index(path, stat.st_mtime_ns, stat.st_size).get(summary.id)
+            if line is not None:
+                return json.loads(line).get('messages', [])
+        except (OSError, RuntimeError, ValueError) as e:
+            logger.error(f"Error reading archive {path}: {str(e)}")
+    return []
+
+class ArchiveReader:
+    """Reads the archived transcripts of many summaries, decompressing each archive file once.
+
+    A record is dropped once read, so a pass in id (roughly time) order
+    holds about one month of transcripts in memory.
+    """
+
+    def __init__(self):
+        self._files = {}  # path -> {summary_id: NDJSON line}
+
+    def _index(self, path):
+        if path not in self._files:
+            index = {}
+            if os.path.exists(path):
+                try:
+                    for line in _read_archive_lines(path):
+                        # Later records win, in case a crashed run archived a summary twice
+                        index[json.loads(line).get('summary_id')] = line
+                except (OSError, RuntimeError, ValueError) as e:
+                    logger.error(f"Error reading archive {path}: {str(e)}")
+            self._files[path] = index
+        return self._files[path]
+
+    def read(self, summary):
+        """Archived transcript of summary, or [] if it cannot be found"""
+        if not summary.archived_at or not summary.timestamp:
+            return []
+        for compression in ('gzip', 'zstd'):
+            line = self._index(_archive_path(summary.channel_id, summary.timestamp, compression)).pop(summary.id, None)
+            if line is not None:
+                return json.loads(line).get('messages', [])
+        return []
+
+def archive_transcripts(entries, compression=None):
+    """Append (summary_id, channel_id, timestamp, messages) transcripts to their archive files.
+
+    Returns (raw bytes, archived bytes).
+    """
+    compression = compression or _archive_compression()
+    # Group by archive file so each file gets a single append
+    by_path = {}
+    for summary_id, channel_id, timestamp, messages in entries:
+        path = _archive_path(channel_id, timestamp, compression)
+        by_path.setdefault(path, []).append({
+            'summary_id': summary_id,
+            'channel_id': channel_id,
+            'timestamp': timestamp.isoformat(),
+            'messages': messages
+        })
+
+    raw_total = archived_total = 0
+    for path, records in by_path.items():
+        raw_bytes, archived_bytes = _append_to_archive(path, records, compression)
+        raw_total += raw_bytes
+        archived_total += archived_bytes
+    return raw_total, archived_total
+
+def archive_old_transcripts(config, batch_size=ARCHIVE_BATCH_SIZE):
+    """Move transcripts past their retention period into archive files"""
+    from models import ChannelState, Summary
+
+    compression = _archive_compression()
+    now = datetime.now(timezone.utc)
+    report = {'summaries_archived': 0, 'summaries_skipped': 0, 'raw_bytes': 0, 'archived_bytes': 0}
+
+    for channel_state in ChannelState.query.all():
+        days = get_retention_days(config, channel_state)
+        if days <= 0:
+            continue
+
+        cutoff = now - timedelta(days=days)
+        # Walk by id, so rows skipped below are not selected again
+        last_id = 0
+
+        while True:
+            batch = Summary.query.filter(
+                Summary.channel_id == channel_state.channel_id,
+                Summary.id > last_id,
+                Summary.timestamp < cutoff,
+                Summary.archived_at.is_(None),
+                or_(Summary.original_messages.isnot(None), Summary.messages_blob.isnot(None))
+            ).order_by(Summary.id).limit(batch_size).all()
+
+            if not batch:
+                break
+            last_id = batch[-1].id
+
+            entries = []
+            archived = []
+            for summary in batch:
+                try:
+                    messages = summary.get_messages(strict=True)
+                except Exception as e:
+                    # Clearing it would destroy the only copy, e.g. a zstd blob on a node without zstandard
+                    logger.error(f"Not archiving summary {summary.id}, its transcript cannot be decoded: {str(e)}")
+                    report['summaries_skipped'] += 1
+                    continue
+                entries.append((summary.id, summary.channel_id, summary.timestamp, messages))
+                archived.append(summary)
+
+            # Write the archive before clearing the column, so a crash in
+            # between leaves a duplicate rather than losing the transcript
+            raw_bytes, archived_bytes = archive_transcripts(entries, compression)
+            report['raw_bytes'] += raw_bytes
+            report['archived_bytes'] += archived_bytes
+
+            for summary in archived:
+                summary.clear_messages()
+                summary.archived_at = now
+            db.session.commit()
+
+            report['summaries_archived'] += len(archived)
+            if archived:
+                logger.info(f"Archived {len(archived)} transcripts for channel {channel_state.channel_id}")
+
+    return report
+
+def _database_size():
+    """Size of the SQLite database file in bytes, free pages included, so a vacuum shows as a smaller size"""
+    page_size = db.session.execute(text("PRAGMA page_size")).scalar()
+    page_count = db.session.execute(text("PRAGMA page_count")).scalar()
+    return page_size * page_count
+
+def vacuum_database(max_pages=VACUUM_PAGES):
+    """Return free pages to the filesystem and report reclaimed bytes.
+
+    The first run converts the database to incremental auto-vacuum, which
+    needs one full VACUUM; afterwards only free pages are released.
+    """
+    if db.engine.dialect.name != 'sqlite':
+        # PostgreSQL reclaims dead rows with autovacuum
+        return {'vacuum': 'skipped', 'reclaimed_bytes': 0}
+
+    size_before = _database_size()
+    auto_vacuum = db.session.execute(text("PRAGMA auto_vacuum")).scalar()
+    db.session.commit()
+
+    # VACUUM cannot run inside a transaction, so use an autocommit connection
+    with db.engine.connect().execution_options(isolation_level='AUTOCOMMIT') as conn:
+        if auto_vacuum != 2:  # 2 = INCREMENTAL
+            logger.info("Converting database to incremental auto-vacuum (one-time full VACUUM)")
+            conn.execute(text("PRAGMA auto_vacuum = INCREMENTAL"))
+            conn.execute(text("VACUUM"))
+            mode = 'full'
+        else:
+            conn.execute(text(f"PRAGMA incremental_vacuum({int(max_pages)})"))
+            mode = 'incremental'
+
+    size_after = _database_size()
+    return {
+        'vacuum': mode,
+        'size_before': size_before,
+        'size_after': size_after,
+        'reclaimed_bytes': max(size_before - size_after, 0)
+    }
+
+def run_retention(config):
+    """Archive aged transcripts and vacuum the database, returning a report"""
+    from models import BufferedMessage
+
+    report = archive_old_transcripts(config)
+    report['buffered_messages_pruned'] = BufferedMessage.prune(
+        datetime.now(timezone.utc) - timedelta(days=MESSAGE_BUFFER_DAYS)
+    )
+    report.update(vacuum_database())
+    logger.info(
+        f"Retention run archived {report['summaries_archived']} transcripts "
+        f"({report['raw_bytes']} bytes -> {report['archived_bytes']} bytes compressed), "
+        f"reclaimed {report['reclaimed_bytes']} bytes"
+    )
+    return report
@@ -0,0 +1,133 @@
+"""
+Rolling summaries for busy channels.
+
+A channel with a rolling interval is summarized every few minutes instead
+of hourly. Each update does not start from scratch: the model gets the
+channel's running state (the current summary and the topics still open)
+plus only the messages since the last update, and answers with the updated
+state. The prompt grows with the new messages, not with the time covered.
+
+When this process made the channel's previous update, the context Ollama
+returned for it is passed back and only the new messages are sent: the
+model continues the earlier exchange, and a server that still has it cached
+does not evaluate that prefix again. The context grows with every update,
+so it is dropped past ROLLING_CONTEXT_MAX_TOKENS and the next update starts
+again from the compact state.
+"""
+import json
+import logging
+import os
+import threading
+
+from tracing import current_span
+
+logger = logging.getLogger(__name__)
+
+# How often channels with a rolling interval are checked for a due update
+ROLLING_CHECK_MINUTES = 5
+# Open topics kept in the running state
+ROLLING_MAX_TOPICS = 8
+# Contexts longer than this many tokens are dropped in favour of the compact state
+ROLLING_CONTEXT_MAX_TOKENS = int(os.environ.get('ROLLING_CONTEXT_MAX_TOKENS', 4096))
+ROLLING_REUSE_CONTEXT = os.environ.get('ROLLING_REUSE_CONTEXT', 'true').lower() not in ('0', 'false', 'no')
+
+ROLLING_PROMPT = '''You keep a running summary of a Discord channel up to date.
+
+Current summary:
+{summary}
+
+Open topics:
+{topics}
+
+New messages:
+{content}
+
+Update the summary with the new messages. Keep what still matters, drop what no longer does, and keep it under {max_length} words.
+List the questions, problems and discussions that are still open.
+
+Respond with only a JSON object, for example:
+{{"summary": "Updated summary", "open_topics": ["Open topic"]}}
+'''
+
+ROLLING_CONTINUE_PROMPT = '''New messages:
+{content}
+
+Update the summary and the open topics with these messages, keeping the summary under {max_length} words.
+Respond with only a JSON object in the same format as before.
+'''
+
+# channel_id -> (model, state, context) of the channel's last update in this process
+_contexts = {}
+_contexts_lock = threading.Lock()
+
+def _model_name(ollama_service):
+    return getattr(ollama_service, 'active_model', None) or getattr(ollama_service, 'model_name', None)
+
+def _cached_context(channel_id, model, state):
+    """Context of the update that produced the current state, if this process made it"""
+    with _contexts_lock:
+        cached = _contexts.get(channel_id)
+    # Another worker may have updated the channel since, or the model changed
+    if cached and cached[0] == model and cached[1] == state and len(cached[2]) <= ROLLING_CONTEXT_MAX_TOKENS:
+        return cached[2]
+    return None
+
+def build_prompt(state, content, max_length=500):
+    """Prompt updating the running state with a transcript of new messages"""
+    topics = '\n'.join(f"- {topic}" for topic in state.get('topics', [])) or '(none)'
+    return ROLLING_PROMPT.format(summary=state.get('summary') or '(none yet)', topics=topics,
+                                 content=content, max_length=max_length)
+
+def parse_state(answer, state):
+    """New running state from the model's answer to an update prompt"""
+    try:
+        parsed = json.loads(answer)
+    except ValueError:
+        parsed = None
+
+    if isinstance(parsed, dict) and isinstance(parsed.get('summary'), str) and parsed['summary'].strip():
+        topics = parsed.get('open_topics')
+        topics = [str(topic).strip() for topic in topics if str(topic).strip()] if isinstance(topics, list) else []
+        summary = parsed['summary'].strip()
+    else:
+        # Keep the update rather than lose it; the open topics carry over
+        logger.warning("Rolling summary answer was not the expected JSON, using it as the summary")
+        summary = answer.strip()
+        topics = state.get('topics', [])
+
+    return {'summary': summary, 'topics': topics[:ROLLING_MAX_TOPICS], 'updates': state.get('updates', 0) + 1}
+
+def format_summary(state):
+    """Text of the Summary saved for an update: the running summary and the open topics"""
+    if not state['topics']:
+        return state['summary']
+    topics = '\n'.join(f"- {topic}" for topic in state['topics'])
+    return f"{state['summary']}\n\nOpen topics:\n{topics}"
+
+def summarize_rolling(ollama_service, channel_id, state, content, max_length=500):
+    """Update a channel's running state with new messages, returning (summary text, new state).
+
+    Only calls the model, so it can run on a worker thread; the caller saves
+    the new state. Raises OllamaError like generate.
+    """
+    model = _model_name(ollama_service)
+    context = None
+    if ROLLING_REUSE_CONTEXT and state:
+        context = _cached_context(channel_id, model, state)
+
+    if context:
+        prompt = ROLLING_CONTINUE_PROMPT.format(content=content, max_length=max_length)
+    else:
+        prompt = build_prompt(state, content, max_length)
+    current_span().set(reused_context=bool(context))
+
+    answer, new_context = ollama_service.generate_with_context(prompt, context, max_length, response_format='json')
+    new_state = parse_state(answer, state)
+
+    with _contexts_lock:
+        if ROLLING_REUSE_CONTEXT and new_context:
+            _contexts[channel_id] = (model, new_state, new_context)
+        else:
+            _contexts.pop(channel_id, None)
+
+    return format_summary(new_state), new_state
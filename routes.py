@@ -1,20 +1,47 @@
-from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify
-from app import db, process_channel_summary
-from models import AppConfig, ChannelState, Summary
-from services import DiscordService, OllamaService, EmailService
+from flask import (Blueprint, render_template, request, redirect, url_for, flash, jsonify, abort,
+                   Response, stream_with_context, send_file, send_from_directory, current_app)
+from sqlalchemy import or_, and_
+from sqlalchemy.orm import load_only
+from app import db, run_summary_pass, worker_id
+from rolling import ROLLING_CHECK_MINUTES
+from models import AppConfig, ChannelState, Summary, BufferedMessage, load_pytz
+from services import DiscordPool, OllamaService, OllamaRouter, OllamaError, EmailService
 import logging
+import os
 import json
+import gzip
+import base64
+import bisect
+import queue
+import tempfile
+import threading
 from datetime import datetime
 
-try:
-    import pytz
-except ImportError:
-    pytz = None
-
 logger = logging.getLogger(__name__)
 
 main_bp = Blueprint('main', __name__)
 
+# JSON API pagination settings
+API_DEFAULT_LIMIT = 50
+API_MAX_LIMIT = 200
+# Messages rendered with a summary page; the rest load as the reader scrolls
+TRANSCRIPT_PAGE_SIZE = 200
+# Results of a semantic search unless the API asks for more
+SEARCH_DEFAULT_LIMIT = 20
+# Responses smaller than this are not worth compressing
+GZIP_MIN_SIZE = 1024
+# Seconds between keepalive comments on an idle event stream
+SSE_KEEPALIVE_SECONDS = 15
+
+# Fields that can be requested from the summaries API; transcripts are opt-in
+SUMMARY_API_FIELDS = ['id', 'channel_id', 'timestamp', 'summary_type',
+                      'message_count', 'summary_text', 'original_messages']
+SUMMARY_API_DEFAULT_FIELDS = ['id', 'channel_id', 'timestamp', 'summary_type',
+                              'message_count', 'summary_text']
+
+# Per-channel key=value options accepted on channel config lines
+CHANNEL_OPTIONS = ['retention', 'priority', 'rolling']
+
 @main_bp.route('/')
 def index():
     """Dashboard showing channels and their latest summaries"""
@@ -26,11 +53,16 @@ def index():
     
     # Get channel states with their latest summaries, grouped by server
     servers = {}
-    for channel_id in config.get_channel_ids():
-        channel_state = ChannelState.query.filter_by(channel_id=channel_id).first()
+    channel_ids = config.get_channel_ids()
+    server_names = config.get_server_names()
+    channel_states = {state.channel_id: state for state in
+                      ChannelState.query.filter(ChannelState.channel_id.in_(channel_ids))}
+    latest_summaries = Summary.latest_for_channels(channel_ids)
+    for channel_id in channel_ids:
+        channel_state = channel_states.get(channel_id)
         if channel_state:
-            latest_summary = channel_state.summaries.first()
-            server_key = channel_state.server_name or 'Ungrouped'
+            latest_summary = latest_summaries.get(channel_id)
+            server_key = server_names.get(channel_id) or 'Ungrouped'
             
             if server_key not in servers:
                 servers[server_key] = []
@@ -39,7 +71,7 @@ def index():
                 'id': channel_id,
                 'state': channel_state,
                 'latest_summary': latest_summary,
-                'name': get_channel_name(channel_id, config.user_token)
+                'name': get_channel_name(channel_id, config)
             })
         else:
             # Channel not yet initialized
@@ -50,7 +82,7 @@ def index():
                 'id': channel_id,
                 'state': None,
                 'latest_summary': None,
-                'name': get_channel_name(channel_id, config.user_token)
+                'name': get_channel_name(channel_id, config)
             })
     
     # Sort servers alphabetically, but keep 'Ungrouped' last
@@ -66,13 +98,21 @@ def index():
 @main_bp.route('/config', methods=['GET', 'POST'])
 def config():
     """Configuration page"""
-    config = AppConfig.get_config()
+    if request.method == 'GET':
+        config = AppConfig.get_config()
+    else:
+        config = AppConfig.load_for_update()
     
     if request.method == 'POST':
         # Update basic configuration
         config.user_token = request.form.get('user_token', '').strip()
+        config.discord_extra_tokens = request.form.get('discord_extra_tokens', '').strip() or None
         config.ollama_url = request.form.get('ollama_url', '').strip()
         config.model_name = request.form.get('model_name', '').strip()
+        config.ollama_extra_urls = request.form.get('ollama_extra_urls', '').strip()
+        config.fallback_model_name = request.form.get('fallback_model_name', '').strip() or None
+        config.fallback_backlog_messages = max(request.form.get('fallback_backlog_messages', 0, type=int) or 0, 0)
+        config.embedding_model = request.form.get('embedding_model', '').strip() or None
         config.timezone = request.form.get('timezone', 'US/Eastern').strip()
         config.time_format_12hr = request.form.get('time_format') == '12hr'
         
@@ -89,6 +129,11 @@ Conversation:
 
 Summary:'''
         
+        # Update batching settings
+        config.batch_small_channels = 'batch_small_channels' in request.form
+        config.batch_max_messages = max(request.form.get('batch_max_messages', 20, type=int) or 20, 1)
+        config.cluster_threads = 'cluster_threads' in request.form
+        
         # Update email configuration
         config.email_enabled = 'email_enabled' in request.form
         if config.email_enabled:
@@ -100,24 +145,29 @@ Summary:'''
             config.smtp_use_tls = 'smtp_use_tls' in request.form
             config.daily_email_time = request.form.get('daily_email_time', '09:00').strip()
         
+        # Update retention settings
+        config.transcript_retention_days = max(request.form.get('transcript_retention_days', 0, type=int) or 0, 0)
+        
+        # Update backfill settings
+        config.backfill_days = max(request.form.get('backfill_days', 0, type=int) or 0, 0)
+        previous_channel_ids = set(config.get_channel_ids())
+        
         # Parse channel configuration
         channel_config = request.form.get('channel_config', '')
         channel_ids = []
         server_mappings = {}
+        channel_options = {}
         
         for line in channel_config.strip().split('\n'):
             if not line.strip():
                 continue
             
-            parts = line.strip().split(',')
-            if len(parts) >= 1:
-                channel_id = parts[0].strip()
-                server_name = parts[1].strip() if len(parts) > 1 else None
-                
-                if channel_id:
-                    channel_ids.append(channel_id)
-                    if server_name:
-                        server_mappings[channel_id] = server_name
+            channel_id, server_name, options = parse_channel_line(line)
+            if channel_id:
+                channel_ids.append(channel_id)
+                if server_name:
+                    server_mappings[channel_id] = server_name
+                channel_options[channel_id] = options
         
         config.set_channel_ids(channel_ids)
         
@@ -128,7 +178,7 @@ Summary:'''
             errors.append('User token is required')
         else:
             # Test Discord connection
-            discord_service = DiscordService(config.user_token)
+            discord_service = DiscordPool.from_config(config)
             valid, result = discord_service.test_connection()
             if not valid:
                 errors.append(f'Invalid Discord token: {result}')
@@ -145,6 +195,17 @@ Summary:'''
         if not channel_ids:
             errors.append('At least one channel ID is required')
         
+        for channel_id, options in channel_options.items():
+            unknown = set(options) - set(CHANNEL_OPTIONS)
+            if unknown:
+                errors.append(f"Unknown option(s) for channel {channel_id}: {', '.join(sorted(unknown))}")
+            if 'retention' in options and not options['retention'].isdigit():
+                errors.append(f'Retention for channel {channel_id} must be a number of days')
+            if 'priority' in options and not options['priority'].lstrip('-').isdigit():
+                errors.append(f'Priority for channel {channel_id} must be a whole number')
+            if 'rolling' in options and not (options['rolling'].isdigit() and int(options['rolling']) >= ROLLING_CHECK_MINUTES):
+                errors.append(f'Rolling interval for channel {channel_id} must be at least {ROLLING_CHECK_MINUTES} minutes')
+        
         # Validate email configuration if enabled
         if config.email_enabled:
             if not config.email_address:
@@ -162,6 +223,24 @@ Summary:'''
         else:
             db.session.commit()
             
+            # Update channel states with per-channel options
+            for channel_id, options in channel_options.items():
+                channel_state = ChannelState.query.filter_by(channel_id=channel_id).first()
+                if not channel_state:
+                    if not options:
+                        continue
+                    channel_state = ChannelState(channel_id=channel_id)
+                    db.session.add(channel_state)
+                
+                retention = options.get('retention')
+                channel_state.transcript_retention_days = int(retention) if retention else None
+                channel_state.priority = int(options.get('priority', 0))
+                rolling = options.get('rolling')
+                channel_state.rolling_minutes = int(rolling) if rolling else None
+                if not rolling:
+                    # Switching rolling summaries on again starts a new running summary
+                    channel_state.rolling_state = None
+            
             # Update channel states with server names
             for channel_id, server_name in server_mappings.items():
                 channel_state = ChannelState.query.filter_by(channel_id=channel_id).first()
@@ -183,7 +262,16 @@ Summary:'''
                     except Exception as e:
                         logger.warning(f"Could not fetch channel info for {channel_id}: {e}")
             
-            db.session.commit()
+            # Commits, and every worker picks up the new settings
+            AppConfig.bump_version()
+            
+            # Queue history backfills for newly added channels
+            if config.backfill_days:
+                from backfill import create_backfill_job
+                for channel_id in channel_ids:
+                    if channel_id not in previous_channel_ids:
+                        create_backfill_job(channel_id, config.backfill_days)
+            
             flash('Configuration saved successfully!', 'success')
             return redirect(url_for('main.index'))
     
@@ -191,14 +279,12 @@ Summary:'''
     channel_config_lines = []
     for channel_id in config.get_channel_ids():
         channel_state = ChannelState.query.filter_by(channel_id=channel_id).first()
-        if channel_state and channel_state.server_name:
-            channel_config_lines.append(f"{channel_id},{channel_state.server_name}")
-        else:
-            channel_config_lines.append(channel_id)
+        channel_config_lines.append(format_channel_line(channel_id, channel_state))
     
     channel_config_text = '\n'.join(channel_config_lines)
     
     # Get available timezones
+    pytz = load_pytz()
     if pytz:
         timezones = pytz.common_timezones
     else:
@@ -256,25 +342,111 @@ def test_email():
 
 @main_bp.route('/run-now', methods=['POST'])
 def run_now():
-    """Trigger summary generation for all channels"""
+    """Trigger summary generation for all channels.
+    
+    Clients accepting text/event-stream get progress events as channels
+    are fetched and summarized, then a final 'done' event with the results.
+    """
     config = AppConfig.get_config()
     
     if not config.is_configured():
         return jsonify({'error': 'Application not configured'}), 400
     
-    discord_service = DiscordService(config.user_token)
-    ollama_service = OllamaService(config.ollama_url, config.model_name)
+    if request.accept_mimetypes.best == 'text/event-stream':
+        return _stream_run_now(config)
+    return jsonify({'results': _run_now(config)})
+
+def _run_now(config, progress=None):
+    discord_service = DiscordPool.from_config(config)
+    backlog = sum(BufferedMessage.pending_counts(config.get_channel_ids()).values())
+    ollama_service = OllamaRouter.from_config(config, backlog)
+    
+    channel_ids = config.get_channel_ids()
+    claimed = ChannelState.claim(channel_ids, worker_id())
+    if progress:
+        progress({'event': 'started', 'channels': len(channel_ids), 'claimed': len(claimed)})
+    try:
+        pass_results = run_summary_pass(claimed, discord_service, ollama_service, config, progress)
+    finally:
+        for channel_id in claimed:
+            ChannelState.release(channel_id, worker_id())
     
     results = []
-    for channel_id in config.get_channel_ids():
-        try:
-            process_channel_summary(channel_id, discord_service, ollama_service, config)
-            results.append({'channel_id': channel_id, 'status': 'success'})
-        except Exception as e:
-            logger.error(f"Error processing channel {channel_id}: {str(e)}")
-            results.append({'channel_id': channel_id, 'status': 'error', 'error': str(e)})
+    for channel_id in channel_ids:
+        if channel_id not in pass_results:
+            results.append({'channel_id': channel_id, 'status': 'skipped',
+                            'error': 'Already being processed by another worker'})
+        else:
+            results.append(pass_results[channel_id])
+    return results
+
+def _stream_run_now(config):
+    """Run the pass in the background and stream its progress as server-sent events"""
+    app = current_app._get_current_object()
+    events = queue.Queue()
+    
+    def run():
+        # The pass finishes even if the client goes away
+        with app.app_context():
+            try:
+                events.put({'event': 'done', 'results': _run_now(config, events.put)})
+            except Exception as e:
+                db.session.rollback()
+                logger.error(f"Error running summaries: {str(e)}")
+                events.put({'event': 'failed', 'error': str(e)})
+    
+    threading.Thread(target=run, name='run-now', daemon=True).start()
+    
+    def stream():
+        while True:
+            try:
+                event = events.get(timeout=SSE_KEEPALIVE_SECONDS)
+            except queue.Empty:
+                # Keeps proxies from closing an idle connection during long Ollama calls
+                yield ': keepalive\n\n'
+                continue
+            yield f"event: {event['event']}\ndata: {json.dumps(event, default=str)}\n\n"
+            if event['event'] in ('done', 'failed'):
+                return
+    
+    return Response(stream(), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+@main_bp.route('/api/retention/run', methods=['POST'])
+def run_retention_now():
+    """Archive aged transcripts and vacuum the database immediately"""
+    from retention import run_retention
+    
+    try:
+        report = run_retention(AppConfig.get_config())
+        return jsonify(report)
+    except Exception as e:
+        logger.error(f"Error running retention: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+@main_bp.route('/channel/<channel_id>/backfill', methods=['POST'])
+def backfill_channel(channel_id):
+    """Queue a historical backfill for a channel"""
+    from backfill import create_backfill_job
+    
+    config = AppConfig.get_config()
+    if channel_id not in config.get_channel_ids():
+        return jsonify({'error': 'Channel is not configured'}), 404
+    
+    days = request.values.get('days', config.backfill_days or 7, type=int)
+    if not days or days <= 0:
+        return jsonify({'error': 'days must be a positive number'}), 400
     
-    return jsonify({'results': results})
+    job = create_backfill_job(channel_id, days)
+    return jsonify(job.to_dict()), 202
+
+@main_bp.route('/api/backfill')
+def api_backfill():
+    """Progress of historical backfill jobs"""
+    from models import BackfillJob
+    
+    jobs = BackfillJob.query.order_by(BackfillJob.created_at.desc()).limit(API_MAX_LIMIT).all()
+    return jsonify({'jobs': [job.to_dict() for job in jobs]})
 
 @main_bp.route('/channel/<channel_id>/summaries')
 def channel_summaries(channel_id):
@@ -289,9 +461,7 @@ def channel_summaries(channel_id):
     
     if search_query:
         # Search in summary text
-        summaries_query = summaries_query.filter(
-            Summary.summary_text.contains(search_query)
-        )
+        summaries_query = summaries_query.filter(Summary.search_filter(search_query))
     
     # Paginate with 5 per page
     summaries = summaries_query.paginate(
@@ -301,7 +471,7 @@ def channel_summaries(channel_id):
     )
     
     config = AppConfig.get_config()
-    channel_name = get_channel_name(channel_id, config.user_token)
+    channel_name = get_channel_name(channel_id, config)
     
     return render_template('channel_summaries.html', 
                          channel_id=channel_id,
@@ -311,6 +481,99 @@ def channel_summaries(channel_id):
                          config=config,
                          search_query=search_query)
 
+@main_bp.route('/search')
+def search():
+    """Semantic search across the summaries of all channels"""
+    config = AppConfig.get_config()
+    query = request.args.get('q', '').strip()
+    
+    results = []
+    if query:
+        try:
+            results = _semantic_search(config, query, SEARCH_DEFAULT_LIMIT)
+        except (RuntimeError, OllamaError) as e:
+            flash(str(e), 'danger')
+    
+    return render_template('search.html', config=config, query=query, results=results)
+
+@main_bp.route('/api/search')
+def api_search():
+    """Summaries closest in meaning to the q parameter, across all channels"""
+    config = AppConfig.get_config()
+    query = request.args.get('q', '').strip()
+    if not query:
+        return _json_response({'error': 'Missing q parameter'}, status=400)
+    
+    limit = max(1, min(request.args.get('limit', SEARCH_DEFAULT_LIMIT, type=int), API_MAX_LIMIT))
+    try:
+        results = _semantic_search(config, query, limit)
+    except RuntimeError as e:
+        return _json_response({'error': str(e)}, status=503)
+    except OllamaError as e:
+        return _json_response({'error': str(e)}, status=502)
+    
+    return _json_response({
+        'query': query,
+        'results': [dict(_serialize_summary(summary, SUMMARY_API_DEFAULT_FIELDS), score=round(score, 4))
+                    for summary, score in results]
+    })
+
+@main_bp.route('/profiles')
+def profiles():
+    """Recent request and job profiles, and profiles requested for upcoming job runs"""
+    import profiling
+    
+    directory = current_app.config['PROFILE_DIR']
+    return render_template('profiles.html',
+                         profiles=profiling.list_profiles(directory),
+                         pending=profiling.pending_job_profiles(directory),
+                         jobs=profiling.PROFILED_JOBS,
+                         request_profiling=bool(current_app.config.get('PROFILE_TOKEN')))
+
+@main_bp.route('/profiles/jobs', methods=['POST'])
+def profile_jobs():
+    """Profile the next runs of a scheduled job"""
+    import profiling
+    
+    job = request.form.get('job', '')
+    runs = request.form.get('runs', 1, type=int) or 0
+    if job not in profiling.PROFILED_JOBS:
+        flash(f'Unknown job: {job}', 'danger')
+    else:
+        profiling.request_job_profiles(current_app.config['PROFILE_DIR'], job, runs)
+        flash(f'The next {runs} run(s) of {job} will be profiled', 'success')
+    return redirect(url_for('main.profiles'))
+
+@main_bp.route('/profiles/<name>')
+def download_profile(name):
+    """A profile in folded-stack format"""
+    if not name.endswith('.folded'):
+        abort(404)
+    return send_from_directory(os.path.abspath(current_app.config['PROFILE_DIR']), name,
+                               mimetype='text/plain', as_attachment=True)
+
+@main_bp.route('/traces')
+def traces():
+    """Channels that took the longest to summarize, from the recorded trace spans"""
+    import tracing
+    
+    days = min(max(request.args.get('days', 7, type=float), 0), tracing.TRACE_RETENTION_DAYS)
+    server_names = AppConfig.get_config().get_server_names()
+    channels = tracing.slowest_channels(days)
+    for stats in channels:
+        stats['server_name'] = server_names.get(stats['channel_id'])
+    return render_template('traces.html', channels=channels, days=days,
+                           tracing_enabled=tracing.TRACING_ENABLED)
+
+@main_bp.route('/api/traces/slowest')
+def api_slowest_channels():
+    """The slowest channels view as JSON"""
+    import tracing
+    
+    days = min(max(request.args.get('days', 7, type=float), 0), tracing.TRACE_RETENTION_DAYS)
+    limit = min(max(request.args.get('limit', 20, type=int), 1), 200)
+    return _json_response({'days': days, 'channels': tracing.slowest_channels(days, limit)})
+
 @main_bp.route('/summary/<int:summary_id>')
 def view_summary(summary_id):
     """View a single summary with original messages"""
@@ -318,25 +581,25 @@ def view_summary(summary_id):
     channel_state = ChannelState.query.filter_by(channel_id=summary.channel_id).first()
     config = AppConfig.get_config()
     
-    channel_name = get_channel_name(summary.channel_id, config.user_token)
+    channel_name = get_channel_name(summary.channel_id, config)
     
-    # Get original messages
+    # Get original messages, falling back to the archive for aged transcripts
     messages = summary.get_messages()
+    if not messages and summary.archived_at:
+        from retention import read_archived_messages
+        messages = read_archived_messages(summary)
     
-    # Format timestamps in messages
-    for msg in messages:
-        if msg.get('timestamp'):
-            try:
-                dt = datetime.fromisoformat(msg['timestamp'].replace('Z', '+00:00'))
-                msg['formatted_timestamp'] = config.format_datetime(dt)
-            except:
-                msg['formatted_timestamp'] = msg['timestamp']
+    # Render the first page; long transcripts continue through the messages API
+    messages, next_cursor = _transcript_page(messages, None, TRANSCRIPT_PAGE_SIZE)
+    config.get_formatter().localize_messages(messages)
     
     return render_template('view_summary.html',
                          summary=summary,
                          channel_state=channel_state,
                          channel_name=channel_name,
                          messages=messages,
+                         next_cursor=next_cursor,
+                         page_size=TRANSCRIPT_PAGE_SIZE,
                          config=config)
 
 @main_bp.route('/api/status')
@@ -349,15 +612,277 @@ def api_status():
         'channels_count': len(config.get_channel_ids()),
         'total_summaries': Summary.query.count(),
         'email_enabled': config.email_enabled,
-        'email_configured': config.is_email_configured() if config.email_enabled else False
+        'email_configured': config.is_email_configured() if config.email_enabled else False,
+        'ingest': {'mode': current_app.config.get('INGEST_MODE', 'rest')},
+        'scheduler': 'running' if current_app.config.get('SCHEDULER_ENABLED') else 'disabled',
+        'pending_messages': sum(BufferedMessage.pending_counts(config.get_channel_ids()).values()),
+        'ollama': OllamaRouter.from_config(config).status()
     }
     
+    from gateway import get_ingest
+    ingest = get_ingest()
+    if ingest:
+        status['ingest'] = ingest.status()
+    
     return jsonify(status)
 
-def get_channel_name(channel_id, user_token):
+@main_bp.route('/api/metrics')
+def api_metrics():
+    """Load and throughput of each Ollama server and request counts of each Discord token, as seen by this process"""
+    config = AppConfig.get_config()
+    metrics = OllamaRouter.from_config(config).status()
+    metrics['discord'] = DiscordPool.from_config(config).status()
+    return jsonify(metrics)
+
+@main_bp.route('/api/backlog')
+def api_backlog():
+    """Per-channel ingest and summarization watermarks and unsummarized message counts"""
+    config = AppConfig.get_config()
+    channel_ids = config.get_channel_ids()
+    pending = BufferedMessage.pending_counts(channel_ids)
+    states = {state.channel_id: state for state in
+              ChannelState.query.filter(ChannelState.channel_id.in_(channel_ids))}
+    
+    channels = []
+    for channel_id in channel_ids:
+        state = states.get(channel_id)
+        channels.append({
+            'channel_id': channel_id,
+            'fetched_until': state.fetched_until if state else None,
+            'summarized_until': state.summarized_until if state else None,
+            'pending_messages': pending.get(channel_id, 0)
+        })
+    
+    return jsonify({'channels': channels, 'pending_messages': sum(c['pending_messages'] for c in channels)})
+
+@main_bp.route('/api/channels/<channel_id>/summaries')
+def api_channel_summaries(channel_id):
+    """Keyset-paginated summaries for a channel, newest first"""
+    ChannelState.query.filter_by(channel_id=channel_id).first_or_404()
+    
+    limit = _get_api_limit()
+    fields = _get_summary_fields()
+    cursor = _decode_cursor(request.args.get('cursor'), id_type=int)
+    search_query = request.args.get('search', '').strip()
+    
+    # Only load the requested columns so transcripts stay on disk unless asked for
+    columns = [getattr(Summary, name) for name in set(fields) | {'id', 'timestamp'}]
+    if 'original_messages' in fields:
+        columns.append(Summary.messages_blob)
+    query = Summary.query.options(load_only(*columns)).filter(
+        Summary.channel_id == channel_id
+    )
+    
+    if search_query:
+        query = query.filter(Summary.search_filter(search_query))
+    
+    if cursor:
+        try:
+            cursor_time = datetime.fromisoformat(cursor[0])
+        except ValueError:
+            abort(_json_response({'error': 'Invalid cursor'}, status=400))
+        cursor_id = cursor[1]
+        query = query.filter(or_(
+            Summary.timestamp < cursor_time,
+            and_(Summary.timestamp == cursor_time, Summary.id < cursor_id)
+        ))
+    
+    # Fetch one extra row to know whether another page exists
+    rows = query.order_by(Summary.timestamp.desc(), Summary.id.desc()).limit(limit + 1).all()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    
+    next_cursor = None
+    if has_more:
+        last = rows[-1]
+        next_cursor = _encode_cursor(last.timestamp.isoformat(), last.id)
+    
+    return _json_response({
+        'channel_id': channel_id,
+        'summaries': [_serialize_summary(summary, fields) for summary in rows],
+        'next_cursor': next_cursor
+    })
+
+@main_bp.route('/api/summaries/<int:summary_id>/messages')
+def api_summary_messages(summary_id):
+    """Keyset-paginated original messages of a summary, oldest first"""
+    summary = Summary.query.get_or_404(summary_id)
+    
+    limit = _get_api_limit()
+    cursor = _decode_cursor(request.args.get('cursor'))
+    
+    messages = summary.get_messages()
+    if not messages and summary.archived_at:
+        from retention import read_archived_messages
+        messages = read_archived_messages(summary)
+    
+    page, next_cursor = _transcript_page(messages, cursor, limit)
+    AppConfig.get_config().get_formatter().localize_messages(page)
+    
+    return _json_response({
+        'summary_id': summary.id,
+        'channel_id': summary.channel_id,
+        'messages': page,
+        'next_cursor': next_cursor
+    })
+
+@main_bp.route('/api/export/<kind>')
+def api_export(kind):
+    """Stream a bulk export of summaries or messages as NDJSON or Parquet"""
+    import export_db
+    
+    if kind not in export_db.EXPORT_KINDS:
+        return jsonify({'error': f'Unknown export kind: {kind}'}), 404
+    
+    fmt = request.args.get('format', 'ndjson')
+    if fmt not in export_db.EXPORT_FORMATS:
+        return jsonify({'error': f'Unknown export format: {fmt}'}), 400
+    
+    channel_id = request.args.get('channel_id') or None
+    include_messages = request.args.get('transcripts', '1') != '0'
+    records = export_db.iter_records(kind, channel_id, include_messages)
+    
+    if fmt == 'parquet':
+        if export_db.pa is None:
+            return jsonify({'error': 'Parquet export requires pyarrow'}), 501
+        # Parquet needs a seekable file; spool to disk rather than memory
+        spool = tempfile.TemporaryFile()
+        export_db.write_parquet(records, spool, kind)
+        spool.seek(0)
+        return send_file(spool, mimetype='application/vnd.apache.parquet',
+                         as_attachment=True, download_name=f'{kind}.parquet')
+    
+    return Response(
+        stream_with_context(export_db.iter_ndjson_chunks(records)),
+        mimetype='application/x-ndjson',
+        headers={'Content-Disposition': f'attachment; filename={kind}.ndjson'}
+    )
+
+def _semantic_search(config, query, limit):
+    """[(summary, score)] best first, raising RuntimeError when search is unavailable"""
+    import embeddings
+    
+    if embeddings.np is None:
+        raise RuntimeError('Semantic search requires numpy (pip install numpy)')
+    if not config.embedding_model:
+        raise RuntimeError('Set an embedding model in the configuration to enable semantic search')
+    
+    matches = embeddings.search_summaries(config, query, limit)
+    # Summaries deleted since they were indexed are skipped
+    summaries = {summary.id: summary for summary in
+                 Summary.query.filter(Summary.id.in_([summary_id for summary_id, _ in matches]))}
+    return [(summaries[summary_id], score) for summary_id, score in matches if summary_id in summaries]
+
+def _transcript_page(messages, cursor, limit):
+    """Messages after a decoded cursor in (timestamp, id) order, and the cursor of the next page"""
+    keys = [(m.get('timestamp') or '', m.get('id') or '') for m in messages]
+    # Stored transcripts are already in order, so sorting is usually skipped
+    if any(keys[i] > keys[i + 1] for i in range(len(keys) - 1)):
+        order = sorted(range(len(messages)), key=keys.__getitem__)
+        messages = [messages[i] for i in order]
+        keys = [keys[i] for i in order]
+    
+    start = bisect.bisect_right(keys, (cursor[0], cursor[1])) if cursor else 0
+    page = messages[start:start + limit]
+    next_cursor = None
+    if start + limit < len(messages):
+        next_cursor = _encode_cursor(*keys[start + limit - 1])
+    return page, next_cursor
+
+def _get_api_limit():
+    """Read and clamp the page size from the query string"""
+    limit = request.args.get('limit', API_DEFAULT_LIMIT, type=int)
+    return max(1, min(limit, API_MAX_LIMIT))
+
+def _get_summary_fields():
+    """Read the comma separated field selection from the query string"""
+    fields_param = request.args.get('fields', '').strip()
+    if not fields_param:
+        return SUMMARY_API_DEFAULT_FIELDS
+    
+    fields = [f.strip() for f in fields_param.split(',') if f.strip()]
+    unknown = [f for f in fields if f not in SUMMARY_API_FIELDS]
+    if unknown:
+        abort(_json_response({'error': f"Unknown fields: {', '.join(unknown)}"}, status=400))
+    return fields
+
+def _serialize_summary(summary, fields):
+    """Convert a summary row to a JSON-friendly dict with the selected fields"""
+    data = {}
+    for field in fields:
+        if field == 'original_messages':
+            data['messages'] = summary.get_messages()
+        elif field == 'timestamp':
+            data['timestamp'] = summary.timestamp.isoformat() if summary.timestamp else None
+        else:
+            data[field] = getattr(summary, field)
+    return data
+
+def _encode_cursor(timestamp, row_id):
+    """Encode a (timestamp, id) keyset position as an opaque cursor"""
+    raw = json.dumps([timestamp, row_id]).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+def _decode_cursor(cursor, id_type=str):
+    """Decode a cursor created by _encode_cursor, aborting on garbage or an id that is not an id_type"""
+    if not cursor:
+        return None
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        timestamp, row_id = json.loads(base64.urlsafe_b64decode(padded))
+    except (ValueError, TypeError):
+        abort(_json_response({'error': 'Invalid cursor'}, status=400))
+    # Compared with stored keys later, where another type would raise a TypeError
+    if not isinstance(timestamp, str) or not isinstance(row_id, id_type) or isinstance(row_id, bool):
+        abort(_json_response({'error': 'Invalid cursor'}, status=400))
+    return timestamp, row_id
+
+def _json_response(payload, status=200):
+    """Build a JSON response, gzip-compressed when the client accepts it"""
+    response = jsonify(payload)
+    response.status_code = status
+    response.vary.add('Accept-Encoding')
+    
+    accepts_gzip = 'gzip' in request.headers.get('Accept-Encoding', '').lower()
+    if accepts_gzip and response.content_length and response.content_length >= GZIP_MIN_SIZE:
+        response.set_data(gzip.compress(response.get_data(), compresslevel=6))
+        response.headers['Content-Encoding'] = 'gzip'
+    
+    return response
+
+def parse_channel_line(line):
+    """Parse a channel config line: channel_id[,server_name][,key=value...]"""
+    parts = [part.strip() for part in line.strip().split(',')]
+    channel_id = parts[0]
+    server_name = None
+    options = {}
+    
+    for part in parts[1:]:
+        if '=' in part:
+            key, value = part.split('=', 1)
+            options[key.strip().lower()] = value.strip()
+        elif part and server_name is None:
+            server_name = part
+    
+    return channel_id, server_name, options
+
+def format_channel_line(channel_id, channel_state):
+    """Inverse of parse_channel_line for displaying the current configuration"""
+    parts = [channel_id]
+    if channel_state and channel_state.server_name:
+        parts.append(channel_state.server_name)
+    if channel_state and channel_state.transcript_retention_days is not None:
+        parts.append(f"retention={channel_state.transcript_retention_days}")
+    if channel_state and channel_state.priority:
+        parts.append(f"priority={channel_state.priority}")
+    if channel_state and channel_state.rolling_minutes:
+        parts.append(f"rolling={channel_state.rolling_minutes}")
+    return ','.join(parts)
+
+def get_channel_name(channel_id, config):
     """Helper function to get channel name"""
     try:
-        discord_service = DiscordService(user_token)
+        discord_service = DiscordPool.from_config(config)
         channel_info = discord_service.get_channel_info(channel_id)
         if channel_info:
             return channel_info.get('name', f'Channel {channel_id}')
@@ -1,21 +1,52 @@
+import os
+import hashlib
 import requests
 import logging
-from datetime import datetime, date
+import threading
+from collections import deque
+from datetime import datetime, date, timezone
 from urllib.parse import urljoin
 import time
-import smtplib
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
-from email.utils import formataddr
+from tracing import current_span
 
 logger = logging.getLogger(__name__)
 
+class RateLimiter:
+    """Thread-safe token bucket limiting how often requests are started"""
+    
+    def __init__(self, rate_per_second, burst=1):
+        self.rate = float(rate_per_second)
+        self.capacity = max(burst, 1)
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+    
+    def acquire(self):
+        """Block until a request may be made"""
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+class OllamaError(Exception):
+    """Raised when Ollama could not produce a summary"""
+
 class DiscordService:
     """Service for interacting with Discord API using user token"""
     BASE_URL = "https://discord.com/api/v10"
     
-    def __init__(self, user_token):
+    def __init__(self, user_token, rate_limiter=None, wait_on_rate_limit=True):
         self.user_token = user_token
+        self.rate_limiter = rate_limiter
+        # Without waiting, a 429 is raised as an HTTPError for the caller to move to another token
+        self.wait_on_rate_limit = wait_on_rate_limit
+        self.token_state = get_token_state(user_token)
         self.session = self._create_session()
         self.headers = {
             "Authorization": user_token,
@@ -29,15 +60,22 @@ class DiscordService:
         from urllib3.util.retry import Retry
         
         session = requests.Session()
+        # 429s are not retried here: they reach _get, which records them against the token
         retry = Retry(
             total=3,
             backoff_factor=0.5,
-            status_forcelist=[429, 500, 502, 503, 504]
+            status_forcelist=[500, 502, 503, 504]
         )
         adapter = HTTPAdapter(max_retries=retry)
         session.mount("https://", adapter)
         return session
     
+    def _get(self, url, params=None):
+        """GET url with this token, counting the request against the token's budget"""
+        response = self.session.get(url, headers=self.headers, params=params)
+        self.token_state.record_response(response)
+        return response
+    
     def fetch_messages(self, channel_id, limit=100, after_timestamp=None):
         """Fetch messages from a channel"""
         url = f"{self.BASE_URL}/channels/{channel_id}/messages"
@@ -53,12 +91,15 @@ class DiscordService:
             else:
                 params["after"] = after_timestamp
         
+        if self.rate_limiter:
+            self.rate_limiter.acquire()
+        
         try:
-            response = self.session.get(url, headers=self.headers, params=params)
+            response = self._get(url, params)
             
-            if response.status_code == 429:
+            if response.status_code == 429 and self.wait_on_rate_limit:
                 # Rate limited - wait and retry
-                retry_after = int(response.headers.get('Retry-After', 5))
+                retry_after = int(float(response.headers.get('Retry-After', 5)))
                 logger.warning(f"Rate limited, waiting {retry_after} seconds")
                 time.sleep(retry_after)
                 return self.fetch_messages(channel_id, limit, after_timestamp)
@@ -75,12 +116,38 @@ class DiscordService:
             logger.error(f"Error fetching messages from channel {channel_id}: {str(e)}")
             raise
     
+    def fetch_messages_between(self, channel_id, start, end, page_size=100):
+        """Fetch all messages with start <= timestamp < end (datetimes), oldest first"""
+        messages = []
+        after = str(int(self._datetime_to_snowflake(start)) - 1)
+        
+        while True:
+            page = self.fetch_messages(channel_id, limit=page_size, after_timestamp=after)
+            if not page:
+                break
+            
+            for msg in page:
+                if self.parse_timestamp(msg['timestamp']) < end:
+                    messages.append(msg)
+            
+            # Stop once the page is short or reaches past the window
+            if len(page) < page_size or self.parse_timestamp(page[-1]['timestamp']) >= end:
+                break
+            after = page[-1]['id']
+        
+        return messages
+    
+    @staticmethod
+    def parse_timestamp(timestamp):
+        """Parse a Discord ISO timestamp into an aware datetime"""
+        return datetime.fromisoformat(timestamp.replace('Z', '+00:00'))
+    
     def get_channel_info(self, channel_id):
         """Get channel information including server details"""
         url = f"{self.BASE_URL}/channels/{channel_id}"
         
         try:
-            response = self.session.get(url, headers=self.headers)
+            response = self._get(url)
             response.raise_for_status()
             channel_data = response.json()
             
@@ -101,7 +168,7 @@ class DiscordService:
         url = f"{self.BASE_URL}/guilds/{guild_id}"
         
         try:
-            response = self.session.get(url, headers=self.headers)
+            response = self._get(url)
             response.raise_for_status()
             return response.json()
         except requests.exceptions.RequestException as e:
@@ -118,13 +185,209 @@ class DiscordService:
         """Test if the user token is valid"""
         url = f"{self.BASE_URL}/users/@me"
         try:
-            response = self.session.get(url, headers=self.headers)
+            response = self._get(url)
             response.raise_for_status()
             return True, response.json()
         except requests.exceptions.RequestException as e:
             logger.error(f"Failed to validate user token: {str(e)}")
             return False, str(e)
 
+# Requests per minute each Discord token may make before channels move to another token
+DISCORD_TOKEN_REQUESTS_PER_MINUTE = int(os.environ.get('DISCORD_TOKEN_REQUESTS_PER_MINUTE', 50))
+# Seconds before a token that could not read a channel is tried on it again
+DISCORD_ACCESS_RECHECK_SECONDS = 3600
+# A channel stays on the token that read it last while the token has more requests than this left
+DISCORD_TOKEN_REASSIGN_REMAINING = int(os.environ.get('DISCORD_TOKEN_REASSIGN_REMAINING', 5))
+# Times a read waits for a token to come free when every token is rate limited
+DISCORD_RATE_LIMIT_WAITS = 3
+
+class DiscordTokenState:
+    """Request accounting and rate-limit state of one Discord token, shared by every service in the process"""
+    
+    def __init__(self, token):
+        # Tokens are secrets, so only a fingerprint is ever reported
+        self.name = hashlib.sha256(token.encode()).hexdigest()[:8]
+        self.budget = DISCORD_TOKEN_REQUESTS_PER_MINUTE
+        self.requests = 0
+        self.rate_limited = 0  # 429 responses
+        self.errors = 0
+        self.recent = deque()  # Monotonic request times within the last hour
+        self.limited_until = 0  # Monotonic time the last 429 asked us to wait for
+        self.channels = set()  # Channels last read with this token
+        self.denied = {}  # channel_id -> monotonic time the token was refused access
+        self.last_error = None
+        self.lock = threading.Lock()
+    
+    def record_response(self, response):
+        now = time.monotonic()
+        with self.lock:
+            self.requests += 1
+            self.recent.append(now)
+            while self.recent and now - self.recent[0] > 3600:
+                self.recent.popleft()
+            if response.status_code == 429:
+                self.rate_limited += 1
+                self.limited_until = now + float(response.headers.get('Retry-After', 5))
+            elif response.status_code >= 400:
+                self.errors += 1
+                self.last_error = f"HTTP {response.status_code} for {response.url}"
+    
+    def remaining(self):
+        """Requests left in the current minute; none while Discord has us waiting"""
+        now = time.monotonic()
+        with self.lock:
+            if now < self.limited_until:
+                return 0
+            used = sum(1 for t in reversed(self.recent) if now - t <= 60)
+        return max(self.budget - used, 0)
+    
+    def retry_after(self):
+        """Seconds until Discord lets this token make requests again"""
+        return max(self.limited_until - time.monotonic(), 0)
+    
+    def can_access(self, channel_id):
+        denied_at = self.denied.get(channel_id)
+        return denied_at is None or time.monotonic() - denied_at > DISCORD_ACCESS_RECHECK_SECONDS
+    
+    def to_dict(self):
+        now = time.monotonic()
+        with self.lock:
+            requests_last_hour = sum(1 for t in self.recent if now - t <= 3600)
+            limited_for = max(self.limited_until - now, 0)
+        return {
+            'token': self.name,
+            'requests': self.requests,
+            'requests_last_hour': requests_last_hour,
+            'remaining': self.remaining(),
+            'budget_per_minute': self.budget,
+            'rate_limited': self.rate_limited,
+            'rate_limited_for': round(limited_for, 1),
+            'errors': self.errors,
+            'channels': len(self.channels),
+            'denied_channels': sum(1 for channel_id in self.denied if not self.can_access(channel_id)),
+            'last_error': self.last_error
+        }
+
+_token_states = {}
+_token_states_lock = threading.Lock()
+
+def get_token_state(token):
+    with _token_states_lock:
+        state = _token_states.get(token)
+        if state is None:
+            state = _token_states[token] = DiscordTokenState(token)
+        return state
+
+class DiscordPool:
+    """Spreads Discord requests over several user tokens.
+    
+    Drop-in replacement for DiscordService. Each token has its own
+    DiscordService and rate-limit budget. A channel stays on the token that
+    read it last until that token runs low on requests this minute, is rate
+    limited or loses access; it then moves to the token with the most
+    requests left. A 429 moves the read to the next token straight away, and
+    a token refused access to a channel (401/403/404) is skipped for that
+    channel for an hour.
+    """
+    
+    parse_timestamp = staticmethod(DiscordService.parse_timestamp)
+    
+    def __init__(self, tokens, rate_limiters=None):
+        # rate_limiters optionally maps a token to the RateLimiter its requests wait on
+        rate_limiters = rate_limiters or {}
+        self.services = [DiscordService(token, rate_limiter=rate_limiters.get(token), wait_on_rate_limit=False)
+                         for token in tokens]
+    
+    @classmethod
+    def from_config(cls, config, rate_limiters=None):
+        """Pool of the configured tokens"""
+        return cls(config.get_discord_tokens(), rate_limiters)
+    
+    def _candidates(self, channel_id):
+        """Services that may read channel_id: its current token while it has budget, then the best budget first"""
+        usable = [service for service in self.services if service.token_state.can_access(channel_id)]
+        candidates = sorted(usable, key=lambda service: -service.token_state.remaining())
+        current = next((service for service in usable if channel_id in service.token_state.channels), None)
+        if current and current.token_state.remaining() > DISCORD_TOKEN_REASSIGN_REMAINING:
+            candidates.remove(current)
+            candidates.insert(0, current)
+        return candidates
+    
+    def _assign(self, channel_id, service):
+        for other in self.services:
+            if other is not service:
+                other.token_state.channels.discard(channel_id)
+        service.token_state.channels.add(channel_id)
+    
+    def _call(self, channel_id, call):
+        """Run call(DiscordService) for a channel, moving on to the next token when one is rate limited or refused"""
+        for _ in range(DISCORD_RATE_LIMIT_WAITS + 1):
+            candidates = self._candidates(channel_id)
+            if not candidates:
+                raise requests.exceptions.HTTPError(f"No Discord token can access channel {channel_id}")
+            
+            limited = []
+            for service in candidates:
+                try:
+                    result = call(service)
+                except requests.exceptions.HTTPError as e:
+                    status = e.response.status_code if e.response is not None else None
+                    if status == 429:
+                        limited.append(service)
+                        logger.warning(f"Token {service.token_state.name} is rate limited, "
+                                       f"moving channel {channel_id} to the next token")
+                    elif status in (401, 403, 404):
+                        service.token_state.denied[channel_id] = time.monotonic()
+                        logger.warning(f"Token {service.token_state.name} cannot read channel {channel_id}, "
+                                       f"trying the next token")
+                    else:
+                        raise
+                    last_error = e
+                    continue
+                self._assign(channel_id, service)
+                return result
+            
+            if not limited:
+                raise last_error
+            # Every token that can read the channel is rate limited: wait for the first to come free
+            wait = min(service.token_state.retry_after() for service in limited)
+            logger.warning(f"All tokens for channel {channel_id} are rate limited, waiting {wait:.1f} seconds")
+            time.sleep(wait)
+        raise last_error
+    
+    def fetch_messages(self, channel_id, limit=100, after_timestamp=None):
+        """Fetch messages from a channel, see DiscordService.fetch_messages"""
+        return self._call(channel_id, lambda service: service.fetch_messages(channel_id, limit, after_timestamp))
+    
+    def fetch_messages_between(self, channel_id, start, end, page_size=100):
+        """Fetch messages in a time window, see DiscordService.fetch_messages_between"""
+        return self._call(channel_id, lambda service: service.fetch_messages_between(channel_id, start, end, page_size))
+    
+    def get_channel_info(self, channel_id):
+        """Channel and server details from the first token that can read the channel"""
+        for service in self._candidates(channel_id):
+            channel_info = service.get_channel_info(channel_id)
+            if channel_info:
+                self._assign(channel_id, service)
+                return channel_info
+        return None
+    
+    def test_connection(self):
+        """Test every token, returning (all valid, result of the first failure or of the primary token)"""
+        results = [service.test_connection() for service in self.services]
+        failed = [result for valid, result in results if not valid]
+        if failed:
+            return False, failed[0]
+        return True, results[0][1] if results else None
+    
+    def status(self):
+        tokens = [service.token_state.to_dict() for service in self.services]
+        return {
+            'tokens': tokens,
+            'requests_last_hour': sum(t['requests_last_hour'] for t in tokens),
+            'remaining': sum(t['remaining'] for t in tokens)
+        }
+
 class OllamaService:
     """Service for interacting with Ollama API"""
     
@@ -139,9 +402,7 @@ class OllamaService:
         return session
     
     def generate_summary(self, content, prompt_template=None, max_length=500):
-        """Generate a summary using Ollama with custom prompt"""
-        url = f"{self.base_url}/api/generate"
-        
+        """Generate a summary using Ollama with custom prompt, raising OllamaError on failure"""
         if prompt_template:
             prompt = prompt_template.format(content=content, max_length=max_length)
         else:
@@ -154,6 +415,23 @@ Conversation:
 
 Summary:"""
         
+        return self.generate(prompt, max_length)
+    
+    def generate(self, prompt, max_length=500, response_format=None):
+        """Run a prompt and return the response text, raising OllamaError on failure.
+        
+        response_format='json' makes Ollama constrain the output to valid JSON.
+        """
+        return self.generate_with_context(prompt, None, max_length, response_format)[0]
+    
+    def generate_with_context(self, prompt, context=None, max_length=500, response_format=None):
+        """Run a prompt continuing an earlier one, returning (response text, context).
+        
+        context is the value returned by a previous call; the model then sees
+        that conversation before prompt without it being sent as text again.
+        """
+        url = f"{self.base_url}/api/generate"
+        
         payload = {
             "model": self.model_name,
             "prompt": prompt,
@@ -164,24 +442,59 @@ Summary:"""
                 "max_tokens": max_length
             }
         }
+        if response_format:
+            payload["format"] = response_format
+        if context:
+            payload["context"] = context
         
         try:
             response = self.session.post(
                 url, 
                 json=payload,
-                timeout=60
+                timeout=OLLAMA_TIMEOUT
             )
             response.raise_for_status()
             
             result = response.json()
-            return result.get('response', 'Summary generation failed')
             
         except requests.exceptions.Timeout:
             logger.error("Ollama request timed out")
-            return "Summary generation timed out"
-        except requests.exceptions.RequestException as e:
+            raise OllamaError("Summary generation timed out")
+        except (requests.exceptions.RequestException, ValueError) as e:
             logger.error(f"Error generating summary with Ollama: {str(e)}")
-            return f"Error generating summary: {str(e)}"
+            raise OllamaError(f"Error generating summary: {str(e)}")
+        
+        current_span().add(prompt_tokens=result.get('prompt_eval_count'),
+                           completion_tokens=result.get('eval_count'))
+        summary = (result.get('response') or '').strip()
+        if not summary:
+            raise OllamaError("Ollama returned an empty summary")
+        return summary, result.get('context')
+    
+    def embed(self, texts):
+        """Embedding vectors of texts computed with this service's model, raising OllamaError on failure"""
+        url = f"{self.base_url}/api/embed"
+        
+        try:
+            response = self.session.post(
+                url,
+                json={"model": self.model_name, "input": list(texts)},
+                timeout=OLLAMA_TIMEOUT
+            )
+            response.raise_for_status()
+            
+            embeddings = response.json().get('embeddings') or []
+            
+        except requests.exceptions.Timeout:
+            logger.error("Ollama embedding request timed out")
+            raise OllamaError("Embedding request timed out")
+        except (requests.exceptions.RequestException, ValueError) as e:
+            logger.error(f"Error computing embeddings with Ollama: {str(e)}")
+            raise OllamaError(f"Error computing embeddings: {str(e)}")
+        
+        if len(embeddings) != len(texts):
+            raise OllamaError(f"Ollama returned {len(embeddings)} embeddings for {len(texts)} texts")
+        return embeddings
     
     def get_available_models(self):
         """Get list of available models from Ollama"""
@@ -237,6 +550,298 @@ Summary:"""
             logger.error(f"Failed to connect to Ollama: {str(e)}")
             return False, str(e)
 
+# Consecutive failures opening an endpoint's circuit, and how long it stays open
+OLLAMA_FAILURE_THRESHOLD = 3
+OLLAMA_RESET_TIMEOUT = 120
+OLLAMA_HEALTH_TIMEOUT = 5
+# Seconds to wait for a summary
+OLLAMA_TIMEOUT = 60
+# Concurrent requests per Ollama server unless its URL line sets concurrency=N
+OLLAMA_ENDPOINT_CONCURRENCY = int(os.environ.get('OLLAMA_ENDPOINT_CONCURRENCY', 1))
+
+class CircuitBreaker:
+    """Stops calling a failing backend for a while instead of waiting on every request.
+    
+    After failure_threshold consecutive failures the circuit opens and calls
+    are refused until reset_timeout has passed; then a single trial call is
+    let through (half open), which closes the circuit again if it succeeds.
+    """
+    
+    def __init__(self, failure_threshold=3, reset_timeout=60):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self.trial_started = None
+        self.lock = threading.Lock()
+    
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return 'closed'
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return 'half_open'
+        return 'open'
+    
+    def allow(self):
+        """Whether a call may be made now"""
+        with self.lock:
+            state = self.state
+            if state == 'closed':
+                return True
+            if state == 'open':
+                return False
+            # Half open: one trial at a time, retried if it never reports back
+            now = time.monotonic()
+            if self.trial_started is None or now - self.trial_started > self.reset_timeout:
+                self.trial_started = now
+                return True
+            return False
+    
+    def record_success(self):
+        with self.lock:
+            self.failures = 0
+            self.opened_at = None
+            self.trial_started = None
+    
+    def record_failure(self):
+        with self.lock:
+            self.failures += 1
+            if self.opened_at is not None or self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+                self.trial_started = None
+    
+    def trip(self):
+        """Open the circuit immediately"""
+        with self.lock:
+            self.failures = max(self.failures, self.failure_threshold)
+            self.opened_at = time.monotonic()
+            self.trial_started = None
+
+class OllamaEndpointState:
+    """Health, load and throughput of one Ollama server, shared by every router in the process"""
+    
+    def __init__(self, url):
+        self.url = url
+        self.breaker = CircuitBreaker(OLLAMA_FAILURE_THRESHOLD, OLLAMA_RESET_TIMEOUT)
+        self.max_concurrency = OLLAMA_ENDPOINT_CONCURRENCY
+        self.outstanding = 0  # Requests in flight
+        self.completed = 0
+        self.failed = 0
+        self.busy_seconds = 0.0
+        self.recent = deque()  # Monotonic completion times within the last hour
+        self.latency = None  # Smoothed seconds per summary
+        self.ping = None  # Seconds for the last health check
+        self.last_error = None
+        self.last_checked = None
+    
+    def record_latency(self, seconds):
+        self.latency = seconds if self.latency is None else 0.8 * self.latency + 0.2 * seconds
+    
+    def record_completion(self, seconds):
+        now = time.monotonic()
+        self.completed += 1
+        self.busy_seconds += seconds
+        self.recent.append(now)
+        while self.recent and now - self.recent[0] > 3600:
+            self.recent.popleft()
+    
+    def expected_latency(self):
+        """Latency used for routing; unmeasured servers are tried first"""
+        if self.latency is not None:
+            return self.latency
+        return self.ping or 0
+    
+    def load(self):
+        """Share of the server's concurrency in use"""
+        return self.outstanding / max(self.max_concurrency, 1)
+    
+    def to_dict(self):
+        now = time.monotonic()
+        return {
+            'url': self.url,
+            'state': self.breaker.state,
+            'outstanding': self.outstanding,
+            'max_concurrency': self.max_concurrency,
+            'completed': self.completed,
+            'failed': self.failed,
+            'summaries_last_hour': sum(1 for t in self.recent if now - t <= 3600),
+            'average_seconds': round(self.busy_seconds / self.completed, 3) if self.completed else None,
+            'latency': round(self.latency, 3) if self.latency is not None else None,
+            'ping': round(self.ping, 3) if self.ping is not None else None,
+            'last_error': self.last_error,
+            'last_checked': self.last_checked.isoformat() if self.last_checked else None
+        }
+
+_endpoint_states = {}
+_endpoint_states_lock = threading.Lock()
+# Signalled whenever a request finishes and frees a slot on some server
+_endpoint_slots = threading.Condition(_endpoint_states_lock)
+
+def get_endpoint_state(url):
+    with _endpoint_states_lock:
+        state = _endpoint_states.get(url)
+        if state is None:
+            state = _endpoint_states[url] = OllamaEndpointState(url)
+        return state
+
+class OllamaRouter:
+    """Spreads summaries over a pool of Ollama servers.
+    
+    Drop-in replacement for OllamaService.generate_summary. Each request
+    goes to the healthy server with the fewest outstanding requests relative
+    to its concurrency limit (ties go to the faster one) and waits for a
+    free slot when every server is busy. Servers with an open circuit are
+    skipped without waiting on them, failures move on to the next server,
+    and when the backlog is large the smaller fallback model is used.
+    """
+    
+    def __init__(self, endpoints, model_name, fallback_model_name=None, use_fallback=False):
+        # endpoints are URLs or (url, max_concurrency) pairs
+        self.urls = []
+        for endpoint in endpoints:
+            url, concurrency = endpoint if isinstance(endpoint, tuple) else (endpoint, None)
+            self.urls.append(url)
+            if concurrency:
+                get_endpoint_state(url).max_concurrency = concurrency
+        self.model_name = model_name
+        self.fallback_model_name = fallback_model_name
+        self.use_fallback = bool(use_fallback and fallback_model_name)
+    
+    @classmethod
+    def from_config(cls, config, backlog=0):
+        """Router for the configured servers; backlog is the number of unsummarized messages"""
+        threshold = config.fallback_backlog_messages or 0
+        use_fallback = bool(threshold and backlog >= threshold)
+        if use_fallback and config.fallback_model_name:
+            logger.info(f"Backlog of {backlog} messages, using fallback model {config.fallback_model_name}")
+        return cls(config.get_ollama_endpoints(), config.model_name, config.fallback_model_name, use_fallback)
+    
+    @property
+    def active_model(self):
+        return self.fallback_model_name if self.use_fallback else self.model_name
+    
+    @property
+    def capacity(self):
+        """Requests the pool can run at once, counting only servers that are not down"""
+        states = [get_endpoint_state(url) for url in self.urls]
+        return sum(st.max_concurrency for st in states if st.breaker.state != 'open') or 1
+    
+    def _acquire(self, tried):
+        """Reserve a slot on the least loaded usable server, waiting while all are busy"""
+        with _endpoint_slots:
+            while True:
+                usable = [st for st in (_endpoint_states.get(url) for url in self.urls)
+                          if st.url not in tried and st.breaker.state != 'open']
+                if not usable:
+                    return None
+                
+                free = [st for st in usable if st.outstanding < st.max_concurrency]
+                if free:
+                    state = min(free, key=lambda st: (st.load(), st.expected_latency()))
+                    if not state.breaker.allow():
+                        # Half-open server already running its trial request
+                        tried.add(state.url)
+                        continue
+                    state.outstanding += 1
+                    return state
+                
+                _endpoint_slots.wait(timeout=1)
+    
+    def _release(self, state):
+        with _endpoint_slots:
+            state.outstanding -= 1
+            _endpoint_slots.notify_all()
+    
+    def generate_summary(self, content, prompt_template=None, max_length=500):
+        """Generate a summary on the pool, raising OllamaError if no server succeeds"""
+        return self._dispatch(lambda service: service.generate_summary(content, prompt_template, max_length))
+    
+    def generate(self, prompt, max_length=500, response_format=None):
+        """Run a raw prompt on the pool, see OllamaService.generate"""
+        return self._dispatch(lambda service: service.generate(prompt, max_length, response_format))
+    
+    def generate_with_context(self, prompt, context=None, max_length=500, response_format=None):
+        """Continue an earlier prompt on the pool, see OllamaService.generate_with_context"""
+        return self._dispatch(lambda service: service.generate_with_context(prompt, context, max_length, response_format))
+    
+    def embed(self, texts, model_name):
+        """Embed texts with model_name on the pool, see OllamaService.embed"""
+        return self._dispatch(lambda service: service.embed(texts), model_name=model_name, timed=False)
+    
+    def _dispatch(self, call, model_name=None, timed=True):
+        """Run call(OllamaService) on the least loaded server, moving on to the next on failure.
+        
+        Requests that are not summaries (timed=False) leave the latency and
+        throughput statistics alone so they do not skew routing.
+        """
+        for url in self.urls:
+            get_endpoint_state(url)
+        
+        tried = set()
+        last_error = None
+        
+        while True:
+            state = self._acquire(tried)
+            if state is None:
+                break
+            tried.add(state.url)
+            current_span().set(server=state.url)
+            
+            started = time.monotonic()
+            try:
+                response = call(OllamaService(state.url, model_name or self.active_model))
+            except OllamaError as e:
+                state.breaker.record_failure()
+                state.failed += 1
+                # Count a failure as a full timeout so routing prefers other servers
+                if timed:
+                    state.record_latency(max(time.monotonic() - started, OLLAMA_TIMEOUT))
+                state.last_error = str(e)
+                last_error = e
+                logger.warning(f"Ollama server {state.url} failed ({state.breaker.state}): {str(e)}")
+                continue
+            finally:
+                self._release(state)
+            
+            elapsed = time.monotonic() - started
+            state.breaker.record_success()
+            if timed:
+                state.record_latency(elapsed)
+                state.record_completion(elapsed)
+            return response
+        
+        if last_error:
+            raise last_error
+        raise OllamaError("No Ollama server available (all circuits open)")
+    
+    def check_health(self):
+        """Ping every server, opening the circuit of unreachable ones"""
+        for url in self.urls:
+            state = get_endpoint_state(url)
+            started = time.monotonic()
+            try:
+                response = requests.get(f"{url.rstrip('/')}/api/tags", timeout=OLLAMA_HEALTH_TIMEOUT)
+                response.raise_for_status()
+            except requests.exceptions.RequestException as e:
+                state.breaker.trip()
+                state.last_error = str(e)
+                logger.warning(f"Ollama server {url} is unhealthy: {str(e)}")
+            else:
+                # A reachable server may still be too busy to generate, so only
+                # a successful summary (the half-open trial) closes the circuit
+                state.ping = time.monotonic() - started
+            state.last_checked = datetime.now(timezone.utc)
+    
+    def status(self):
+        endpoints = [get_endpoint_state(url).to_dict() for url in self.urls]
+        return {
+            'model': self.active_model,
+            'capacity': self.capacity,
+            'summaries_last_hour': sum(e['summaries_last_hour'] for e in endpoints),
+            'endpoints': endpoints
+        }
+
 class EmailService:
     """Service for sending email notifications"""
     
@@ -250,6 +855,12 @@ class EmailService:
             logger.warning("Email not configured, skipping daily summary email")
             return False
         
+        # Only the daily email job needs the mail modules
+        import smtplib
+        from email.mime.text import MIMEText
+        from email.mime.multipart import MIMEMultipart
+        from email.utils import formataddr
+        
         try:
             # Create message
             msg = MIMEMultipart('alternative')
@@ -389,6 +1000,8 @@ class EmailService:
         if not self.config.is_email_configured():
             return False, "Email not configured"
         
+        import smtplib
+        
         try:
             with smtplib.SMTP(self.config.smtp_server, self.config.smtp_port) as server:
                 if self.config.smtp_use_tls:
@@ -2,10 +2,15 @@
 """
 Startup script that handles database migration before starting the app.
 This is used as an alternative to shell scripts for better cross-platform support.
+
+`python startup.py` starts the web app; `python startup.py worker` starts
+the headless pipeline worker (see worker.py) instead.
 """
 import os
 import sys
+import signal
 import subprocess
+import time
 import logging
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(message)s')
@@ -13,13 +18,25 @@ logger = logging.getLogger(__name__)
 
 def run_migrations():
     """Run database migrations if needed"""
-    db_path = os.environ.get('DATABASE_URL', 'sqlite:///discord_summaries.db')
+    from sqlalchemy.engine import make_url
+    from migrate_db import normalize_database_url
+    
+    db_url = normalize_database_url(os.environ.get('DATABASE_URL', 'sqlite:///discord_summaries.db'))
+    url = make_url(db_url)
+    
+    if url.get_backend_name() != 'sqlite':
+        # Server databases always exist; migrate_database creates the schema if empty
+        logger.info(f"Running migrations against {url.get_backend_name()} database...")
+        from migrate_db import migrate_database
+        if migrate_database(db_url):
+            logger.info("✅ Migrations completed successfully")
+        else:
+            logger.error("❌ Migration failed")
+            sys.exit(1)
+        return
     
     # Extract the actual file path from SQLite URL
-    if db_path.startswith('sqlite:///'):
-        db_file = db_path.replace('sqlite:///', '')
-    else:
-        db_file = 'discord_summaries.db'
+    db_file = url.database or 'discord_summaries.db'
     
     if os.path.exists(db_file):
         logger.info(f"Existing database found at {db_file}. Running migrations...")
@@ -38,30 +55,49 @@ def run_migrations():
         logger.info("No existing database found. Will create new one.")
 
 def start_app():
-    """Start the application with gunicorn"""
+    """Start the web app with gunicorn, next to a pipeline worker running the scheduled jobs"""
     logger.info("Starting Discord Summarizer with Gunicorn...")
     
-    # Prepare gunicorn command
-    cmd = [
-        "gunicorn",
-        "-w", "4",
-        "-b", "0.0.0.0:5000",
-        "--timeout", "3000",
-        "--access-logfile", "-",
-        "--error-logfile", "-",
-        "wsgi:app"
-    ]
+    processes = []
+    # SCHEDULER_ENABLED=false means the pipeline workers run elsewhere
+    if os.environ.get('SCHEDULER_ENABLED', 'true').lower() not in ('0', 'false', 'no'):
+        processes.append(subprocess.Popen([sys.executable, "worker.py"]))
+    
+    # Workers, timeouts and preloading are set in gunicorn.conf.py
+    cmd = ["gunicorn", "-c", "gunicorn.conf.py"]
+    
+    def stop(signum, frame):
+        for process in processes:
+            process.terminate()
+    signal.signal(signal.SIGTERM, stop)
     
     # Execute gunicorn
     try:
-        subprocess.run(cmd)
+        processes.append(subprocess.Popen(cmd))
+        # Stop when either process exits
+        while all(process.poll() is None for process in processes):
+            time.sleep(1)
     except KeyboardInterrupt:
         logger.info("Shutting down...")
-        sys.exit(0)
     except Exception as e:
         logger.error(f"Error starting application: {e}")
+        stop(None, None)
         sys.exit(1)
+    finally:
+        stop(None, None)
+        for process in processes:
+            process.wait()
+
+def start_worker():
+    """Start the headless pipeline worker"""
+    logger.info("Starting Discord Summarizer pipeline worker...")
+    
+    from worker import main
+    sys.exit(main())
 
 if __name__ == "__main__":
     run_migrations()
-    start_app()
\ No newline at end of file
+    if sys.argv[1:] == ['worker']:
+        start_worker()
+    else:
+        start_app()
\ No newline at end of file
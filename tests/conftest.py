@@ -0,0 +1,47 @@
+import os
+
+import pytest
+
+from benchmarks import use_scratch_environment
+
+# The app reads its configuration when imported, so the scratch database
+# and directories are set up before any test module imports it
+workdir = use_scratch_environment()
+os.environ['SCHEDULER_ENABLED'] = 'false'
+os.environ['ARCHIVE_DIR'] = os.path.join(workdir, 'archive')
+
+def pytest_addoption(parser):
+    group = parser.getgroup('performance')
+    group.addoption('--perf-rounds', type=int, default=5, help='Timed runs per performance scenario')
+    group.addoption('--latency-scale', type=float, default=1.0,
+                    help='Multiply the latency budgets, e.g. 2 on slow CI machines')
+    group.addoption('--perf-report', default=os.environ.get('PERF_REPORT', 'perf-report.json'),
+                    help='Write the performance JSON report to this file')
+
+@pytest.fixture(scope='session')
+def app():
+    from app import create_app
+    return create_app(scheduler_enabled=False)
+
+@pytest.fixture(scope='session')
+def db(app):
+    from app import db
+    return db
+
+@pytest.fixture(scope='session')
+def perf_suite(request, app, db):
+    """Seeded database, scenarios and Discord fake of the performance suite.
+
+    Writes the JSON report when the session ends.
+    """
+    from benchmarks import prepare_suite, write_report
+
+    app, scenarios, discord = prepare_suite(app)
+    with app.app_context():
+        engine = db.engine
+    results = []
+    yield engine, dict(scenarios), discord, results
+
+    if results:
+        options = request.config.option
+        write_report(options.perf_report, results, options.perf_rounds, options.latency_scale)
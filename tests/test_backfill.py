@@ -0,0 +1,38 @@
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+
+from fakes import FakeDiscordService, FakeOllamaService
+
+CHANNEL_ID = '999'
+
+def test_backfill_and_first_live_pass_do_not_overlap(app, db, monkeypatch):
+    import backfill
+    from app import ingest_channel_messages
+    from models import AppConfig, BufferedMessage, Summary
+
+    # A quiet channel: its latest page of 100 messages reaches back well into the backfill range
+    discord = FakeDiscordService()
+    now = datetime.now(timezone.utc)
+    for n in range(60):
+        discord.add_message(CHANNEL_ID, 999000 + n, f"message {n}", (now - timedelta(hours=59 - n, minutes=30)).isoformat())
+    for n in range(3):
+        discord.add_message(CHANNEL_ID, 999100 + n, f"recent {n}", (now + timedelta(seconds=n)).isoformat())
+
+    monkeypatch.setattr(backfill, 'DiscordPool', SimpleNamespace(from_config=lambda config, rate_limiters=None: discord))
+    monkeypatch.setattr(backfill, 'OllamaRouter', SimpleNamespace(from_config=lambda config, backlog=0: FakeOllamaService()))
+    with app.app_context():
+        config = AppConfig.get_config()
+        job = backfill.create_backfill_job(CHANNEL_ID, 3)
+
+        # The live pass starts before the backfill has run
+        ingest_channel_messages(CHANNEL_ID, discord)
+        while backfill.run_backfill(config).status not in ('completed', 'failed'):
+            pass
+        assert job.status == 'completed'
+
+        buffered = {m.message_id for m in BufferedMessage.query.filter_by(channel_id=CHANNEL_ID)}
+        backfilled = {m['id'] for s in Summary.query.filter_by(channel_id=CHANNEL_ID) for m in s.get_messages()}
+        assert buffered and backfilled
+        assert not buffered & backfilled
+        # Between them every message is covered
+        assert buffered | backfilled == {m['id'] for m in discord.messages[CHANNEL_ID]}
@@ -0,0 +1,25 @@
+def test_pending_counts_ignore_removed_channels(app, db):
+    from models import AppConfig, BufferedMessage
+
+    with app.app_context():
+        config = AppConfig.load_for_update()
+        previous = config.get_channel_ids()
+        config.set_channel_ids(['4441'])
+        AppConfig.bump_version()
+        BufferedMessage.apply_events([
+            ('MESSAGE_CREATE', {'id': '444100', 'channel_id': '4441', 'content': 'configured',
+                                'timestamp': '2025-01-01T00:00:00+00:00'}),
+            # Buffered before its channel was removed from the configuration
+            ('MESSAGE_CREATE', {'id': '444200', 'channel_id': '4442', 'content': 'removed',
+                                'timestamp': '2025-01-01T00:00:00+00:00'}),
+        ])
+
+        try:
+            assert BufferedMessage.pending_counts(['4441']) == {'4441': 1}
+            backlog = app.test_client().get('/api/backlog').get_json()
+            assert backlog['pending_messages'] == 1
+            assert app.test_client().get('/api/status').get_json()['pending_messages'] == 1
+        finally:
+            config = AppConfig.load_for_update()
+            config.set_channel_ids(previous)
+            AppConfig.bump_version()
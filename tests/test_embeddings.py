@@ -0,0 +1,44 @@
+from datetime import datetime, timezone
+from types import SimpleNamespace
+
+import pytest
+
+np = pytest.importorskip('numpy')
+
+CHANNEL_ID = '888'
+
+class _Embedder:
+    """Embeds a text as a vector derived from its length"""
+
+    def __init__(self):
+        self.texts = []
+
+    def embed(self, texts, model):
+        self.texts.extend(texts)
+        return [[len(text) + 1.0, 1.0] for text in texts]
+
+def test_summaries_below_the_highest_indexed_id_are_indexed(app, db, tmp_path, monkeypatch):
+    import embeddings
+    from models import Summary
+
+    config = SimpleNamespace(embedding_model='test-embed')
+    monkeypatch.setitem(app.config, 'EMBEDDING_DIR', str(tmp_path / 'embeddings'))
+    with app.app_context():
+        now = datetime.now(timezone.utc)
+        # A summary committed after a higher ID, e.g. by a concurrent pass or an import
+        db.session.add(Summary(id=500, channel_id=CHANNEL_ID, summary_text='later id', timestamp=now))
+        db.session.commit()
+        embedder = _Embedder()
+        assert embeddings.index_new_summaries(config, ollama_service=embedder) >= 1
+
+        db.session.add(Summary(id=100, channel_id=CHANNEL_ID, summary_text='earlier id', timestamp=now))
+        db.session.commit()
+        embedder.texts.clear()
+        assert embeddings.index_new_summaries(config, ollama_service=embedder) == 1
+        assert embedder.texts == ['earlier id']
+
+        indexed = embeddings.get_index().indexed_ids('test-embed')
+        assert {100, 500} <= set(indexed.tolist())
+        assert len(indexed) == len(set(indexed.tolist()))
+        # Nothing is left to embed
+        assert embeddings.index_new_summaries(config, ollama_service=embedder) == 0
@@ -0,0 +1,45 @@
+import os
+import shutil
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import delete
+
+CHANNEL_ID = '555'
+
+def _transcript(n):
+    return [{'id': str(n * 10 + i), 'content': f"message {i}", 'timestamp': '2025-01-01T00:00:00+00:00',
+             'author': {'id': '1', 'username': 'tester', 'avatar': None}, 'attachments': []} for i in range(3)]
+
+def test_archived_transcripts_survive_export_and_import(app, db, tmp_path):
+    import export_db
+    from models import AppConfig, ChannelState, Summary
+    from retention import archive_old_transcripts, read_archived_messages
+
+    with app.app_context():
+        db.session.add(ChannelState(channel_id=CHANNEL_ID, transcript_retention_days=1))
+        old = datetime.now(timezone.utc) - timedelta(days=30)
+        for n in range(3):
+            summary = Summary(channel_id=CHANNEL_ID, summary_text=f"summary {n}", timestamp=old + timedelta(hours=n))
+            summary.set_messages(_transcript(n))
+            db.session.add(summary)
+        db.session.commit()
+        assert archive_old_transcripts(AppConfig.get_config())['summaries_archived'] == 3
+
+        path = str(tmp_path / 'summaries.ndjson')
+        rows, _ = export_db.export_to_file('summaries', path, channel_id=CHANNEL_ID)
+        assert rows == 3
+        messages = list(export_db.iter_message_records(CHANNEL_ID))
+        assert len(messages) == 9
+
+        # Restore onto a host without the archive files
+        db.session.execute(delete(Summary).where(Summary.channel_id == CHANNEL_ID))
+        db.session.commit()
+        shutil.rmtree(os.path.join(app.config['ARCHIVE_DIR'], CHANNEL_ID))
+
+        imported, skipped, _ = export_db.import_from_file(path)
+        assert (imported, skipped) == (3, 0)
+        restored = Summary.query.filter_by(channel_id=CHANNEL_ID).order_by(Summary.id).all()
+        for n, summary in enumerate(restored):
+            assert summary.archived_at is not None
+            assert summary.get_messages() == []
+            assert read_archived_messages(summary) == _transcript(n)
@@ -0,0 +1,87 @@
+import time
+from datetime import datetime, timezone
+
+import pytest
+
+from fakes import FakeDiscordService, FakeGateway
+from gateway import GatewayError, GatewayIngest, OP_IDENTIFY, OP_RESUME
+
+CHANNEL_ID = '111'
+
+def wait_for(app, condition, timeout=10):
+    """Poll condition() in an app context until it is true"""
+    deadline = time.monotonic() + timeout
+    while True:
+        with app.app_context():
+            if condition():
+                return
+        assert time.monotonic() < deadline, 'Timed out waiting for the gateway writer'
+        time.sleep(0.05)
+
+def buffered(message_id):
+    from models import BufferedMessage
+    return BufferedMessage.query.filter_by(message_id=message_id).first()
+
+@pytest.fixture
+def ingest(app, db):
+    from models import AppConfig
+
+    with app.app_context():
+        config = AppConfig.load_for_update()
+        config.user_token = 'token'
+        config.set_channel_ids([CHANNEL_ID])
+        AppConfig.bump_version()
+
+    gateway = FakeGateway()
+    discord = FakeDiscordService()
+    # Sent before the session started, so only the REST gap fill can see it
+    discord.add_message(CHANNEL_ID, 900, 'before connect')
+    ingest = GatewayIngest(app, connect=gateway.connect, url='wss://fake.gateway', discord_service=discord)
+    ingest.start()
+    yield gateway, ingest
+    ingest.stop()
+
+def test_message_events_reach_the_buffer(app, ingest):
+    gateway, _ = ingest
+    assert gateway.ready.wait(5)
+    wait_for(app, lambda: buffered('900') is not None)
+
+    gateway.message_create(CHANNEL_ID, 1001, 'hello')
+    gateway.message_create(CHANNEL_ID, 1002, 'typo')
+    gateway.message_create('222', 1003, 'unmonitored channel')
+    gateway.dispatch('MESSAGE_UPDATE', {'id': '1001', 'channel_id': CHANNEL_ID, 'content': 'hello, edited',
+                                        'edited_timestamp': datetime.now(timezone.utc).isoformat()})
+    gateway.dispatch('MESSAGE_DELETE', {'id': '1002', 'channel_id': CHANNEL_ID})
+
+    wait_for(app, lambda: buffered('1002') is not None and buffered('1002').deleted)
+    with app.app_context():
+        edited = buffered('1001')
+        assert edited.content == 'hello, edited'
+        assert edited.edited_timestamp is not None
+        assert not edited.deleted
+        assert buffered('1003') is None
+
+def test_disconnect_resumes_and_replays_missed_events(app, ingest):
+    gateway, _ = ingest
+    assert gateway.ready.wait(5)
+    gateway.message_create(CHANNEL_ID, 2001, 'before disconnect')
+    wait_for(app, lambda: buffered('2001') is not None)
+
+    gateway.disconnect()
+    # Kept by the fake and replayed when the client resumes
+    gateway.message_create(CHANNEL_ID, 2002, 'while disconnected')
+
+    wait_for(app, lambda: buffered('2002') is not None)
+    ops = [payload['op'] for payload in gateway.sent]
+    assert ops.count(OP_IDENTIFY) == 1
+    resume = next(payload['d'] for payload in gateway.sent if payload['op'] == OP_RESUME)
+    assert resume['session_id'] == gateway.session_id
+    assert gateway.active.url.startswith('wss://fake-resume.gateway')
+
+def test_gateway_mode_without_websocket_client_fails_at_startup(app, monkeypatch):
+    import gateway
+
+    monkeypatch.setattr(gateway, 'websocket', None)
+    with pytest.raises(GatewayError, match='websocket-client'):
+        gateway.start_gateway(app)
+    assert gateway.get_ingest() is None
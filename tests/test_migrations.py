@@ -0,0 +1,65 @@
+import os
+
+import pytest
+import sqlalchemy as sa
+
+# Tables of the first release; everything else was added by migrations
+ORIGINAL_TABLES = ('app_config', 'channel_state', 'summary')
+
+def _urls(tmp_path):
+    urls = [f"sqlite:///{tmp_path / 'schema.db'}"]
+    # A scratch PostgreSQL database, e.g. in CI; every table in it is dropped
+    if os.environ.get('TEST_POSTGRES_URL'):
+        urls.append(os.environ['TEST_POSTGRES_URL'])
+    return urls
+
+def _drop_everything(engine):
+    metadata = sa.MetaData()
+    metadata.reflect(bind=engine)
+    metadata.drop_all(bind=engine)
+
+def _indexes(engine):
+    """{table: {(index name, columns or expressions, unique)}} of a database"""
+    inspector = sa.inspect(engine)
+    return {
+        table: {(index['name'], tuple(index.get('expressions') or index['column_names']), bool(index['unique']))
+                for index in inspector.get_indexes(table)}
+        for table in inspector.get_table_names() if table != 'schema_version'
+    }
+
+def _create_legacy_schema(engine):
+    """Original tables without the indexes later migrations add"""
+    from app import db
+    import models  # noqa: F401
+
+    db.metadata.create_all(bind=engine, tables=[db.metadata.tables[name] for name in ORIGINAL_TABLES])
+    with engine.begin() as conn:
+        for table in ORIGINAL_TABLES:
+            for index in sa.inspect(conn).get_indexes(table):
+                if not index['unique']:
+                    conn.execute(sa.text(f"DROP INDEX {index['name']}"))
+
+@pytest.mark.parametrize('url_index', [0, 1], ids=['sqlite', 'postgresql'])
+def test_fresh_schema_matches_migrated_schema(tmp_path, url_index):
+    from migrate_db import migrate_engine
+
+    urls = _urls(tmp_path)
+    if url_index >= len(urls):
+        pytest.skip('Set TEST_POSTGRES_URL to a scratch PostgreSQL database')
+    engine = sa.create_engine(urls[url_index])
+    try:
+        _drop_everything(engine)
+        migrate_engine(engine)
+        fresh = _indexes(engine)
+
+        _drop_everything(engine)
+        _create_legacy_schema(engine)
+        migrate_engine(engine)
+        migrated = _indexes(engine)
+    finally:
+        _drop_everything(engine)
+        engine.dispose()
+
+    assert fresh == migrated
+    if engine.dialect.name == 'postgresql':
+        assert any(index[0] == 'ix_summary_text_fts' for index in fresh['summary'])
@@ -0,0 +1,27 @@
+import pytest
+
+from benchmarks import SUITE_BUDGETS, fake_discord_pool, measure_scenario
+
+@pytest.mark.parametrize('scenario', list(SUITE_BUDGETS))
+def test_scenario_within_budget(perf_suite, request, monkeypatch, scenario):
+    import routes
+
+    engine, scenarios, discord, results = perf_suite
+    # Restored after the test, so later tests get the real client
+    monkeypatch.setattr(routes, 'DiscordPool', fake_discord_pool(discord))
+    options = request.config.option
+    result = measure_scenario(engine, scenario, scenarios[scenario], options.perf_rounds, options.latency_scale)
+    results.append(result)
+
+    repeated = ''.join(f"\n    {statement['count']}x {statement['statement']}"
+                       for statement in result['repeated_statements'])
+    assert result['queries'] <= result['query_budget'], \
+        f"{scenario} ran {result['queries']} queries, budget {result['query_budget']}{repeated}"
+    assert result['median_ms'] <= result['latency_budget_ms'], \
+        f"{scenario} took {result['median_ms']} ms, budget {result['latency_budget_ms']} ms"
+
+def test_discord_pool_is_restored(perf_suite):
+    import routes
+    from services import DiscordPool
+
+    assert routes.DiscordPool is DiscordPool
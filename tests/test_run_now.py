@@ -0,0 +1,31 @@
+from datetime import datetime, timedelta, timezone
+
+from fakes import FakeDiscordService, FakeOllamaService
+
+def _terminal(event):
+    return event['event'] in ('up_to_date', 'error') or (event['event'] == 'summary' and event['final'])
+
+def test_every_channel_ends_with_one_terminal_event(app, db, monkeypatch):
+    import app as app_module
+    from app import run_summary_pass
+    from models import AppConfig, ChannelState
+
+    # Small chunks, so the busy channel is summarized in several parts
+    monkeypatch.setattr(app_module, 'SUMMARY_MAX_MESSAGES', 5)
+    discord = FakeDiscordService()
+    start = datetime.now(timezone.utc) - timedelta(minutes=30)
+    for n in range(12):
+        discord.add_message('6661', 666100 + n, f"busy {n}", (start + timedelta(seconds=n)).isoformat())
+    discord.add_message('6662', 666200, 'quiet', start.isoformat())
+    channel_ids = ['6661', '6662', '6663']  # 6663 has no messages
+
+    events = []
+    with app.app_context():
+        # Already summarized up to the backlog, so all of it is summarized
+        db.session.add(ChannelState(channel_id='6661', summarized_until=(start - timedelta(minutes=1)).isoformat()))
+        db.session.commit()
+        results = run_summary_pass(channel_ids, discord, FakeOllamaService(), AppConfig.get_config(), events.append)
+
+    assert results['6661']['summaries'] == 3
+    terminal = [event['channel_id'] for event in events if _terminal(event)]
+    assert sorted(terminal) == channel_ids
@@ -0,0 +1,52 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from transcript_codec import CODECS, decode_messages, encode_messages
+
+AUTHOR = {'id': '1', 'username': 'tester', 'avatar': None}
+
+MESSAGES = [
+    {'id': '1', 'author': AUTHOR, 'content': 'complete author', 'timestamp': '2025-01-01T00:00:00+00:00',
+     'attachments': []},
+    {'id': '2', 'author': dict(AUTHOR), 'content': 'same author again', 'timestamp': '2025-01-01T00:01:00+00:00',
+     'attachments': [{'url': 'https://cdn.invalid/a.png', 'filename': 'a.png'}]},
+    {'id': '3', 'author': None, 'content': 'author is None', 'timestamp': '2025-01-01T00:02:00+00:00',
+     'attachments': []},
+    {'id': '4', 'author': {'username': 'partial'}, 'content': 'partial author',
+     'timestamp': '2025-01-01T00:03:00+00:00'},
+    {'id': '5', 'author': {}, 'content': 'empty author', 'timestamp': '2025-01-01T00:04:00+00:00'},
+    {'id': '6', 'content': 'no author key', 'timestamp': '2025-01-01T00:05:00+00:00'},
+    {'id': '7', 'author': dict(AUTHOR, global_name='Tester'), 'content': 'extra author key',
+     'timestamp': '2025-01-01T00:06:00+00:00', 'edited_timestamp': None},
+]
+
+@pytest.mark.parametrize('codec', CODECS)
+def test_round_trip_is_lossless(codec):
+    assert decode_messages(encode_messages(MESSAGES, codec)) == MESSAGES
+
+def test_unknown_codec_falls_back_to_zlib():
+    assert encode_messages(MESSAGES, 'gzip')[:1] == b'z'
+
+def test_retention_keeps_transcripts_it_cannot_decode(app, db):
+    from models import AppConfig, ChannelState, Summary
+    from retention import archive_old_transcripts
+
+    with app.app_context():
+        db.session.add(ChannelState(channel_id='777', transcript_retention_days=1))
+        old = datetime.now(timezone.utc) - timedelta(days=30)
+        broken = Summary(channel_id='777', summary_text='broken', timestamp=old, messages_blob=b'?not a transcript')
+        readable = Summary(channel_id='777', summary_text='readable', timestamp=old + timedelta(hours=1))
+        readable.set_messages(MESSAGES)
+        db.session.add_all([broken, readable])
+        db.session.commit()
+
+        report = archive_old_transcripts(AppConfig.get_config())
+        assert report['summaries_skipped'] == 1
+        db.session.refresh(broken)
+        db.session.refresh(readable)
+        assert broken.messages_blob == b'?not a transcript'
+        assert broken.archived_at is None
+        assert readable.archived_at is not None
+        with pytest.raises(ValueError):
+            broken.get_messages(strict=True)
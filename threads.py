@@ -0,0 +1,138 @@
+"""
+Conversation threads within a channel's messages.
+
+Busy channels interleave several conversations. Before summarizing, the
+messages are split into threads: a reply joins the thread of the message
+it replies to and a follow-up joins its author's thread, while a thread
+nobody replied into continues the conversation just before it, as long as
+the gap is short; after a longer silence a new thread starts. Small
+threads are pooled so a chunk does not turn into dozens of model calls.
+Each thread is summarized on its own, in parallel, and the results are
+combined into the channel's summary.
+"""
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from tracing import traced
+
+logger = logging.getLogger(__name__)
+
+# Silence after which a message no longer continues an earlier one
+THREAD_GAP_MINUTES = 15
+# Threads shorter than this are pooled with the other short ones
+THREAD_MIN_MESSAGES = 3
+# Threads summarized separately per chunk; the smallest beyond this are pooled
+THREAD_MAX_COUNT = 6
+# Shortest summary asked for per thread
+THREAD_MIN_SUMMARY_WORDS = 100
+
+def _timestamp(msg):
+    return datetime.fromisoformat(msg['timestamp'].replace('Z', '+00:00'))
+
+def cluster_threads(messages, gap_minutes=THREAD_GAP_MINUTES):
+    """Split messages (oldest first) into threads, each a list of messages oldest first.
+
+    Replies and an author's follow-up messages link a message to an earlier
+    one. A thread that nobody replied into is then joined to the
+    conversation just before it, so plain back-and-forth without replies
+    stays together. Runs in near-linear time with a union-find over the
+    message list.
+    """
+    gap = gap_minutes * 60
+    parent = list(range(len(messages)))
+
+    def find(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    def union(a, b):
+        a, b = find(a), find(b)
+        # The oldest message stays the root, so a root starts its thread
+        if a != b:
+            parent[max(a, b)] = min(a, b)
+
+    times = [_timestamp(msg).timestamp() for msg in messages]
+    position = {}  # Message ID -> index
+    last_by_author = {}  # Author -> index of their latest message
+    replies = []
+
+    for i, msg in enumerate(messages):
+        author = (msg.get('author') or {}).get('id') or (msg.get('author') or {}).get('username')
+        reference = (msg.get('message_reference') or {}).get('message_id')
+
+        if reference in position:
+            union(i, position[reference])
+            replies.append(i)
+        elif author in last_by_author and times[i] - times[last_by_author[author]] <= gap:
+            union(i, last_by_author[author])
+
+        position[str(msg.get('id'))] = i
+        last_by_author[author] = i
+
+    replied = {find(i) for i in replies}
+    roots = [i for i in range(len(messages)) if find(i) == i]
+    for i in roots:
+        if i and i not in replied and times[i] - times[i - 1] <= gap:
+            union(i, i - 1)
+
+    grouped = {}
+    for i, msg in enumerate(messages):
+        grouped.setdefault(find(i), []).append(msg)
+    return [grouped[root] for root in sorted(grouped)]
+
+def group_threads(threads, min_messages=THREAD_MIN_MESSAGES, max_count=THREAD_MAX_COUNT):
+    """Keep the largest threads and pool the short and surplus ones into one list, in time order"""
+    ranked = sorted(threads, key=len, reverse=True)
+    keep = [thread for thread in ranked[:max_count] if len(thread) >= min_messages]
+    if len(keep) == max_count and len(ranked) > max_count:
+        # Leave room for the pooled thread
+        keep = keep[:-1]
+
+    kept = {id(thread) for thread in keep}
+    pooled = [msg for thread in threads if id(thread) not in kept for msg in thread]
+    if pooled:
+        pooled.sort(key=_timestamp)
+        keep.append(pooled)
+    return sorted(keep, key=lambda thread: _timestamp(thread[0]))
+
+def _participants(thread, limit=4):
+    names = []
+    for msg in thread:
+        name = (msg.get('author') or {}).get('username', 'Unknown')
+        if name not in names:
+            names.append(name)
+    more = f" +{len(names) - limit}" if len(names) > limit else ''
+    return ', '.join(names[:limit]) + more
+
+def summarize_threads(ollama_service, config, messages, content, max_length=500):
+    """Summary of a chunk of messages, summarizing each conversation thread separately.
+
+    Falls back to a single summary of content when the messages form only
+    one thread. Raises OllamaError if any thread fails, so the chunk is
+    retried as a whole.
+    """
+    from app import build_transcript
+
+    threads = [thread for thread in group_threads(cluster_threads(messages))
+               if build_transcript(thread).strip()]
+    if len(threads) <= 1:
+        return ollama_service.generate_summary(content, config.summary_prompt, max_length=max_length)
+
+    thread_length = max(max_length // len(threads), THREAD_MIN_SUMMARY_WORDS)
+    workers = min(len(threads), max(getattr(ollama_service, 'capacity', 1), 1))
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = [
+            pool.submit(traced(ollama_service.generate_summary, 'ollama.thread', messages=len(thread)),
+                        build_transcript(thread), config.summary_prompt, thread_length)
+            for thread in threads
+        ]
+        summaries = [future.result() for future in futures]
+
+    logger.info(f"Summarized {len(messages)} messages as {len(threads)} threads")
+    return '\n\n'.join(
+        f"Thread {number}: {_participants(thread)} ({len(thread)} messages)\n{summary}"
+        for number, (thread, summary) in enumerate(zip(threads, summaries), 1)
+    )
@@ -0,0 +1,293 @@
+#!/usr/bin/env python3
+"""
+Trace spans for the summarization pipeline.
+
+Each stage of summarizing a channel (state lookup, Discord fetch, duplicate
+check, buffer read, transcript build, Ollama call, serialization, commit)
+runs inside a span carrying the channel ID and sizes such as message
+counts, bytes and tokens. Spans of one pass share a trace ID and nest
+under the pass. Finished spans are appended as JSON lines to one file per
+day in TRACE_DIR; they can be sent to any OpenTelemetry collector over
+OTLP/HTTP and are aggregated into the slowest channels view.
+
+Usage:
+    python tracing.py export http://collector:4318 [--days 1]
+    python tracing.py slowest [--days 7]
+"""
+import argparse
+import contextvars
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+
+import requests
+
+logger = logging.getLogger(__name__)
+
+TRACING_ENABLED = os.environ.get('TRACING', 'true').lower() not in ('0', 'false', 'no')
+TRACE_DIR = os.environ.get('TRACE_DIR') or 'traces'
+# Days of span files kept
+TRACE_RETENTION_DAYS = 8
+# Spans per OTLP export request
+OTLP_BATCH_SIZE = 500
+
+# Span names whose time counts towards a channel in the slowest channels view
+CHANNEL_STAGES = ['channel.state', 'discord.fetch', 'summary.duplicate_check', 'buffer.read',
+                  'transcript.build', 'ollama.generate', 'summary.serialize', 'summary.commit']
+
+_current = contextvars.ContextVar('current_span', default=None)
+_write_lock = threading.Lock()
+_count_lock = threading.Lock()
+_last_pruned = None
+
+class Span:
+    """A timed operation with attributes; see span()"""
+
+    def __init__(self, name, parent=None, attributes=None):
+        self.name = name
+        self.parent = parent
+        self.trace_id = parent.trace_id if parent else os.urandom(16).hex()
+        self.span_id = os.urandom(8).hex()
+        self.parent_id = parent.span_id if parent else None
+        self.attributes = dict(attributes or {})
+        self.start = time.time()
+        self.duration = None
+        self.error = None
+        self._started = time.perf_counter()
+
+    def set(self, **attributes):
+        self.attributes.update(attributes)
+
+    def add(self, **counts):
+        """Add to numeric attributes of this span and the spans enclosing it, e.g. tokens"""
+        with _count_lock:
+            current = self
+            while current is not None:
+                for key, value in counts.items():
+                    if value is not None:
+                        current.attributes[key] = current.attributes.get(key, 0) + value
+                current = current.parent
+
+    def finish(self):
+        self.duration = time.perf_counter() - self._started
+
+    def to_dict(self):
+        return {
+            'trace_id': self.trace_id,
+            'span_id': self.span_id,
+            'parent_id': self.parent_id,
+            'name': self.name,
+            'start': self.start,
+            'duration': self.duration,
+            'attributes': self.attributes,
+            'error': self.error
+        }
+
+class _NoopSpan:
+    """Stands in for a span while tracing is off or outside any span"""
+
+    def set(self, **attributes):
+        pass
+
+    def add(self, **counts):
+        pass
+
+_NOOP = _NoopSpan()
+
+def current_span():
+    """The innermost open span of this thread, or a no-op span"""
+    return _current.get() or _NOOP
+
+@contextmanager
+def span(name, parent=None, **attributes):
+    """Record the enclosed block as a span, nested under the current span by default"""
+    if not TRACING_ENABLED:
+        yield _NOOP
+        return
+
+    current = Span(name, parent or _current.get(), attributes)
+    token = _current.set(current)
+    try:
+        yield current
+    except BaseException as e:
+        current.error = str(e) or type(e).__name__
+        raise
+    finally:
+        current.finish()
+        _current.reset(token)
+        _record(current)
+
+def traced(func, name, **attributes):
+    """Wrap func to run in a span under the current one, for use in worker threads"""
+    parent = _current.get()
+
+    def run(*args, **kwargs):
+        with span(name, parent=parent, **attributes):
+            return func(*args, **kwargs)
+    return run
+
+def _record(finished):
+    global _last_pruned
+    day = datetime.now(timezone.utc).date()
+    line = json.dumps(finished.to_dict(), default=str)
+    try:
+        with _write_lock:
+            os.makedirs(TRACE_DIR, exist_ok=True)
+            with open(os.path.join(TRACE_DIR, f"spans-{day.isoformat()}.jsonl"), 'a') as f:
+                f.write(line + '\n')
+            if _last_pruned != day:
+                _last_pruned = day
+                _prune(day)
+    except OSError as e:
+        logger.warning(f"Could not record trace span {finished.name}: {str(e)}")
+
+def _prune(today):
+    oldest = (today - timedelta(days=TRACE_RETENTION_DAYS)).isoformat()
+    for name in os.listdir(TRACE_DIR):
+        if name.startswith('spans-') and name[6:16] < oldest:
+            os.remove(os.path.join(TRACE_DIR, name))
+
+def read_spans(days=7, directory=None):
+    """Recorded spans that started within the last days, oldest file first"""
+    directory = directory or TRACE_DIR
+    since = time.time() - days * 86400
+    first_day = datetime.fromtimestamp(since, timezone.utc).date().isoformat()
+    try:
+        names = sorted(name for name in os.listdir(directory)
+                       if name.startswith('spans-') and name[6:16] >= first_day)
+    except FileNotFoundError:
+        return
+
+    for name in names:
+        with open(os.path.join(directory, name)) as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    # Partly written line
+                    continue
+                if record.get('start', 0) >= since:
+                    yield record
+
+def slowest_channels(days=7, limit=20, directory=None):
+    """Channels by time spent in their pipeline stages over the last days, slowest first"""
+    channels = {}
+    for record in read_spans(days, directory):
+        if record['name'] not in CHANNEL_STAGES or record.get('duration') is None:
+            continue
+        attributes = record.get('attributes') or {}
+        # A batched Ollama call is shared evenly by its channels
+        channel_ids = attributes.get('channel_ids') or [attributes.get('channel_id')]
+        share = record['duration'] / len(channel_ids)
+
+        for channel_id in filter(None, channel_ids):
+            stats = channels.setdefault(channel_id, {
+                'channel_id': channel_id, 'summaries': 0, 'messages': 0, 'tokens': 0, 'errors': 0,
+                'total_seconds': 0.0, 'ollama_seconds': 0.0, 'fetch_seconds': 0.0, 'slowest_call_seconds': 0.0
+            })
+            stats['total_seconds'] += share
+            if record.get('error'):
+                stats['errors'] += 1
+            if record['name'] == 'ollama.generate':
+                stats['ollama_seconds'] += share
+                stats['slowest_call_seconds'] = max(stats['slowest_call_seconds'], record['duration'])
+                stats['tokens'] += (attributes.get('prompt_tokens') or 0) + (attributes.get('completion_tokens') or 0)
+            elif record['name'] == 'discord.fetch':
+                stats['fetch_seconds'] += share
+            elif record['name'] == 'summary.commit' and not record.get('error'):
+                stats['summaries'] += 1
+                stats['messages'] += attributes.get('messages') or 0
+
+    ranked = sorted(channels.values(), key=lambda stats: stats['total_seconds'], reverse=True)[:limit]
+    for stats in ranked:
+        for key in ('total_seconds', 'ollama_seconds', 'fetch_seconds', 'slowest_call_seconds'):
+            stats[key] = round(stats[key], 3)
+    return ranked
+
+def _otlp_value(value):
+    if isinstance(value, bool):
+        return {'boolValue': value}
+    if isinstance(value, int):
+        return {'intValue': str(value)}
+    if isinstance(value, float):
+        return {'doubleValue': value}
+    if isinstance(value, (list, tuple)):
+        return {'arrayValue': {'values': [_otlp_value(item) for item in value]}}
+    return {'stringValue': str(value)}
+
+def to_otlp_span(record):
+    """A recorded span in OTLP/JSON form"""
+    start = int(record['start'] * 1e9)
+    otlp = {
+        'traceId': record['trace_id'],
+        'spanId': record['span_id'],
+        'name': record['name'],
+        'kind': 1,  # SPAN_KIND_INTERNAL
+        'startTimeUnixNano': str(start),
+        'endTimeUnixNano': str(start + int((record.get('duration') or 0) * 1e9)),
+        'attributes': [{'key': key, 'value': _otlp_value(value)}
+                       for key, value in (record.get('attributes') or {}).items() if value is not None],
+        'status': {'code': 2, 'message': record['error']} if record.get('error') else {'code': 1}
+    }
+    if record.get('parent_id'):
+        otlp['parentSpanId'] = record['parent_id']
+    return otlp
+
+def export_otlp(endpoint, days=1, directory=None, timeout=30):
+    """Send recorded spans to an OpenTelemetry collector's OTLP/HTTP endpoint, returning the count"""
+    url = endpoint.rstrip('/')
+    if not url.endswith('/v1/traces'):
+        url += '/v1/traces'
+
+    sent = 0
+    batch = []
+    spans = read_spans(days, directory)
+    while True:
+        record = next(spans, None)
+        if record is not None:
+            batch.append(to_otlp_span(record))
+        if batch and (record is None or len(batch) >= OTLP_BATCH_SIZE):
+            payload = {'resourceSpans': [{
+                'resource': {'attributes': [{'key': 'service.name', 'value': {'stringValue': 'discord-summarizer'}}]},
+                'scopeSpans': [{'scope': {'name': 'discord-summarizer'}, 'spans': batch}]
+            }]}
+            response = requests.post(url, json=payload, timeout=timeout)
+            response.raise_for_status()
+            sent += len(batch)
+            batch = []
+        if record is None:
+            return sent
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Discord Summarizer trace spans")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    export = subparsers.add_parser('export', help='Send spans to an OTLP/HTTP collector')
+    export.add_argument('endpoint', help='Collector URL, e.g. http://localhost:4318')
+    export.add_argument('--days', type=float, default=1)
+
+    slowest = subparsers.add_parser('slowest', help='Print the slowest channels')
+    slowest.add_argument('--days', type=float, default=7)
+
+    args = parser.parse_args(argv)
+    if args.command == 'export':
+        try:
+            sent = export_otlp(args.endpoint, args.days)
+        except requests.exceptions.RequestException as e:
+            print(f"❌ Export failed: {e}")
+            return 1
+        print(f"✅ Exported {sent} spans to {args.endpoint}")
+    else:
+        print(f"{'channel':<22}{'summaries':>10}{'messages':>10}{'total s':>10}{'ollama s':>10}{'fetch s':>10}")
+        for stats in slowest_channels(args.days):
+            print(f"{stats['channel_id']:<22}{stats['summaries']:>10}{stats['messages']:>10}"
+                  f"{stats['total_seconds']:>10.2f}{stats['ollama_seconds']:>10.2f}{stats['fetch_seconds']:>10.2f}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
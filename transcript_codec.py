@@ -0,0 +1,149 @@
+"""
+Compact binary encoding for stored message transcripts.
+
+Transcripts repeat the same author objects and JSON keys for every message.
+The compact format stores each distinct author once and every message as a
+positional list, then compresses the result with zlib (or zstd when the
+zstandard package is installed):
+
+    {"v": 1,
+     "a": [[author_id, username, avatar], ...],
+     "m": [[id, author_index, content, timestamp, [[url, filename], ...], extra], ...]}
+
+``extra`` holds any message keys the positional layout does not know about
+(or null), so encoding followed by decoding always returns the original list.
+The first byte of a blob identifies the codec.
+"""
+import json
+import logging
+import zlib
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+logger = logging.getLogger(__name__)
+
+FORMAT_VERSION = 1
+
+# First byte of an encoded blob
+CODEC_MARKERS = {'zlib': b'z', 'zstd': b's'}
+CODECS = tuple(CODEC_MARKERS)
+
+# Keys covered by the positional message layout
+_KNOWN_KEYS = {'id', 'author', 'content', 'timestamp', 'attachments'}
+_AUTHOR_KEYS = {'id', 'username', 'avatar'}
+
+def available_codec(codec):
+    """Return codec if it can be used here, otherwise the zlib fallback"""
+    if codec not in CODECS:
+        logger.warning(f"Unknown transcript codec {codec!r}, using zlib (expected one of {', '.join(CODECS)})")
+        return 'zlib'
+    if codec == 'zstd' and zstandard is None:
+        return 'zlib'
+    return codec
+
+def _pack(messages):
+    """Convert the message list into the deduplicated positional layout"""
+    authors = []
+    author_index = {}
+    packed = []
+
+    for msg in messages:
+        author = msg.get('author')
+        # Only complete authors are deduplicated; partial, None or unexpected ones are kept verbatim in extra
+        if not isinstance(author, dict) or set(author) != _AUTHOR_KEYS:
+            author_idx = -1
+        else:
+            key = (author.get('id'), author.get('username'), author.get('avatar'))
+            author_idx = author_index.get(key)
+            if author_idx is None:
+                author_idx = len(authors)
+                author_index[key] = author_idx
+                authors.append(list(key))
+
+        attachments = msg.get('attachments')
+        if attachments is not None and all(set(att) <= {'url', 'filename'} for att in attachments):
+            packed_attachments = [[att.get('url'), att.get('filename')] for att in attachments]
+        else:
+            packed_attachments = None
+
+        extra = {k: v for k, v in msg.items() if k not in _KNOWN_KEYS}
+        if author_idx == -1 and 'author' in msg:
+            extra['author'] = author
+        if packed_attachments is None and 'attachments' in msg:
+            extra['attachments'] = attachments
+        # Remember which known keys were absent so they are not invented on decode
+        missing = [k for k in ('id', 'author', 'content', 'timestamp', 'attachments') if k not in msg]
+        if missing:
+            extra['__missing__'] = missing
+
+        packed.append([
+            msg.get('id'),
+            author_idx,
+            msg.get('content'),
+            msg.get('timestamp'),
+            packed_attachments,
+            extra or None,
+        ])
+
+    return {'v': FORMAT_VERSION, 'a': authors, 'm': packed}
+
+def _unpack(data):
+    """Inverse of _pack"""
+    authors = [
+        {'username': username, 'id': author_id, 'avatar': avatar}
+        for author_id, username, avatar in data.get('a', [])
+    ]
+    messages = []
+
+    for msg_id, author_idx, content, timestamp, attachments, extra in data.get('m', []):
+        msg = {
+            'id': msg_id,
+            'author': dict(authors[author_idx]) if author_idx >= 0 else None,
+            'content': content,
+            'timestamp': timestamp,
+            'attachments': [{'url': url, 'filename': filename} for url, filename in attachments]
+                           if attachments is not None else None,
+        }
+        if extra:
+            extra = dict(extra)
+            for key in extra.pop('__missing__', []):
+                msg.pop(key, None)
+            msg.update(extra)
+        messages.append(msg)
+
+    return messages
+
+def encode_messages(messages, codec='zlib'):
+    """Encode a message list into a compressed blob"""
+    codec = available_codec(codec)
+    raw = json.dumps(_pack(messages), separators=(',', ':')).encode('utf-8')
+
+    if codec == 'zstd':
+        compressed = zstandard.ZstdCompressor(level=9).compress(raw)
+    else:
+        compressed = zlib.compress(raw, 6)
+
+    return CODEC_MARKERS[codec] + compressed
+
+def decode_messages(blob):
+    """Decode a blob created by encode_messages"""
+    if not blob:
+        return []
+
+    marker, payload = bytes(blob[:1]), bytes(blob[1:])
+    if marker == CODEC_MARKERS['zstd']:
+        if zstandard is None:
+            raise RuntimeError("Decoding this transcript requires the zstandard package")
+        raw = zstandard.ZstdDecompressor().decompress(payload)
+    elif marker == CODEC_MARKERS['zlib']:
+        raw = zlib.decompress(payload)
+    else:
+        raise ValueError(f"Unknown transcript codec marker: {marker!r}")
+
+    data = json.loads(raw)
+    if data.get('v') != FORMAT_VERSION:
+        raise ValueError(f"Unsupported transcript format version: {data.get('v')}")
+    return _unpack(data)
@@ -0,0 +1,46 @@
+#!/usr/bin/env python3
+"""
+Headless pipeline worker for Discord Summarizer.
+
+Runs the scheduled jobs (ingest, hourly summaries, daily email, retention,
+backfill, embeddings) and gateway ingest without serving HTTP, so the web
+tier and the summarization pipeline can be scaled separately:
+
+    SCHEDULER_ENABLED=false gunicorn -w 2 -b 0.0.0.0:5000 wsgi:app
+    python worker.py
+
+Several workers can run against one PostgreSQL database; each hourly pass
+claims channels, so every channel is summarized by exactly one worker.
+Size the number of workers to the Ollama capacity rather than to web
+traffic. SIGTERM and SIGINT stop the worker after its running jobs finish.
+"""
+import logging
+import signal
+import sys
+import threading
+
+from app import create_app, scheduler, worker_id
+
+logger = logging.getLogger(__name__)
+
+def main():
+    stop = threading.Event()
+
+    def request_stop(signum, frame):
+        logger.info(f"Received signal {signum}, stopping after running jobs finish")
+        stop.set()
+
+    signal.signal(signal.SIGTERM, request_stop)
+    signal.signal(signal.SIGINT, request_stop)
+
+    create_app(scheduler_enabled=True)
+    jobs = ', '.join(job.id for job in scheduler.get_jobs())
+    logger.info(f"Worker {worker_id()} running jobs: {jobs}")
+
+    stop.wait()
+    scheduler.shutdown(wait=True)
+    logger.info(f"Worker {worker_id()} stopped")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())